@@ -0,0 +1,91 @@
+"""
+Benchmark della raccolta dati (MatchDataManager.collect_match_data) senza rete.
+
+Avvia il server locale di standin_server.py con latenza, errori e limiti di
+frequenza configurabili, punta FootballDataCollector al server e raccoglie
+tutte le giornate presenti in match_data/ in una directory temporanea.
+Cache delle risposte, registro quota e coordinate usano file temporanei,
+così ogni esecuzione parte a freddo e non tocca .cache/.
+
+Uso:
+    python benchmarks/bench_collection.py --latency-ms 150 --error-rate 0.02 --workers 8
+    python benchmarks/bench_collection.py --record /tmp/cassette   # registra le risposte
+    python benchmarks/bench_collection.py --replay /tmp/cassette   # le riproduce senza HTTP
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "x_optimizer"))
+sys.path.insert(0, BENCH_DIR)
+
+from standin_server import StandInData, StandInServer  # noqa: E402
+from synthetic_data import SEED_DATA_DIR  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=SEED_DATA_DIR, help="file partita che alimentano il server")
+    parser.add_argument("--workers", type=int, default=8, help="partite raccolte in parallelo")
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--jitter-ms", type=float, default=30.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=None, help="limite del server (richieste/minuto)")
+    parser.add_argument("--client-rate", type=float, default=3000, help="token bucket del client (richieste/minuto)")
+    parser.add_argument("--record", default=None, help="directory della cassetta da registrare")
+    parser.add_argument("--replay", default=None, help="riproduce una cassetta registrata, senza richieste HTTP")
+    args = parser.parse_args()
+
+    server = StandInServer(
+        StandInData.from_directory(args.data_dir),
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, rate_limit=args.rate_limit
+    ).start()
+    work_dir = tempfile.mkdtemp(prefix="xgoals_collect_")
+    os.environ.update(server.client_env())
+    os.environ.update({
+        'RAPIDAPI_KEY': os.getenv('RAPIDAPI_KEY', 'standin'),
+        'RAPIDAPI_CALLS_PER_MINUTE': str(args.client_rate),
+        'RAPIDAPI_BURST': str(max(1, args.workers)),
+        'OPEN_METEO_CALLS_PER_MINUTE': str(args.client_rate),
+        'XGOALS_CACHE_PATH': os.path.join(work_dir, "api_responses.sqlite"),
+        'XGOALS_QUOTA_PATH': os.path.join(work_dir, "api_quota.sqlite"),
+        'XGOALS_GEOCODING_PATH': os.path.join(work_dir, "geocoding.json"),
+    })
+    if args.record:
+        os.environ.update({'XGOALS_HTTP_CASSETTE': args.record, 'XGOALS_HTTP_MODE': 'record'})
+    elif args.replay:
+        os.environ.update({'XGOALS_HTTP_CASSETTE': args.replay, 'XGOALS_HTTP_MODE': 'replay'})
+
+    # Import dopo la configurazione: il collector legge URL e limiti dall'ambiente
+    from api_client import FootballDataCollector
+    from match_data_manager import MatchDataManager
+
+    try:
+        collector = FootballDataCollector()
+        manager = MatchDataManager(collector, data_dir=os.path.join(work_dir, "match_data"),
+                                   collection_workers=args.workers)
+        dates = sorted(server.data.fixtures_by_date)
+        print(f"Server locale {server.url}: {len(server.data.fixtures_by_id)} partite in {len(dates)} giornate, "
+              f"latenza {args.latency_ms:.0f}±{args.jitter_ms:.0f} ms, errori {args.error_rate:.0%}")
+
+        start = time.perf_counter()
+        collected = sum(len(manager.collect_match_data(day)) for day in dates)
+        elapsed = time.perf_counter() - start
+
+        print(f"\n=== Raccolta di {collected} partite in {elapsed:.2f} s "
+              f"({collected / elapsed:.1f} partite/s, {args.workers} worker) ===")
+        print(server.summary())
+        print(f"Chiamate RapidAPI del collector: {collector.daily_calls}")
+        print(collector.latency_summary())
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
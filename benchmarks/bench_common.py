@@ -0,0 +1,20 @@
+"""
+Funzioni comuni ai benchmark.
+"""
+import contextlib
+import io
+import time
+from typing import Callable, Tuple
+
+
+def timed(label: str, func: Callable) -> Tuple[object, float]:
+    """
+    Esegue func una volta e stampa il tempo impiegato; l'output del codice misurato
+    viene soppresso per non mescolarsi alla tabella dei tempi. Restituisce (risultato, secondi).
+    """
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<45} {elapsed:8.3f} s")
+    return result, elapsed
@@ -0,0 +1,151 @@
+"""
+Benchmark della valutazione delle formule (FormulaEvaluator).
+
+Confronta il ciclo partita per partita con il motore vettoriale NumPy
+(formula_engine.FormulaEngine) su partite sintetiche, e verifica che
+errore medio e accuratezza coincidano esattamente. Misura anche l'estrazione
+delle feature (shared_utils.match_features) e il ricaricamento dalla cache, e
+verifica che la valutazione incrementale dopo la sostituzione di partite
+nell'archivio coincida con una valutazione completa.
+
+Uso:
+    python benchmarks/bench_formula_engine.py --matches 100000
+"""
+import argparse
+import contextlib
+import copy
+import io
+import math
+import os
+import shutil
+import sys
+import tempfile
+from typing import Callable, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "x_optimizer"))
+sys.path.insert(0, BENCH_DIR)
+
+from bench_common import timed  # noqa: E402
+from formula_engine import VECTORISED_FORMULAS  # noqa: E402
+from formula_evaluator import FORMULA_FIELDS, FormulaEvaluator, FormulaParameters  # noqa: E402
+from incremental_evaluator import IncrementalEvaluator  # noqa: E402
+from match_store import MatchStore, project_match  # noqa: E402
+from shared_utils.match_features import FEATURE_SOURCE_FIELDS, FeatureCache, MatchFeatures  # noqa: E402
+from synthetic_data import iter_synthetic_matches, load_seed_matches  # noqa: E402
+
+
+def extract_features_case(matches: List[Dict]) -> Callable:
+    return lambda: MatchFeatures.from_matches(matches)
+
+
+def test_formula_case(matches: List[Dict], features: MatchFeatures, name: str = 'formula2') -> Callable:
+    """Motore vettoriale sulle feature già estratte; il motore è creato fuori dalla misura"""
+    evaluator = FormulaEvaluator(matches, features=features)
+    formula = getattr(FormulaEvaluator, name)
+    with contextlib.redirect_stdout(io.StringIO()):
+        evaluator.test_formula(formula, name)
+    # test_formula aggiusta i parametri dopo ogni valutazione: la misura riparte da quelli iniziali
+    evaluator.parameters = FormulaParameters()
+    return lambda: evaluator.test_formula(formula, name)
+
+
+def test_formula_per_match_case(matches: List[Dict], name: str = 'formula2',
+                                features: Optional[MatchFeatures] = None) -> Callable:
+    """Ciclo partita per partita: una formula esterna alla classe non ha la versione vettoriale"""
+    evaluator = FormulaEvaluator(matches, features=features)
+    formula = getattr(FormulaEvaluator, name)
+    return lambda: evaluator.test_formula(lambda match, params: formula(match, params), f"{name} (per partita)")
+
+
+def check_incremental_replacement() -> bool:
+    """
+    Valuta le partite originali, ne sostituisce alcune nell'archivio (gol cambiati,
+    come una partita risalvata a fine gara) e confronta gli aggregati incrementali
+    con quelli di un valutatore nuovo sull'archivio finale.
+    """
+    work_dir = tempfile.mkdtemp(prefix="xgoals_incremental_")
+    try:
+        seeds = load_seed_matches()
+        store = MatchStore(os.path.join(work_dir, "store"))
+        store.write(seeds)
+        incremental = IncrementalEvaluator(store, os.path.join(work_dir, "incremental"))
+        for name in VECTORISED_FORMULAS:
+            incremental.register(name)
+        with contextlib.redirect_stdout(io.StringIO()):
+            incremental.update()
+
+        replaced = [copy.deepcopy(match) for match in seeds[::5]]
+        for match in replaced:
+            match['goals'] = {'home': (match['goals']['home'] or 0) + 2, 'away': 0}
+        store.append(replaced)
+        with contextlib.redirect_stdout(io.StringIO()):
+            added = incremental.update()
+            full = IncrementalEvaluator(store, os.path.join(work_dir, "full"))
+            for name in VECTORISED_FORMULAS:
+                full.register(name)
+            full.update()
+        store.close()
+        if set(added.values()) != {len(replaced)}:
+            return False
+        for expected, actual in zip(full.summaries(), incremental.summaries()):
+            if not math.isclose(expected.pop('avg_error'), actual.pop('avg_error'), rel_tol=1e-9) \
+                    or not math.isclose(expected.pop('accuracy'), actual.pop('accuracy'), rel_tol=1e-9) \
+                    or expected != actual:
+                return False
+        return True
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--matches", type=int, default=100000, help="numero di partite sintetiche")
+    args = parser.parse_args()
+
+    # Solo i campi letti dalle formule (più 'fixture', richiesto dal generatore sintetico)
+    seeds = [project_match(match, FORMULA_FIELDS + ['fixture']) for match in load_seed_matches()]
+    matches = list(iter_synthetic_matches(args.matches, seeds))
+    print(f"=== {len(matches)} partite sintetiche ===")
+
+    features, extraction = timed("estrazione feature (una tantum)", extract_features_case(matches))
+    cache_dir = tempfile.mkdtemp(prefix="xgoals_features_")
+    try:
+        FeatureCache(cache_dir).load_or_build("bench", lambda: features)
+        timed("feature dalla cache su disco (npz)", lambda: FeatureCache(cache_dir).load_or_build("bench", None))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    # Le partite lette dall'archivio colonnare (complete e differite) danno le stesse feature
+    store_dir = tempfile.mkdtemp(prefix="xgoals_store_")
+    try:
+        store = MatchStore(store_dir)
+        store.write(load_seed_matches())
+        eager = MatchFeatures.from_matches(store.iter_matches(fields=FEATURE_SOURCE_FIELDS))
+        lazy, _ = timed("feature da LazyMatch (archivio colonnare)",
+                        lambda: MatchFeatures.from_matches(store.iter_matches(fields=FEATURE_SOURCE_FIELDS, lazy=True)))
+        store.close()
+        status = "identiche" if lazy.content_hash() == eager.content_hash() else "DIVERSE"
+        print(f"  feature LazyMatch / dizionari: {status}")
+    finally:
+        shutil.rmtree(store_dir, ignore_errors=True)
+
+    status = "identici" if check_incremental_replacement() else "DIVERSI"
+    print(f"  aggregati incrementali dopo sostituzione / valutazione completa: {status}")
+
+    for name in VECTORISED_FORMULAS:
+        print(f"\n{name}")
+        loop_result, loop_time = timed("ciclo per partita", test_formula_per_match_case(matches, name))
+        engine_result, engine_time = timed("motore vettoriale", test_formula_case(matches, features, name))
+        status = "identici" if loop_result == engine_result else f"DIVERSI {loop_result} != {engine_result}"
+        print(f"  speedup {loop_time / engine_time:6.1f}x "
+              f"({loop_time / (engine_time + extraction):.1f}x con l'estrazione), risultati {status}")
+
+    print("\ntest_formula2_detailed")
+    detailed_loop, _ = timed("motore vettoriale + analisi per partita",
+                             lambda: FormulaEvaluator(matches).test_formula2_detailed(FormulaParameters()))
+    print(f"  errore medio {detailed_loop['avg_error']:.4f}, distribuzione {detailed_loop['error_distribution']}")
+
+
+if __name__ == "__main__":
+    main()
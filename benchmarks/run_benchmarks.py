@@ -0,0 +1,325 @@
+"""
+Suite di benchmark dei percorsi critici, completamente offline.
+
+Misura, su partite sintetiche di 1k/10k/100k fixture (synthetic_data.py):
+- MatchDataManager.load_all_matches (file JSON e archivio colonnare)
+- estrazione della tabella delle feature
+- FormulaEvaluator.test_formula (motore vettoriale e ciclo per partita) e score_batch
+- XGoalsCalculator.calculate_xgoals e ScoreDistribution.markets
+- CSVViewerApp.display_csv (saltato senza display o senza pandas/tkinter)
+
+I casi di caricamento e valutazione sono quelli di bench_match_loading.py e
+bench_formula_engine.py, misurati qui su più dimensioni.
+
+I risultati vengono salvati in JSON e, con --baseline, confrontati con un
+riferimento salvato: un caso più lento della soglia è una regressione e il
+comando termina con codice 1. Nessun caso usa la rete o le chiavi API.
+
+Uso:
+    python benchmarks/run_benchmarks.py --sizes 1000 10000 100000
+    python benchmarks/run_benchmarks.py --save-baseline
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json --threshold 0.25
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(REPO_ROOT, "x_optimizer"))
+sys.path.insert(0, BENCH_DIR)
+# Dopo x_optimizer: i due pacchetti hanno entrambi un api_client.py
+sys.path.append(os.path.join(REPO_ROOT, "x_score_calculator"))
+
+import numpy as np  # noqa: E402
+
+from bench_formula_engine import extract_features_case, test_formula_case, test_formula_per_match_case  # noqa: E402
+from bench_match_loading import load_json_case, load_store_case  # noqa: E402
+from formula_engine import FormulaEngine  # noqa: E402
+from formula_evaluator import FormulaParameters  # noqa: E402
+from match_io import write_json_file  # noqa: E402
+from match_store import project_match  # noqa: E402
+from parameter_search import random_candidates  # noqa: E402
+from score_distribution import DEFAULT_RHO, ScoreDistribution  # noqa: E402
+from shared_utils.match_features import FEATURE_SOURCE_FIELDS, MatchFeatures  # noqa: E402
+from synthetic_data import iter_synthetic_matches, load_seed_matches, write_match_files  # noqa: E402
+from xgoals import XGoalsCalculator  # noqa: E402
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+
+class SkipBenchmark(Exception):
+    """Caso non eseguibile in questo ambiente (motivo nel messaggio)"""
+
+
+class BenchContext:
+    """
+    Dati sintetici di una dimensione, costruiti alla prima richiesta e condivisi tra i casi.
+
+    Le partite in memoria sono ridotte ai campi letti da feature e calcolatore
+    (come in bench_formula_engine.py); i file su disco restano completi.
+    """
+
+    def __init__(self, size: int, seeds: List[Dict], projected_seeds: List[Dict], work_dir: str, max_files: int):
+        self.size = size
+        self.seeds = seeds
+        self.projected_seeds = projected_seeds
+        self.work_dir = work_dir
+        self.max_files = max_files
+        self._cache = {}
+
+    def _lazy(self, name: str, build: Callable):
+        if name not in self._cache:
+            with contextlib.redirect_stdout(io.StringIO()):
+                self._cache[name] = build()
+        return self._cache[name]
+
+    def matches(self) -> List[Dict]:
+        return self._lazy('matches', lambda: list(iter_synthetic_matches(self.size, self.projected_seeds)))
+
+    def features(self) -> MatchFeatures:
+        return self._lazy('features', lambda: MatchFeatures.from_matches(self.matches()))
+
+    def data_dir(self) -> str:
+        if self.size > self.max_files:
+            raise SkipBenchmark(f"oltre --max-files ({self.max_files} file)")
+
+        def build():
+            data_dir = os.path.join(self.work_dir, f"match_data_{self.size}")
+            write_match_files(data_dir, self.size, self.seeds)
+            return data_dir
+        return self._lazy('data_dir', build)
+
+    def csv_path(self) -> str:
+        def build():
+            # Stesso formato dei CSV di analyze_daily_matches (separatore ';')
+            path = os.path.join(self.work_dir, f"xgoals_{self.size}.csv")
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f, delimiter=';')
+                writer.writerow(['datetime', 'home_team', 'away_team', 'league', 'country', 'xgoals', 'details'])
+                for match in self.matches():
+                    writer.writerow([match['fixture']['date'], match['teams']['home']['name'],
+                                     match['teams']['away']['name'], match['league']['name'],
+                                     match['league']['country'], 2.5, ''])
+            return path
+        return self._lazy('csv_path', build)
+
+
+def bench_load_json(context: BenchContext) -> Callable:
+    return load_json_case(context.data_dir())
+
+
+def bench_load_store(context: BenchContext) -> Callable:
+    return load_store_case(context.data_dir())
+
+
+def bench_extract_features(context: BenchContext) -> Callable:
+    return extract_features_case(context.matches())
+
+
+def bench_test_formula(context: BenchContext) -> Callable:
+    return test_formula_case(context.matches(), context.features())
+
+
+def bench_test_formula_per_match(context: BenchContext) -> Callable:
+    return test_formula_per_match_case(context.matches(), features=context.features())
+
+
+def bench_score_batch(context: BenchContext) -> Callable:
+    engine = FormulaEngine(context.features())
+    candidates = [('formula2', FormulaParameters.from_dict(values))
+                  for values in random_candidates(64, seed=0)]
+    return lambda: engine.score_batch(candidates)
+
+
+def bench_calculate_xgoals(context: BenchContext) -> Callable:
+    calculator = XGoalsCalculator()
+    # Forma delle risposte API: statistiche della partita sotto 'statistics' (partite giocate),
+    # medie stagionali delle squadre per le partite senza statistiche
+    fixtures = []
+    for match in context.matches():
+        statistics = match.get('match_statistics') or []
+        if isinstance(statistics, dict):
+            statistics = statistics.get('response', [])
+        fixture = {key: match.get(key) for key in ('fixture', 'league', 'teams', 'home_stats', 'away_stats')}
+        if statistics:
+            fixture['statistics'] = statistics
+        fixtures.append(fixture)
+    return lambda: [calculator.calculate_xgoals(fixture) for fixture in fixtures]
+
+
+def bench_score_distribution(context: BenchContext) -> Callable:
+    rng = np.random.default_rng(0)
+    home, away = rng.uniform(0.2, 3.0, context.size), rng.uniform(0.2, 3.0, context.size)
+    distribution = ScoreDistribution(rho=DEFAULT_RHO)
+    return lambda: distribution.markets(home, away)
+
+
+def bench_display_csv(context: BenchContext) -> Callable:
+    try:
+        import tkinter as tk
+        from csv_viewer import CSVViewerApp
+    except ImportError as e:
+        raise SkipBenchmark(f"dipendenza mancante: {e.name}")
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        raise SkipBenchmark("nessun display disponibile")
+    root.withdraw()
+    app = CSVViewerApp(root)
+    path = context.csv_path()
+
+    def display():
+        app.display_csv(path)
+        root.update_idletasks()
+    return display
+
+
+# Nome del caso -> costruttore (prepara i dati e restituisce la funzione da misurare)
+BENCHMARKS = {
+    'load_all_matches.json': bench_load_json,
+    'load_all_matches.store': bench_load_store,
+    'match_features.extract': bench_extract_features,
+    'test_formula.vectorised': bench_test_formula,
+    'test_formula.per_match': bench_test_formula_per_match,
+    'score_batch.64': bench_score_batch,
+    'calculate_xgoals': bench_calculate_xgoals,
+    'score_distribution.markets': bench_score_distribution,
+    'display_csv': bench_display_csv,
+}
+
+
+def measure(func: Callable, repeats: int) -> Dict:
+    """Tempi di repeats esecuzioni (output del codice misurato soppresso)"""
+    timings = []
+    for _ in range(repeats):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+    return {'best': min(timings), 'median': statistics.median(timings), 'repeats': repeats}
+
+
+def run_suite(sizes: List[int], cases: List[str], repeats: int, max_files: int) -> Dict:
+    seeds = load_seed_matches()
+    projected_seeds = [project_match(match, FEATURE_SOURCE_FIELDS) for match in seeds]
+    results = {name: {} for name in cases}
+    work_dir = tempfile.mkdtemp(prefix="xgoals_bench_suite_")
+    try:
+        for size in sizes:
+            print(f"\n== {size} partite")
+            context = BenchContext(size, seeds, projected_seeds, work_dir, max_files)
+            for name in cases:
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        func = BENCHMARKS[name](context)
+                    entry = measure(func, repeats)
+                    entry['per_match_us'] = entry['best'] / size * 1e6
+                    print(f"  {name:<30} {entry['best']:9.4f} s  (mediana {entry['median']:.4f} s, "
+                          f"{entry['per_match_us']:.2f} µs/partita)")
+                except SkipBenchmark as e:
+                    entry = {'skipped': str(e)}
+                    print(f"  {name:<30} saltato: {e}")
+                results[name][str(size)] = entry
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'sizes': sizes,
+        'results': results,
+    }
+
+
+def compare(report: Dict, baseline: Dict, threshold: float, min_delta: float) -> List[Dict]:
+    """
+    Confronto con il riferimento sul tempo migliore di ogni caso e dimensione.
+
+    Regressione: più lento di (1 + soglia) volte e di almeno min_delta secondi (rumore
+    sui casi brevi). Il riferimento può indicare soglie per caso in 'thresholds'.
+    """
+    thresholds = baseline.get('thresholds', {})
+    rows = []
+    for name, by_size in report['results'].items():
+        for size, entry in by_size.items():
+            reference = baseline.get('results', {}).get(name, {}).get(size)
+            if 'best' not in entry or not reference or 'best' not in reference:
+                continue
+            limit = thresholds.get(name, threshold)
+            ratio = entry['best'] / reference['best'] if reference['best'] > 0 else float('inf')
+            if ratio > 1 + limit and entry['best'] - reference['best'] > min_delta:
+                status = 'regressione'
+            elif ratio < 1 / (1 + limit):
+                status = 'miglioramento'
+            else:
+                status = 'ok'
+            rows.append({'case': name, 'size': size, 'baseline': reference['best'], 'current': entry['best'],
+                         'ratio': ratio, 'threshold': limit, 'status': status})
+    return rows
+
+
+def print_comparison(rows: List[Dict]):
+    print("\nConfronto con il riferimento:")
+    for row in rows:
+        print(f"  {row['case']:<30} {row['size']:>7}  {row['baseline']:9.4f} s -> {row['current']:9.4f} s "
+              f"({row['ratio']:5.2f}x, soglia {1 + row['threshold']:.2f}x)  {row['status']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="partite sintetiche")
+    parser.add_argument("--cases", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--repeats", type=int, default=3, help="esecuzioni per caso (si tiene la migliore)")
+    parser.add_argument("--max-files", type=int, default=10000,
+                        help="dimensione massima per i casi su file JSON (circa 50 KB a partita)")
+    parser.add_argument("--output", default=None, help="file JSON dei risultati (predefinito: benchmarks/results/)")
+    parser.add_argument("--baseline", default=None, help="riferimento con cui confrontare i risultati")
+    parser.add_argument("--threshold", type=float, default=0.25, help="rallentamento tollerato (0.25 = +25%%)")
+    parser.add_argument("--min-delta", type=float, default=0.005, help="differenza minima in secondi")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, default=None,
+                        help="salva i risultati come nuovo riferimento")
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.sizes, args.cases, args.repeats, args.max_files)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    write_json_file(output, report)
+    print(f"\nRisultati salvati in: {output}")
+
+    if args.save_baseline:
+        write_json_file(args.save_baseline, report)
+        print(f"Riferimento salvato in: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, args.threshold, args.min_delta)
+        report['comparison'] = rows
+        write_json_file(output, report)
+        print_comparison(rows)
+        regressions = [row for row in rows if row['status'] == 'regressione']
+        if regressions:
+            print(f"\n{len(regressions)} regressioni oltre la soglia")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
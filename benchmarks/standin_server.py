@@ -0,0 +1,335 @@
+"""
+Server HTTP locale che simula api-football (RapidAPI) e Open-Meteo.
+
+Le risposte sono costruite dai file di match_data/: partite per data, statistiche
+squadra, statistiche/eventi/formazioni delle partite (anche in blocco con
+fixtures?ids=), ultime partite di una squadra,
+geocoding e archivio meteo. Latenza, errori e limiti di frequenza sono configurabili,
+così throughput e backoff del collector si possono misurare senza rete.
+
+Uso:
+    python benchmarks/standin_server.py --port 8765 --latency-ms 120 --error-rate 0.02 --rate-limit 300
+
+Poi, nel processo da testare:
+    RAPIDAPI_KEY=test
+    RAPIDAPI_BASE_URL=http://127.0.0.1:8765/v3
+    OPEN_METEO_GEOCODING_URL=http://127.0.0.1:8765/v1/search
+    OPEN_METEO_ARCHIVE_URL=http://127.0.0.1:8765/v1/archive
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from shared_utils.rate_limiter import TokenBucket  # noqa: E402
+from synthetic_data import SEED_DATA_DIR, load_seed_matches  # noqa: E402
+
+FIXTURE_KEYS = ('fixture', 'league', 'teams', 'goals')
+SUB_RESOURCES = {
+    'statistics': 'match_statistics',
+    'events': 'match_events',
+    'lineups': 'lineups',
+}
+
+
+def api_wrapper(endpoint: str, parameters: Dict, response) -> Dict:
+    """Busta delle risposte api-football"""
+    return {
+        "get": endpoint,
+        "parameters": parameters,
+        "errors": [],
+        "results": len(response) if isinstance(response, list) else int(bool(response)),
+        "paging": {"current": 1, "total": 1},
+        "response": response,
+    }
+
+
+def _unit(*parts) -> float:
+    """Numero pseudo-casuale deterministico in [0, 1) dai valori indicati"""
+    digest = hashlib.md5("|".join(str(p) for p in parts).encode('utf-8')).hexdigest()
+    return int(digest[:8], 16) / 0x100000000
+
+
+class StandInData:
+    """Indici delle partite di match_data/ per rispondere alle richieste"""
+
+    def __init__(self, matches: List[Dict]):
+        self.fixtures_by_date = {}
+        self.fixtures_by_id = {}
+        self.team_stats = {}
+        self.team_fixtures = {}
+        self.leagues = {}
+        self.weather = {}  # (città, timestamp all'ora) -> meteo registrato
+        for match in matches:
+            fixture = {key: match[key] for key in FIXTURE_KEYS}
+            fixture_id = match['fixture']['id']
+            self.fixtures_by_id[fixture_id] = match
+            self.fixtures_by_date.setdefault(match['fixture']['date'][:10], []).append(fixture)
+            league_id = match['league']['id']
+            self.leagues[league_id] = match['league']
+            for side, stats_key in (('home', 'home_stats'), ('away', 'away_stats')):
+                team_id = match['teams'][side]['id']
+                if match.get(stats_key):
+                    self.team_stats[(team_id, league_id)] = match[stats_key]
+                self.team_fixtures.setdefault((team_id, league_id), []).append(fixture)
+            weather = match.get('weather')
+            if weather:
+                self.weather[(weather['city'], weather['timestamp'] // 3600)] = weather
+
+    @classmethod
+    def from_directory(cls, data_dir: str = SEED_DATA_DIR) -> 'StandInData':
+        return cls(load_seed_matches(data_dir))
+
+    @staticmethod
+    def coordinates(city: str) -> Tuple[float, float]:
+        """Coordinate deterministiche (in Europa) per un nome di città"""
+        return round(36 + _unit(city, 'lat') * 24, 4), round(-9 + _unit(city, 'lon') * 38, 4)
+
+    # api-football
+
+    def fixtures(self, params: Dict) -> Dict:
+        if 'date' in params:
+            response = self.fixtures_by_date.get(params['date'], [])
+        elif 'ids' in params:
+            ids = [int(fid) for fid in params['ids'].split('-') if fid][:20]
+            response = [self._fixture_detail(self.fixtures_by_id[fid]) for fid in ids if fid in self.fixtures_by_id]
+        elif 'id' in params:
+            match = self.fixtures_by_id.get(int(params['id']))
+            response = [self._fixture_detail(match)] if match else []
+        elif 'team' in params:
+            key = (int(params['team']), int(params.get('league', 0)))
+            ordered = sorted(self.team_fixtures.get(key, []), key=lambda f: f['fixture']['timestamp'], reverse=True)
+            response = ordered[:int(params.get('last', 4))]
+        else:
+            response = []
+        return api_wrapper('fixtures', params, response)
+
+    @staticmethod
+    def _fixture_detail(match: Dict) -> Dict:
+        """Dettaglio come in fixtures?id=: dati base più statistiche, eventi e formazioni"""
+        detail = {key: match[key] for key in FIXTURE_KEYS}
+        for resource, key in SUB_RESOURCES.items():
+            detail[resource] = (match.get(key) or {}).get('response', [])
+        return detail
+
+    def fixture_resource(self, resource: str, params: Dict) -> Dict:
+        match = self.fixtures_by_id.get(int(params.get('fixture', 0)))
+        payload = match.get(SUB_RESOURCES[resource]) if match else None
+        if payload:
+            return payload
+        return api_wrapper(f'fixtures/{resource}', params, [])
+
+    def team_statistics(self, params: Dict) -> Dict:
+        key = (int(params.get('team', 0)), int(params.get('league', 0)))
+        return api_wrapper('teams/statistics', params, self.team_stats.get(key, []))
+
+    def league(self, params: Dict) -> Dict:
+        league = self.leagues.get(int(params.get('id', 0)))
+        response = [{'league': league, 'seasons': [{'year': league['season']}]}] if league else []
+        return api_wrapper('leagues', params, response)
+
+    # Open-Meteo
+
+    def geocode(self, params: Dict) -> Dict:
+        name = params.get('name', '')
+        # Il collector cerca il nome ripulito ("Roma" per "Roma (RM)"): si usa la città
+        # registrata corrispondente, così l'archivio restituisce il meteo salvato
+        cities = {city for city, _ in self.weather}
+        city = name if name in cities else next((c for c in sorted(cities) if name and name in c), name)
+        lat, lon = self.coordinates(city)
+        return {'results': [{'name': name, 'latitude': lat, 'longitude': lon}]}
+
+    def archive(self, params: Dict) -> Dict:
+        lat, lon = float(params['latitude']), float(params['longitude'])
+        start = date.fromisoformat(params['start_date'])
+        end = date.fromisoformat(params['end_date'])
+        city = next((c for c, _ in self.weather if self.coordinates(c) == (lat, lon)), None)
+        hourly = {'time': [], 'temperature_2m': [], 'precipitation': [], 'windspeed_10m': [], 'weathercode': []}
+        hour = datetime.combine(start, datetime.min.time())
+        while hour.date() <= end:
+            recorded = self.weather.get((city, int(hour.timestamp()) // 3600)) if city else None
+            if recorded:
+                values = (recorded['temperature'], recorded['precipitation'],
+                          recorded['wind_speed'], recorded['weather_code'])
+            else:
+                values = (round(5 + _unit(lat, lon, hour, 't') * 20, 1),
+                          round(max(0.0, _unit(lat, lon, hour, 'p') * 3 - 2), 1),
+                          round(_unit(lat, lon, hour, 'w') * 25, 1),
+                          (0, 1, 2, 3, 61)[int(_unit(lat, lon, hour, 'c') * 5)])
+            hourly['time'].append(hour.strftime("%Y-%m-%dT%H:%M"))
+            for name, value in zip(('temperature_2m', 'precipitation', 'windspeed_10m', 'weathercode'), values):
+                hourly[name].append(value)
+            hour += timedelta(hours=1)
+        return {'latitude': lat, 'longitude': lon, 'timezone': params.get('timezone', 'GMT'), 'hourly': hourly}
+
+
+class StandInServer:
+    """
+    Server locale avviabile in un thread (per i benchmark) o da riga di comando.
+
+    Args:
+        data: indici delle partite
+        latency_ms: latenza media aggiunta a ogni risposta
+        jitter_ms: variazione massima (uniforme) attorno alla latenza media
+        error_rate: frazione delle richieste che risponde 500
+        rate_limit: richieste al minuto accettate sull'API RapidAPI, le altre ricevono 429
+        daily_quota: quota giornaliera dichiarata nell'header x-ratelimit-requests-remaining
+    """
+
+    def __init__(self, data: StandInData, host: str = '127.0.0.1', port: int = 0,
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 rate_limit: Optional[float] = None, daily_quota: int = 7500, seed: int = 42):
+        self.data = data
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limiter = TokenBucket(rate_limit, max(1, int(rate_limit // 60))) if rate_limit else None
+        self.daily_quota = daily_quota
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'rate_limited': 0}
+        self.rapidapi_calls = 0
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def client_env(self) -> Dict[str, str]:
+        """Variabili d'ambiente che puntano FootballDataCollector a questo server"""
+        return {
+            'RAPIDAPI_BASE_URL': f"{self.url}/v3",
+            'OPEN_METEO_GEOCODING_URL': f"{self.url}/v1/search",
+            'OPEN_METEO_ARCHIVE_URL': f"{self.url}/v1/archive",
+        }
+
+    def start(self) -> 'StandInServer':
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _route(self, path: str, params: Dict):
+        data = self.data
+        if path == '/v3/fixtures':
+            return data.fixtures(params)
+        if path.startswith('/v3/fixtures/') and path.rsplit('/', 1)[1] in SUB_RESOURCES:
+            return data.fixture_resource(path.rsplit('/', 1)[1], params)
+        if path == '/v3/teams/statistics':
+            return data.team_statistics(params)
+        if path == '/v3/leagues':
+            return data.league(params)
+        if path == '/v1/search':
+            return data.geocode(params)
+        if path == '/v1/archive':
+            return data.archive(params)
+        return None
+
+    def handle(self, path: str, params: Dict) -> Tuple[int, Dict[str, str], Dict]:
+        """Risposta (status, header, corpo) a una richiesta, con latenza, errori e limiti simulati"""
+        with self.lock:
+            self.stats['requests'] += 1
+            delay = max(0.0, self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            fail = self.random.random() < self.error_rate
+        time.sleep(delay)
+
+        headers = {}
+        is_rapidapi = path.startswith('/v3/')
+        if is_rapidapi:
+            if self.rate_limiter is not None and not self.rate_limiter.try_acquire():
+                with self.lock:
+                    self.stats['rate_limited'] += 1
+                return 429, {'Retry-After': '1'}, {'message': 'Too many requests'}
+            with self.lock:
+                self.rapidapi_calls += 1
+                remaining = max(0, self.daily_quota - self.rapidapi_calls)
+            headers['x-ratelimit-requests-limit'] = str(self.daily_quota)
+            headers['x-ratelimit-requests-remaining'] = str(remaining)
+            if remaining == 0:
+                return 429, headers, {'message': 'You have exceeded the DAILY quota'}
+        if fail:
+            with self.lock:
+                self.stats['errors'] += 1
+            return 500, headers, {'message': 'Simulated server error'}
+
+        body = self._route(path, params)
+        if body is None:
+            return 404, headers, {'message': f'Endpoint sconosciuto: {path}'}
+        return 200, headers, body
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, come le API reali
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                params = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+                status, headers, body = server.handle(parts.path.rstrip('/'), params)
+                payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def summary(self) -> str:
+        return (f"server locale: {self.stats['requests']} richieste, {self.stats['errors']} errori simulati, "
+                f"{self.stats['rate_limited']} risposte 429")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=SEED_DATA_DIR, help="directory con i file partita")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latenza media per risposta")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="variazione della latenza")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="frazione di risposte 500")
+    parser.add_argument("--rate-limit", type=float, default=None, help="richieste RapidAPI al minuto (oltre: 429)")
+    parser.add_argument("--daily-quota", type=int, default=7500, help="quota giornaliera simulata")
+    args = parser.parse_args()
+
+    server = StandInServer(
+        StandInData.from_directory(args.data_dir), args.host, args.port,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        rate_limit=args.rate_limit, daily_quota=args.daily_quota
+    )
+    print(f"Server locale su {server.url} ({len(server.data.fixtures_by_id)} partite)")
+    for name, value in server.client_env().items():
+        print(f"  {name}={value}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{server.summary()}")
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Generatori di dati sintetici per i benchmark.
+
+Partono dai file reali di match_data/ e li replicano con nuovi fixture id,
+così lo schema resta identico a quello prodotto da MatchDataManager.
+"""
+import copy
+import json
+import os
+import random
+from typing import Dict, Iterator, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_DATA_DIR = os.path.join(REPO_ROOT, "match_data")
+
+# Offset dei fixture id sintetici, fuori dall'intervallo degli id reali
+SYNTHETIC_ID_OFFSET = 90_000_000
+
+
+def load_seed_matches(seed_dir: str = SEED_DATA_DIR) -> List[Dict]:
+    """Carica i file partita reali usati come modello"""
+    matches = []
+    for filename in sorted(os.listdir(seed_dir)):
+        if filename.startswith('match_') and filename.endswith('.json'):
+            with open(os.path.join(seed_dir, filename), 'r', encoding='utf-8') as f:
+                matches.append(json.load(f))
+    return matches
+
+
+def iter_synthetic_matches(count: int, seed_matches: List[Dict] = None,
+                           seed: int = 42, vary_stats: bool = True) -> Iterator[Dict]:
+    """
+    Genera `count` partite sintetiche clonando a rotazione le partite modello.
+
+    Con vary_stats le medie gol e il risultato vengono perturbati, così
+    le formule non vedono sempre gli stessi 73 valori.
+    """
+    seed_matches = seed_matches or load_seed_matches()
+    rng = random.Random(seed)
+    for i in range(count):
+        match = copy.deepcopy(seed_matches[i % len(seed_matches)])
+        fixture_id = SYNTHETIC_ID_OFFSET + i
+        match['fixture']['id'] = fixture_id
+        match['fixture']['timestamp'] += (i // len(seed_matches)) * 7 * 24 * 3600
+        if vary_stats:
+            match['goals'] = {'home': rng.randint(0, 4), 'away': rng.randint(0, 3)}
+            for side in ('home_stats', 'away_stats'):
+                for kind in ('for', 'against'):
+                    averages = match[side]['goals'][kind]['average']
+                    for venue in ('home', 'away', 'total'):
+                        averages[venue] = f"{rng.uniform(0.3, 2.8):.1f}"
+        yield match
+
+
+def write_match_files(target_dir: str, count: int, seed_matches: List[Dict] = None,
+                      indent: int = 4) -> List[str]:
+    """Scrive `count` file partita sintetici nel formato di MatchDataManager.save_match_data"""
+    os.makedirs(target_dir, exist_ok=True)
+    filenames = []
+    for match in iter_synthetic_matches(count, seed_matches):
+        filename = f"match_2025-01-01_{match['fixture']['id']}.json"
+        with open(os.path.join(target_dir, filename), 'w', encoding='utf-8') as f:
+            json.dump(match, f, ensure_ascii=False, indent=indent)
+        filenames.append(filename)
+    return filenames
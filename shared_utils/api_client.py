@@ -0,0 +1,517 @@
+import requests
+import threading
+import time
+from datetime import datetime
+import logging
+from typing import Dict, List, Optional, Tuple
+import os
+
+from shared_utils.cassette import Cassette
+from shared_utils.geocoding_cache import GeocodingCache
+from shared_utils.http_client import HttpClient
+from shared_utils.quota_ledger import ENDPOINT_PRIORITIES, PRIORITY_NORMAL, QuotaLedger
+from shared_utils.rate_limiter import TokenBucket
+from shared_utils.request_planner import RequestPlanner
+from shared_utils.response_cache import FOREVER, LIVE_FIXTURE_TTL, USE_POLICY, ResponseCache, fixture_is_final
+
+
+# Descrizioni dei codici meteo WMO restituiti da Open-Meteo
+WEATHER_DESCRIPTIONS = {
+    0: "Cielo sereno",
+    1: "Prevalentemente sereno",
+    2: "Parzialmente nuvoloso",
+    3: "Cielo coperto",
+    45: "Nebbia",
+    48: "Nebbia con brina",
+    51: "Pioggerella leggera",
+    53: "Pioggerella moderata",
+    55: "Pioggerella intensa",
+    61: "Pioggia leggera",
+    63: "Pioggia moderata",
+    65: "Pioggia intensa",
+    71: "Neve leggera",
+    73: "Neve moderata",
+    75: "Neve intensa",
+    77: "Neve a chicchi",
+    80: "Acquazzoni leggeri",
+    81: "Acquazzoni moderati",
+    82: "Acquazzoni violenti",
+    85: "Nevicate leggere",
+    86: "Nevicate intense",
+    95: "Temporale",
+    96: "Temporale con grandine leggera",
+    99: "Temporale con grandine intensa"
+}
+
+
+# Risorse incluse nel dettaglio di fixtures?ids=: campo della risposta -> (endpoint singolo, chiave partita)
+FIXTURE_DETAIL_RESOURCES = {
+    'statistics': ('fixtures/statistics', 'match_statistics'),
+    'events': ('fixtures/events', 'match_events'),
+    'lineups': ('fixtures/lineups', 'lineups'),
+}
+FIXTURE_IDS_PER_REQUEST = 20  # limite di api-football per fixtures?ids=
+
+
+class FootballDataCollector:
+    """
+    Client unico per api-football (RapidAPI) e Open-Meteo, usato sia da
+    x_score_calculator sia da x_optimizer.
+    """
+
+    def __init__(self, max_daily_calls: int = None, pool_size: int = None,
+                 connect_timeout: float = None, read_timeout: float = None,
+                 cassette: Optional[Cassette] = None):
+        self.api_key = os.getenv('RAPIDAPI_KEY')
+        if not self.api_key:
+            raise ValueError("❌ RAPIDAPI_KEY non trovata nelle variabili d'ambiente. Controlla il file .env.")
+
+        self.headers = {
+            'x-rapidapi-host': 'api-football-v1.p.rapidapi.com',
+            'x-rapidapi-key': self.api_key
+        }
+        # URL configurabili per puntare al server locale di test (benchmarks/standin_server.py)
+        self.base_url = os.getenv('RAPIDAPI_BASE_URL', 'https://api-football-v1.p.rapidapi.com/v3')
+        self.season = int(os.getenv('FOOTBALL_SEASON', 2024))
+        self.geocoding_url = os.getenv('OPEN_METEO_GEOCODING_URL', 'https://geocoding-api.open-meteo.com/v1/search')
+        self.weather_url = os.getenv('OPEN_METEO_ARCHIVE_URL', 'https://archive-api.open-meteo.com/v1/archive')
+        self.geocoding_cache = GeocodingCache()  # città/stadio -> coordinate, persistente
+        self.stats_cache = {}  # Cache per le statistiche
+        self.daily_calls = 0  # chiamate effettuate da questo processo
+        # Quota giornaliera del piano (Pro: 7500), configurabile per installazioni con piani diversi
+        self.MAX_DAILY_CALLS = max_daily_calls or int(os.getenv('RAPIDAPI_MAX_DAILY_CALLS', 7500))
+        # Registro della quota condiviso tra processi (calculator, optimizer, job cron), per giorno UTC
+        self.quota = QuotaLedger(self.MAX_DAILY_CALLS)
+        self.team_stats_cache = {}  # Cache per statistiche squadre
+        self.fixtures_cache = {}  # Cache per partite recenti
+        self.response_cache = ResponseCache()  # Cache persistente su disco, condivisa tra esecuzioni
+        self.calls_lock = threading.Lock()  # daily_calls è condiviso tra i thread di raccolta
+        # Sessioni keep-alive per host, con pool e timeout configurabili; cassetta
+        # record/replay opzionale (parametro o XGOALS_HTTP_CASSETTE / XGOALS_HTTP_MODE)
+        self.http = HttpClient(pool_size, connect_timeout, read_timeout,
+                               cassette=cassette or Cassette.from_env())
+
+        # Limiti di frequenza: RapidAPI (piano Pro) e Open-Meteo hanno bucket separati,
+        # le chiamate meteo non consumano la quota RapidAPI
+        self.rapidapi_limiter = TokenBucket(
+            float(os.getenv('RAPIDAPI_CALLS_PER_MINUTE', 300)),
+            int(os.getenv('RAPIDAPI_BURST', 5))
+        )
+        self.open_meteo_limiter = TokenBucket(
+            float(os.getenv('OPEN_METEO_CALLS_PER_MINUTE', 500)),
+            int(os.getenv('OPEN_METEO_BURST', 10))
+        )
+
+        # Lista delle leghe da monitorare
+        self.monitored_leagues = {
+            # Competizioni UEFA
+            'Champions League': 2,
+            'Europa League': 3,
+            'Conference League': 848,
+
+            # Europa Top 5 (Prima e Seconda Divisione)
+            'Premier League': 39,
+            'Championship': 40,
+            'La Liga': 140,
+            'La Liga 2': 141,
+            'Bundesliga': 78,
+            '2. Bundesliga': 79,
+            'Serie A': 135,
+            'Serie B': 136,
+            'Ligue 1': 61,
+            'Ligue 2': 62,
+
+            # Altri campionati europei (Prima e Seconda Divisione)
+            'Eredivisie': 88,  # Olanda 1
+            'Eerste Divisie': 89,  # Olanda 2
+            'Primeira Liga': 94,  # Portogallo 1
+            'Liga Portugal 2': 95,  # Portogallo 2
+            'Super Lig': 203,  # Turchia 1
+            '1. Lig': 204,  # Turchia 2
+            'Super League': 207,  # Svizzera 1
+            'Challenge League': 208,  # Svizzera 2
+            'Pro League': 144,  # Belgio 1
+            'Challenger Pro League': 145,  # Belgio 2
+
+            # Principali campionati extra-europei (Solo Prima Divisione)
+            'Serie A Brazil': 71,  # Brasile
+            'Primera Division': 128,  # Argentina
+            'MLS': 253,  # USA
+            'J1 League': 98,  # Giappone
+            'A-League': 188,  # Australia
+            'Saudi Pro League': 307  # Arabia Saudita
+        }
+
+    def clean_city_name(self, city: str) -> str:
+        """Pulisce il nome della città rimuovendo informazioni aggiuntive"""
+        # Dizionario delle sostituzioni per casi specifici
+        city_replacements = {
+            "Ciudad de Córdoba, Provincia de Córdoba": "Cordoba,Argentina",
+            "Capital Federal, Ciudad de Buenos Aires": "Buenos Aires,Argentina",
+            "Junín, Provincia de Buenos Aires": "Junin,Argentina",
+            "La Plata, Provincia de Buenos Aires": "La Plata,Argentina"
+        }
+
+        # Controlla se la città è nel dizionario delle sostituzioni
+        if city in city_replacements:
+            return city_replacements[city]
+
+        # Se non è nel dizionario, prendi solo la prima parte (prima della virgola)
+        if "," in city:
+            return city.split(",")[0].strip()
+
+        return city
+
+    def _make_request(self, endpoint: str, params: Dict, priority: Optional[int] = None) -> Dict:
+        """
+        Richiesta ad api-football: dalla cache se possibile, altrimenti prenotando
+        una chiamata nel registro quota con la priorità indicata (default per endpoint).
+        Solleva QuotaDeferred se la richiesta va rinviata, QuotaExceeded a quota esaurita.
+        """
+        cached = self.response_cache.get(endpoint, params)
+        if cached is not None:
+            return cached
+
+        if priority is None:
+            priority = ENDPOINT_PRIORITIES.get(endpoint, PRIORITY_NORMAL)
+
+        # Risposte dalla cassetta (replay): nessuna chiamata reale, non consumano quota né limite di frequenza
+        replaying = self.http.replaying
+        for attempt in range(3):  # 3 tentativi
+            if not replaying:
+                self.quota.acquire(priority)
+                self.rapidapi_limiter.acquire()
+            try:
+                response = self.http.get(
+                    f"{self.base_url}/{endpoint}",
+                    headers=self.headers,
+                    params=params
+                )
+                if not replaying:
+                    with self.calls_lock:
+                        self.daily_calls += 1
+                    # Le intestazioni registrate nella cassetta non descrivono la quota attuale
+                    remaining = response.headers.get('x-ratelimit-requests-remaining')
+                    if remaining is not None and remaining.isdigit():
+                        self.quota.sync_remaining(int(remaining))
+                response.raise_for_status()
+                data = response.json()
+                self.response_cache.put(endpoint, params, data)
+                return data
+            except requests.exceptions.RequestException as e:
+                if e.response is not None:
+                    not_served = e.response.status_code == 429
+                else:
+                    not_served = not isinstance(e, requests.exceptions.ReadTimeout)
+                if not_served and not replaying:
+                    # Richiesta respinta dal limite di frequenza o mai arrivata al server: non consuma quota
+                    self.quota.release(priority)
+                if attempt == 2 or replaying:  # Ultimo tentativo; in replay la risposta sarebbe la stessa
+                    raise
+                retry_after = e.response.headers.get('Retry-After') if e.response is not None else None
+                if retry_after is not None and retry_after.isdigit():
+                    time.sleep(int(retry_after))  # 429: attesa indicata dal server
+                else:
+                    time.sleep(2 ** attempt)  # Exponential backoff
+
+    def get_team_stats(self, team_id: int, league_id: int, priority: Optional[int] = None) -> Dict:
+        """Recupera le statistiche di una squadra specifica"""
+        cache_key = f"team_{team_id}_{league_id}"
+        if cache_key in self.stats_cache:
+            return self.stats_cache[cache_key]
+
+        stats = self._make_request("teams/statistics", {
+            "team": team_id,
+            "league": league_id,
+            "season": self.season
+        }, priority)
+        self.stats_cache[cache_key] = stats
+        return stats
+
+    def get_team_stats_batch(self, teams: List[tuple]) -> Dict:
+        """
+        Recupera statistiche per multiple squadre: ogni coppia (squadra, lega)
+        viene richiesta una sola volta, le risposte già in cache non consumano quota
+        """
+        planner = RequestPlanner(self)
+        plan = planner.plan_team_stats(teams)
+        planner.execute(plan)
+        print(plan.summary())
+        return {
+            f"{team_id}_{league_id}": self.get_team_stats(team_id, league_id)
+            for team_id, league_id in dict.fromkeys(teams)
+        }
+
+    def get_team_recent_form(self, team_id: int, league_id: int, priority: Optional[int] = None) -> Dict:
+        """Recupera le ultime 4 partite di una squadra"""
+        cache_key = f"team_form_{team_id}_{league_id}"
+        if cache_key in self.stats_cache:
+            return self.stats_cache[cache_key]
+
+        stats = self._make_request("fixtures", {
+            "team": team_id,
+            "league": league_id,
+            "season": self.season,
+            "last": 4
+        }, priority)
+        self.stats_cache[cache_key] = stats
+        return stats
+
+    def get_league_stats(self, league_id: int, priority: Optional[int] = None) -> Dict:
+        """Recupera le statistiche di un'intera lega in una volta"""
+        cache_key = f"league_{league_id}"
+        if cache_key in self.stats_cache:
+            return self.stats_cache[cache_key]
+
+        stats = self._make_request("leagues", {
+            "id": league_id,
+            "season": self.season
+        }, priority)
+        self.stats_cache[cache_key] = stats
+        return stats
+
+    def get_match_statistics(self, fixture_id: int, priority: Optional[int] = None) -> Dict:
+        """Recupera statistiche dettagliate della partita"""
+        return self._make_request("fixtures/statistics", {
+            "fixture": fixture_id
+        }, priority)
+
+    def get_match_events(self, fixture_id: int, priority: Optional[int] = None) -> Dict:
+        """Recupera eventi della partita (goals, cards, subs)"""
+        return self._make_request("fixtures/events", {
+            "fixture": fixture_id
+        }, priority)
+
+    def get_match_lineups(self, fixture_id: int, priority: Optional[int] = None) -> Dict:
+        """Recupera formazioni e info giocatori"""
+        return self._make_request("fixtures/lineups", {
+            "fixture": fixture_id
+        }, priority)
+
+    def get_fixture_details_batch(self, fixture_ids: List[int], priority: Optional[int] = PRIORITY_NORMAL,
+                                  chunk_size: int = FIXTURE_IDS_PER_REQUEST) -> Dict[int, Dict]:
+        """
+        Statistiche, eventi e formazioni di più partite con fixtures?ids= (fino a 20 per richiesta).
+
+        Restituisce fixture id -> {'match_statistics', 'match_events', 'lineups'}, ognuno
+        nella stessa forma delle risposte di get_match_statistics/events/lineups; le
+        risposte vengono salvate anche nella cache sotto le chiavi per partita, così le
+        chiamate singole successive non consumano quota. Le partite dei blocchi falliti
+        sono omesse e vanno recuperate singolarmente.
+        """
+        unique_ids = list(dict.fromkeys(int(fixture_id) for fixture_id in fixture_ids))
+        details = {}
+        requests_made = 0
+        for start in range(0, len(unique_ids), chunk_size):
+            chunk = unique_ids[start:start + chunk_size]
+            try:
+                data = self._make_request("fixtures", {"ids": "-".join(str(fid) for fid in chunk)}, priority)
+            except Exception as e:
+                print(f"Errore nel recupero dei dettagli per {len(chunk)} partite: {str(e)}")
+                continue
+            requests_made += 1
+            for fixture in data.get("response", []):
+                fixture_id = fixture["fixture"]["id"]
+                details[fixture_id] = {}
+                # Partita non conclusa (NS, 1H, HT, ...): statistiche ed eventi cambieranno ancora
+                ttl = FOREVER if fixture_is_final(fixture) else LIVE_FIXTURE_TTL
+                for resource, (endpoint, key) in FIXTURE_DETAIL_RESOURCES.items():
+                    params = {"fixture": fixture_id}
+                    wrapper = {
+                        "get": endpoint,
+                        "parameters": {"fixture": str(fixture_id)},
+                        "errors": [],
+                        "results": len(fixture.get(resource) or []),
+                        "paging": {"current": 1, "total": 1},
+                        "response": fixture.get(resource) or [],
+                    }
+                    self.response_cache.put(endpoint, params, wrapper,
+                                            ttl=ttl if wrapper["response"] else USE_POLICY)
+                    details[fixture_id][key] = wrapper
+
+        print(f"📦 Dettagli di {len(details)}/{len(unique_ids)} partite con {requests_made} richieste "
+              f"invece di {len(unique_ids) * len(FIXTURE_DETAIL_RESOURCES)}")
+        return details
+
+    def geocode_city(self, city: str, venue_id: Optional[int] = None) -> Optional[Tuple[float, float]]:
+        """Coordinate della città: dalla cache persistente (per stadio o città) o dal geocoding Open-Meteo"""
+        clean_city = self.clean_city_name(city)
+        coords = self.geocoding_cache.get(clean_city, venue_id)
+        if coords is not None:
+            return coords
+
+        print(f"Recupero coordinate per la città: {clean_city} (originale: {city})")
+        if not self.http.replaying:
+            self.open_meteo_limiter.acquire()
+        geocoding_response = self.http.get(self.geocoding_url, params={"name": clean_city, "count": 1})
+        location_data = geocoding_response.json()
+
+        if not location_data.get("results"):
+            print(f"Città non trovata: {clean_city}")
+            return None
+
+        lat = location_data["results"][0]["latitude"]
+        lon = location_data["results"][0]["longitude"]
+        self.geocoding_cache.put(clean_city, lat, lon, venue_id)
+        return lat, lon
+
+    def _fetch_hourly_weather(self, lat: float, lon: float, start_date: str, end_date: str) -> Dict:
+        """Dati meteo orari dall'archivio Open-Meteo per un intervallo di date"""
+        params = {
+            "latitude": lat,
+            "longitude": lon,
+            "start_date": start_date,
+            "end_date": end_date,
+            "hourly": "temperature_2m,precipitation,windspeed_10m,weathercode",
+            "timezone": "Europe/Rome"
+        }
+        if not self.http.replaying:
+            self.open_meteo_limiter.acquire()
+        weather_response = self.http.get(self.weather_url, params=params)
+        return weather_response.json()["hourly"]
+
+    @staticmethod
+    def _weather_at(hourly: Dict, hour_index: int, city: str, match_timestamp: int) -> Dict:
+        """Condizioni meteo all'ora della partita (indice nelle serie orarie)"""
+        weather_code = hourly["weathercode"][hour_index]
+        return {
+            "city": city,
+            "temperature": hourly["temperature_2m"][hour_index],
+            "precipitation": hourly["precipitation"][hour_index],
+            "wind_speed": hourly["windspeed_10m"][hour_index],
+            "weather_code": weather_code,
+            "weather_description": WEATHER_DESCRIPTIONS.get(weather_code, "Condizioni meteo non classificate"),
+            "timestamp": match_timestamp
+        }
+
+    def get_match_weather(self, fixture_id: int, city: str, match_timestamp: int,
+                          venue_id: Optional[int] = None) -> Dict:
+        """Recupera le condizioni meteorologiche dalla API di Open-Meteo usando la città"""
+        try:
+            # Converti il timestamp in data/ora
+            match_date = datetime.fromtimestamp(match_timestamp)
+
+            # Prima otteniamo le coordinate della città
+            coords = self.geocode_city(city, venue_id)
+            if coords is None:
+                return {}
+            lat, lon = coords
+
+            # Ora prendiamo i dati meteo
+            print(f"Recupero dati meteo per {city} ({lat}, {lon}) del {match_date}")
+            day = match_date.strftime("%Y-%m-%d")
+            hourly = self._fetch_hourly_weather(lat, lon, day, day)
+
+            # Estrai i dati dell'ora della partita
+            weather_info = self._weather_at(hourly, match_date.hour, city, match_timestamp)
+            print(f"Dati meteo recuperati con successo per {city}")
+            return weather_info
+
+        except Exception as e:
+            print(f"Errore nel recupero dati meteo per {fixture_id} ({city}): {str(e)}")
+            return {}
+
+    def get_weather_batch(self, fixtures: List[Dict], max_window_days: int = 7) -> Dict[int, Dict]:
+        """
+        Recupera il meteo di più partite raggruppandole per località.
+
+        Le partite nella stessa località (stesse coordinate) e in una finestra di
+        max_window_days giorni condividono un'unica richiesta all'archivio Open-Meteo.
+        Restituisce fixture id -> dati meteo; le partite senza risultato sono omesse
+        e possono essere recuperate singolarmente con get_match_weather.
+        """
+        groups = {}
+        for match in fixtures:
+            venue = match['fixture'].get('venue') or {}
+            city = venue.get('city')
+            if not city:
+                continue
+            try:
+                coords = self.geocode_city(city, venue.get('id'))
+            except Exception as e:
+                print(f"Errore nel geocoding di {city}: {str(e)}")
+                continue
+            if coords is not None:
+                groups.setdefault(coords, []).append(match)
+
+        results = {}
+        archive_requests = 0
+        for (lat, lon), matches in groups.items():
+            matches.sort(key=lambda m: m['fixture']['timestamp'])
+            window = []
+            window_start = None
+            for match in matches:
+                match_day = datetime.fromtimestamp(match['fixture']['timestamp']).date()
+                if window and (match_day - window_start).days >= max_window_days:
+                    results.update(self._fetch_weather_window(lat, lon, window))
+                    archive_requests += 1
+                    window = []
+                if not window:
+                    window_start = match_day
+                window.append(match)
+            if window:
+                results.update(self._fetch_weather_window(lat, lon, window))
+                archive_requests += 1
+
+        print(f"🌦️ Meteo recuperato per {len(results)}/{len(fixtures)} partite con {archive_requests} "
+              f"richieste all'archivio ({len(groups)} località, "
+              f"{self.geocoding_cache.hits} coordinate dalla cache)")
+        return results
+
+    def _fetch_weather_window(self, lat: float, lon: float, matches: List[Dict]) -> Dict[int, Dict]:
+        """Una richiesta all'archivio per tutte le partite di una località in una finestra di date"""
+        match_dates = [datetime.fromtimestamp(match['fixture']['timestamp']) for match in matches]
+        start = min(match_dates).date()
+        end = max(match_dates).date()
+        try:
+            hourly = self._fetch_hourly_weather(lat, lon, start.isoformat(), end.isoformat())
+        except Exception as e:
+            print(f"Errore nel recupero dati meteo per ({lat}, {lon}) {start} - {end}: {str(e)}")
+            return {}
+
+        results = {}
+        for match, match_date in zip(matches, match_dates):
+            hour_index = (match_date.date() - start).days * 24 + match_date.hour
+            try:
+                results[match['fixture']['id']] = self._weather_at(
+                    hourly, hour_index, match['fixture']['venue']['city'], match['fixture']['timestamp']
+                )
+            except (IndexError, KeyError) as e:
+                print(f"Dati meteo mancanti per la partita {match['fixture']['id']}: {str(e)}")
+        return results
+
+    def get_matches(self, date: str, priority: Optional[int] = None) -> List[Dict]:
+        """Recupera solo le partite delle leghe monitorate"""
+        matches = self._make_request("fixtures", {
+            "date": date,
+            "timezone": "Europe/Rome"
+        }, priority)
+
+        # Filtra le partite per le leghe monitorate
+        filtered_matches = {
+            "get": matches["get"],
+            "parameters": matches["parameters"],
+            "errors": matches["errors"],
+            "results": matches["results"],
+            "response": [
+                match for match in matches["response"]
+                if match["league"]["id"] in self.monitored_leagues.values()
+            ]
+        }
+
+        print(f"Trovate {len(matches['response'])} partite totali")
+        print(f"Filtrate {len(filtered_matches['response'])} partite dei campionati monitorati")
+
+        return filtered_matches
+
+    def latency_summary(self) -> str:
+        """Riepilogo delle latenze per host (le connessioni riusate abbassano media e p50)"""
+        lines = [self.http.cassette.summary()] if self.http.cassette is not None else []
+        for host, stats in self.http.latency_summary().items():
+            if not stats['count']:
+                continue
+            lines.append(
+                f"{host}: {stats['count']} richieste, media {stats['avg_ms']:.0f} ms, "
+                f"p50 {stats['p50_ms']:.0f} ms, p95 {stats['p95_ms']:.0f} ms, errori {stats['errors']}"
+            )
+        return "\n".join(lines)
\ No newline at end of file
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Modalità delle cassette HTTP
+MODE_OFF = 'off'          # solo rete
+MODE_RECORD = 'record'    # rete, salvando ogni risposta nella cassetta
+MODE_REPLAY = 'replay'    # solo cassetta, nessuna richiesta di rete
+CASSETTE_MODES = (MODE_OFF, MODE_RECORD, MODE_REPLAY)
+
+# Header di risposta conservati nella cassetta. Gli header di quota
+# (x-ratelimit-*) sono esclusi: in replay altererebbero il registro quota locale
+RECORDED_HEADERS = ('content-type',)
+
+
+class CassetteMiss(LookupError):
+    """Richiesta non presente nella cassetta in modalità replay"""
+
+
+class Cassette:
+    """
+    Registrazione delle risposte HTTP su disco, un file JSON per richiesta.
+
+    La chiave è percorso + parametri ordinati, senza host né header: una cassetta
+    registrata contro le API reali si può riprodurre anche con base URL diverse
+    (es. il server locale di benchmarks/standin_server.py) e non contiene la chiave API.
+    """
+
+    def __init__(self, path: str, mode: str = MODE_REPLAY):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Modalità cassetta non valida: {mode} (valide: {', '.join(CASSETTE_MODES)})")
+        self.path = path
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.stats = {'replayed': 0, 'recorded': 0, 'missing': 0}
+        os.makedirs(self.path, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> Optional['Cassette']:
+        """Cassetta configurata da XGOALS_HTTP_CASSETTE / XGOALS_HTTP_MODE (default: replay)"""
+        path = os.getenv('XGOALS_HTTP_CASSETTE')
+        mode = os.getenv('XGOALS_HTTP_MODE', MODE_REPLAY)
+        if not path or mode == MODE_OFF:
+            return None
+        return cls(path, mode)
+
+    @staticmethod
+    def make_key(url: str, params: Optional[Dict]) -> str:
+        path = urlsplit(url).path.rstrip('/')
+        normalized = sorted((str(k), str(v)) for k, v in (params or {}).items())
+        return f"GET {path}?{json.dumps(normalized, separators=(',', ':'))}"
+
+    def _file_for(self, key: str) -> str:
+        return os.path.join(self.path, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def load(self, url: str, params: Optional[Dict]) -> requests.Response:
+        """Ricostruisce la risposta registrata; CassetteMiss se assente"""
+        key = self.make_key(url, params)
+        filepath = self._file_for(key)
+        if not os.path.exists(filepath):
+            with self.lock:
+                self.stats['missing'] += 1
+            raise CassetteMiss(f"Risposta non registrata: {key}")
+        with open(filepath, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response._content = entry['body'].encode('utf-8')
+        response.encoding = 'utf-8'
+        response.url = url
+        with self.lock:
+            self.stats['replayed'] += 1
+        return response
+
+    def save(self, url: str, params: Optional[Dict], response: requests.Response):
+        """Registra una risposta (scrittura atomica, sicura tra thread)"""
+        key = self.make_key(url, params)
+        entry = {
+            'key': key,
+            'status': response.status_code,
+            'headers': {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers},
+            'body': response.text,
+        }
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.part', dir=self.path)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, self._file_for(key))
+        with self.lock:
+            self.stats['recorded'] += 1
+
+    def summary(self) -> str:
+        return (f"cassetta '{self.path}' ({self.mode}): {self.stats['replayed']} riprodotte, "
+                f"{self.stats['recorded']} registrate, {self.stats['missing']} mancanti")
@@ -0,0 +1,341 @@
+"""
+Linguaggio di espressioni per le formule xGoals.
+
+Una formula è un'espressione Python ristretta sulle feature di
+match_features (es. home_for_avg_home, possession_home) e sui parametri
+(home_weight, away_weight, off_weight, def_weight, league_factor):
+
+    (home_for_avg_home * home_weight + away_for_avg_away * away_weight) * league_factor
+
+Sono ammessi numeri, + - * / **, confronti, and/or/not, 'a if cond else b' e
+le funzioni di SAFE_FUNCTIONS. Il testo viene analizzato con ast e validato
+contro una lista di nodi consentiti (niente attributi, indici, lambda o
+chiamate arbitrarie), poi compilato in una closure NumPy che valuta la formula
+su tutte le partite in un solo passaggio. Le formule compilate sono in cache
+per impronta dell'espressione.
+"""
+import ast
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Mapping, Tuple
+
+import numpy as np
+
+from shared_utils.match_features import FEATURE_NAMES, MatchFeatures, MatchRecord
+
+# Parametri disponibili nelle formule (i campi di FormulaParameters)
+PARAMETER_NAMES = ('home_weight', 'away_weight', 'off_weight', 'def_weight', 'league_factor')
+
+# Funzioni ammesse: nome -> (funzione NumPy, numero minimo e massimo di argomenti)
+SAFE_FUNCTIONS = {
+    'max': (np.maximum, 2, 8),
+    'min': (np.minimum, 2, 8),
+    'abs': (np.abs, 1, 1),
+    'sqrt': (np.sqrt, 1, 1),
+    'log': (np.log, 1, 1),
+    'exp': (np.exp, 1, 1),
+    'clip': (np.clip, 3, 3),
+    'where': (np.where, 3, 3),
+}
+
+_BINARY_OPERATORS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.divide,
+    ast.Pow: np.power,
+}
+_UNARY_OPERATORS = {
+    ast.USub: np.negative,
+    ast.UAdd: np.positive,
+    ast.Not: np.logical_not,
+}
+_COMPARE_OPERATORS = {
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal,
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+}
+_BOOL_OPERATORS = {
+    ast.And: np.logical_and,
+    ast.Or: np.logical_or,
+}
+
+MAX_EXPRESSION_LENGTH = 4000
+MAX_NODES = 500
+COMPILED_CACHE_SIZE = 256
+
+
+class FormulaSyntaxError(ValueError):
+    """Espressione non valida o con costrutti non consentiti"""
+
+
+def _parse(expression: str) -> ast.Expression:
+    if not isinstance(expression, str) or not expression.strip():
+        raise FormulaSyntaxError("Espressione vuota")
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise FormulaSyntaxError(f"Espressione troppo lunga (max {MAX_EXPRESSION_LENGTH} caratteri)")
+    try:
+        return ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as e:
+        raise FormulaSyntaxError(f"Sintassi non valida: {e.msg} (colonna {e.offset})") from None
+
+
+def validate(expression: str, parameter_names: Iterable[str] = PARAMETER_NAMES
+             ) -> Tuple[ast.Expression, Tuple[str, ...], Tuple[str, ...]]:
+    """
+    Analizza e valida un'espressione.
+
+    Returns:
+        (albero, feature usate, parametri usati)
+
+    Raises:
+        FormulaSyntaxError: sintassi errata, nome sconosciuto o costrutto non consentito
+    """
+    tree = _parse(expression)
+    parameter_names = set(parameter_names)
+    features, parameters = set(), set()
+    nodes = 0
+
+    for node in ast.walk(tree):
+        nodes += 1
+        if nodes > MAX_NODES:
+            raise FormulaSyntaxError(f"Espressione troppo complessa (max {MAX_NODES} nodi)")
+        if isinstance(node, (ast.Expression, ast.Load)):
+            continue
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise FormulaSyntaxError(f"Costante non numerica: {node.value!r}")
+            try:
+                float(node.value)
+            except OverflowError:
+                raise FormulaSyntaxError(f"Costante troppo grande: {node.value}") from None
+        elif isinstance(node, ast.Name):
+            if node.id in FEATURE_NAMES:
+                features.add(node.id)
+            elif node.id in parameter_names:
+                parameters.add(node.id)
+            elif node.id not in SAFE_FUNCTIONS:
+                raise FormulaSyntaxError(f"Nome sconosciuto: {node.id}")
+        elif isinstance(node, ast.BinOp):
+            if type(node.op) not in _BINARY_OPERATORS:
+                raise FormulaSyntaxError(f"Operatore non consentito: {type(node.op).__name__}")
+        elif isinstance(node, ast.UnaryOp):
+            if type(node.op) not in _UNARY_OPERATORS:
+                raise FormulaSyntaxError(f"Operatore non consentito: {type(node.op).__name__}")
+        elif isinstance(node, ast.Compare):
+            for op in node.ops:
+                if type(op) not in _COMPARE_OPERATORS:
+                    raise FormulaSyntaxError(f"Confronto non consentito: {type(op).__name__}")
+        elif isinstance(node, (ast.BoolOp, ast.IfExp)):
+            continue
+        elif type(node) in _BOOL_OPERATORS or type(node) in _BINARY_OPERATORS \
+                or type(node) in _UNARY_OPERATORS or type(node) in _COMPARE_OPERATORS:
+            # Nodi operatore (ast.Add, ast.Lt, ...), già verificati sul nodo padre
+            continue
+        elif isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in SAFE_FUNCTIONS:
+                raise FormulaSyntaxError("Sono consentite solo le funzioni: " + ", ".join(SAFE_FUNCTIONS))
+            if node.keywords:
+                raise FormulaSyntaxError(f"Argomenti con nome non consentiti in {node.func.id}()")
+            _, min_args, max_args = SAFE_FUNCTIONS[node.func.id]
+            if not min_args <= len(node.args) <= max_args:
+                raise FormulaSyntaxError(f"{node.func.id}() richiede da {min_args} a {max_args} argomenti")
+        else:
+            raise FormulaSyntaxError(f"Costrutto non consentito: {type(node).__name__}")
+
+    # Un nome di funzione è valido solo come funzione chiamata
+    called = {id(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call)}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id in SAFE_FUNCTIONS and id(node) not in called:
+            raise FormulaSyntaxError(f"{node.id} è una funzione: usare {node.id}(...)")
+    return tree, tuple(sorted(features)), tuple(sorted(parameters))
+
+
+def expression_hash(tree: ast.AST) -> str:
+    """Impronta dell'espressione normalizzata (spazi e parentesi superflue non contano)"""
+    return hashlib.sha1(ast.dump(tree).encode('utf-8')).hexdigest()
+
+
+# Ambiente di valutazione: (colonne delle feature, parametri, risultati dei sotto-alberi)
+Environment = Tuple[Mapping[str, np.ndarray], Mapping[str, float], Dict[int, np.ndarray]]
+
+
+def _compile_node(node: ast.AST, compiled: Dict[str, Callable]) -> Callable[[Environment], np.ndarray]:
+    """Closure del nodo; i sotto-alberi identici vengono calcolati una sola volta per valutazione"""
+    key = ast.dump(node)
+    if key in compiled:
+        return compiled[key]
+
+    if isinstance(node, ast.Constant):
+        value = float(node.value)
+
+        def run(env):
+            return value
+        compiled[key] = run
+        return run
+    if isinstance(node, ast.Name):
+        name = node.id
+        if name in FEATURE_NAMES:
+            def run(env):
+                return env[0][name]
+        else:
+            def run(env):
+                return env[1][name]
+        compiled[key] = run
+        return run
+
+    if isinstance(node, ast.BinOp):
+        op, left, right = _BINARY_OPERATORS[type(node.op)], _compile_node(node.left, compiled), \
+            _compile_node(node.right, compiled)
+
+        def evaluate(env):
+            return op(left(env), right(env))
+    elif isinstance(node, ast.UnaryOp):
+        op, operand = _UNARY_OPERATORS[type(node.op)], _compile_node(node.operand, compiled)
+
+        def evaluate(env):
+            return op(operand(env))
+    elif isinstance(node, ast.Compare):
+        operands = [_compile_node(node.left, compiled)] + [_compile_node(c, compiled) for c in node.comparators]
+        ops = [_COMPARE_OPERATORS[type(op)] for op in node.ops]
+
+        def evaluate(env):
+            values = [operand(env) for operand in operands]
+            result = ops[0](values[0], values[1])
+            for i in range(1, len(ops)):
+                result = np.logical_and(result, ops[i](values[i], values[i + 1]))
+            return result
+    elif isinstance(node, ast.BoolOp):
+        op, operands = _BOOL_OPERATORS[type(node.op)], [_compile_node(v, compiled) for v in node.values]
+
+        def evaluate(env):
+            result = operands[0](env)
+            for operand in operands[1:]:
+                result = op(result, operand(env))
+            return result
+    elif isinstance(node, ast.IfExp):
+        test, body, orelse = (_compile_node(node.test, compiled), _compile_node(node.body, compiled),
+                              _compile_node(node.orelse, compiled))
+
+        def evaluate(env):
+            return np.where(test(env), body(env), orelse(env))
+    elif isinstance(node, ast.Call):
+        name = node.func.id
+        function = SAFE_FUNCTIONS[name][0]
+        args = [_compile_node(arg, compiled) for arg in node.args]
+        if name in ('max', 'min') and len(args) > 2:
+            def evaluate(env):
+                result = args[0](env)
+                for arg in args[1:]:
+                    result = function(result, arg(env))
+                return result
+        else:
+            def evaluate(env):
+                return function(*(arg(env) for arg in args))
+    else:
+        raise FormulaSyntaxError(f"Costrutto non consentito: {type(node).__name__}")
+
+    slot = len(compiled)
+
+    def run(env):
+        memo = env[2]
+        if slot not in memo:
+            memo[slot] = evaluate(env)
+        return memo[slot]
+    compiled[key] = run
+    return run
+
+
+def _parameter_values(params) -> Mapping[str, float]:
+    """Parametri come dizionario: accetta un dict o un oggetto con attributi (FormulaParameters)"""
+    if params is None:
+        return {}
+    if isinstance(params, Mapping):
+        return params
+    return vars(params)
+
+
+class CompiledFormula:
+    """
+    Formula validata e compilata in una closure NumPy.
+
+    - predict(features, params): previsioni su tutte le partite di una MatchFeatures
+      e maschera delle partite valutabili (feature presenti e risultato finito)
+    - predict_match(match, params): previsione di una singola partita (dizionario grezzo)
+    """
+
+    def __init__(self, expression: str, parameter_names: Iterable[str] = PARAMETER_NAMES):
+        tree, self.features, self.parameters = validate(expression, parameter_names)
+        self.expression = expression.strip()
+        self.key = expression_hash(tree)
+        self._run = _compile_node(tree.body, {})
+
+    def __call__(self, columns: Mapping[str, np.ndarray], params=None) -> np.ndarray:
+        values = _parameter_values(params)
+        missing = [name for name in self.parameters if name not in values]
+        if missing:
+            raise ValueError(f"Parametri mancanti: {', '.join(missing)}")
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            return np.asarray(self._run((columns, values, {})), dtype=np.float64)
+
+    def predict(self, features: MatchFeatures, params=None) -> Tuple[np.ndarray, np.ndarray]:
+        columns = {name: features.column(name) for name in self.features}
+        predicted = np.broadcast_to(self(columns, params), (len(features),))
+        valid = np.isfinite(predicted)
+        for name in self.features:
+            valid &= features.valid(name)
+        return predicted, valid
+
+    def predict_match(self, match: Dict, params=None) -> float:
+        """Previsione di una partita; ValueError se mancano feature o il risultato non è finito"""
+        record = MatchRecord.from_match(match, self.features).require(*self.features)
+        value = float(self({name: getattr(record, name) for name in self.features}, params))
+        if not np.isfinite(value):
+            raise ValueError(f"Risultato non finito per la formula: {self.expression}")
+        return value
+
+    def to_spec(self, params=None) -> Dict:
+        """Descrizione serializzabile (JSON) della formula e dei parametri"""
+        values = _parameter_values(params)
+        return {
+            'expression': self.expression,
+            'expression_hash': self.key,
+            'features': list(self.features),
+            'parameters': {name: float(values[name]) for name in self.parameters if name in values},
+        }
+
+
+_compiled_cache: 'OrderedDict[str, CompiledFormula]' = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def compile_formula(expression: str, parameter_names: Iterable[str] = PARAMETER_NAMES) -> CompiledFormula:
+    """
+    Formula compilata, dalla cache se la stessa espressione (normalizzata) è già
+    stata compilata. Solleva FormulaSyntaxError se l'espressione non è valida.
+    """
+    parameter_names = tuple(parameter_names)
+    tree = _parse(expression)
+    cache_key = expression_hash(tree) + '|' + ','.join(parameter_names)
+    with _cache_lock:
+        if cache_key in _compiled_cache:
+            _compiled_cache.move_to_end(cache_key)
+            return _compiled_cache[cache_key]
+    formula = CompiledFormula(expression, parameter_names)
+    with _cache_lock:
+        _compiled_cache[cache_key] = formula
+        while len(_compiled_cache) > COMPILED_CACHE_SIZE:
+            _compiled_cache.popitem(last=False)
+    return formula
+
+
+def load_formula_spec(spec: Dict) -> Tuple[CompiledFormula, Dict[str, float]]:
+    """Formula compilata e parametri da una descrizione salvata con to_spec()"""
+    formula = compile_formula(spec['expression'])
+    if spec.get('expression_hash') and spec['expression_hash'] != formula.key:
+        raise ValueError("L'impronta salvata non corrisponde all'espressione")
+    return formula, dict(spec.get('parameters') or {})
@@ -0,0 +1,69 @@
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, Optional, Tuple
+
+# Percorso di default, accanto alla cache delle risposte API
+DEFAULT_GEOCODING_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "geocoding.json"
+)
+
+
+class GeocodingCache:
+    """
+    Cache persistente delle coordinate: città -> (lat, lon) e id stadio -> (lat, lon).
+
+    Gli stadi cambiano raramente città, quindi l'id venue di api-football è la chiave
+    più affidabile; il nome della città (già normalizzato) serve per i venue nuovi.
+    Il file JSON viene riscritto in modo atomico a ogni nuova coordinata.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv('XGOALS_GEOCODING_PATH', DEFAULT_GEOCODING_PATH)
+        self.lock = threading.Lock()
+        self.cities = {}
+        self.venues = {}
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.cities = {city: tuple(coords) for city, coords in data.get('cities', {}).items()}
+            self.venues = {int(venue): tuple(coords) for venue, coords in data.get('venues', {}).items()}
+
+    def get(self, city: str, venue_id: Optional[int] = None) -> Optional[Tuple[float, float]]:
+        with self.lock:
+            coords = self.venues.get(venue_id) if venue_id is not None else None
+            if coords is None:
+                coords = self.cities.get(city)
+            if coords is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return coords
+
+    def put(self, city: str, lat: float, lon: float, venue_id: Optional[int] = None):
+        with self.lock:
+            self.cities[city] = (lat, lon)
+            if venue_id is not None:
+                self.venues[venue_id] = (lat, lon)
+            self._save()
+
+    def seed_venues(self, venues: Dict[int, Tuple[float, float]]):
+        """Precarica coordinate note per id stadio (es. da un'anagrafica venue)"""
+        with self.lock:
+            self.venues.update({int(venue): tuple(coords) for venue, coords in venues.items()})
+            self._save()
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        data = {
+            'cities': self.cities,
+            'venues': {str(venue): coords for venue, coords in self.venues.items()},
+        }
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.part', dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
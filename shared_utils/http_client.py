@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from shared_utils.cassette import MODE_RECORD, MODE_REPLAY, Cassette
+
+
+class LatencyStats:
+    """Statistiche di latenza delle richieste di un host (thread-safe)"""
+
+    def __init__(self, window: int = 1000):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)  # ultime latenze, per i percentili
+        self.lock = threading.Lock()
+
+    def record(self, elapsed: float, ok: bool = True):
+        with self.lock:
+            self.count += 1
+            self.total += elapsed
+            self.max = max(self.max, elapsed)
+            self.recent.append(elapsed)
+            if not ok:
+                self.errors += 1
+
+    def summary(self) -> Dict:
+        with self.lock:
+            ordered = sorted(self.recent)
+        if not ordered:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'avg_ms': self.total / self.count * 1000,
+            'p50_ms': ordered[len(ordered) // 2] * 1000,
+            'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+            'max_ms': self.max * 1000,
+        }
+
+
+class HttpClient:
+    """
+    Client HTTP con una sessione keep-alive per host.
+
+    Ogni host (RapidAPI, geocoding e archivio Open-Meteo) ha la sua requests.Session
+    con un pool di connessioni di dimensione configurabile: le richieste successive
+    riusano la connessione TCP/TLS invece di ripetere l'handshake. La latenza di
+    ogni richiesta viene registrata per host.
+
+    Con una cassetta in modalità record ogni risposta viene salvata su disco; in
+    modalità replay le risposte vengono lette dalla cassetta senza accedere alla rete.
+    """
+
+    def __init__(self, pool_size: int = None, connect_timeout: float = None, read_timeout: float = None,
+                 cassette: Optional[Cassette] = None):
+        self.pool_size = pool_size or int(os.getenv('HTTP_POOL_SIZE', 10))
+        self.timeout = (
+            connect_timeout or float(os.getenv('HTTP_CONNECT_TIMEOUT', 5)),
+            read_timeout or float(os.getenv('HTTP_READ_TIMEOUT', 30))
+        )
+        self.sessions = {}
+        self.latency = {}
+        self.lock = threading.Lock()
+        self.cassette = cassette
+
+    def _session_for(self, host: str) -> requests.Session:
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self.sessions[host] = session
+                self.latency[host] = LatencyStats()
+            return session
+
+    @property
+    def replaying(self) -> bool:
+        """True se le risposte vengono lette dalla cassetta invece che dalla rete"""
+        return self.cassette is not None and self.cassette.mode == MODE_REPLAY
+
+    def get(self, url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None) -> requests.Response:
+        if self.replaying:
+            return self.cassette.load(url, params)
+
+        host = urlsplit(url).netloc
+        session = self._session_for(host)
+        start = time.perf_counter()
+        try:
+            response = session.get(url, params=params, headers=headers, timeout=self.timeout)
+        except requests.exceptions.RequestException:
+            self.latency[host].record(time.perf_counter() - start, ok=False)
+            raise
+        self.latency[host].record(time.perf_counter() - start, ok=response.ok)
+        # Errori transitori (5xx, 429) non vengono registrati: in replay si ripeterebbero sempre
+        if self.cassette is not None and self.cassette.mode == MODE_RECORD \
+                and response.status_code < 500 and response.status_code != 429:
+            self.cassette.save(url, params, response)
+        return response
+
+    def latency_summary(self) -> Dict[str, Dict]:
+        """Latenze per host: conteggio, errori, media, p50, p95, massimo (ms)"""
+        return {host: stats.summary() for host, stats in self.latency.items()}
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
@@ -0,0 +1,345 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+# Schema fisso delle feature di una partita: nome -> (percorso, tipo)
+#   'stat': media/valore stagionale, convertito come float(str(v).replace(',', '.'))
+#   'count': intero o float già numerico (gol), le stringhe non sono valide
+GOAL_AVERAGE_FEATURES = {
+    f'{side}_{kind}_avg_{venue}': ((f'{side}_stats', 'goals', kind, 'average', venue), 'stat')
+    for side in ('home', 'away')
+    for kind in ('for', 'against')
+    for venue in ('home', 'away', 'total')
+}
+# Identificativi usati per ordinare e raggruppare le partite (backtest per data e campionato)
+META_FEATURES = {
+    'timestamp': (('fixture', 'timestamp'), 'count'),
+    'league_id': (('league', 'id'), 'count'),
+}
+RESULT_FEATURES = {
+    'goals_home': (('goals', 'home'), 'count'),
+    'goals_away': (('goals', 'away'), 'count'),
+}
+WEATHER_FEATURES = {
+    'temperature': (('weather', 'temperature'), 'stat'),
+    'precipitation': (('weather', 'precipitation'), 'stat'),
+    'wind_speed': (('weather', 'wind_speed'), 'stat'),
+}
+# Statistiche partita (fixtures/statistics): nome -> tipo api-football, per squadra di casa e ospite
+MATCH_STATISTICS = {
+    'shots_on_goal': 'Shots on Goal',
+    'total_shots': 'Total Shots',
+    'possession': 'Ball Possession',
+    'expected_goals': 'expected_goals',
+}
+MATCH_STATISTIC_FEATURES = [f'{name}_{side}' for name in MATCH_STATISTICS for side in ('home', 'away')]
+
+PATH_FEATURES = {**META_FEATURES, **GOAL_AVERAGE_FEATURES, **RESULT_FEATURES, **WEATHER_FEATURES}
+FEATURE_NAMES = list(PATH_FEATURES) + MATCH_STATISTIC_FEATURES
+FEATURE_DTYPE = np.dtype([(name, np.float64) for name in FEATURE_NAMES])
+MISSING_DTYPE = np.dtype([(name, np.bool_) for name in FEATURE_NAMES])
+
+# Sezioni da caricare per estrarre tutte le feature (proiezione di MatchDataManager)
+FEATURE_SOURCE_FIELDS = ['fixture', 'league', 'teams', 'goals', 'home_stats.goals', 'away_stats.goals',
+                         'match_statistics', 'weather']
+
+
+def parse_stat(value) -> Optional[float]:
+    """Conversione delle statistiche stagionali ('1,5' -> 1.5); None se non convertibile"""
+    try:
+        return float(str(value).replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def parse_count(value) -> Optional[float]:
+    """Valore già numerico (gol); None per stringhe, None e altri tipi"""
+    return value if isinstance(value, (int, float)) else None
+
+
+def parse_numeric(value, default=0):
+    """
+    Conversione tollerante delle statistiche partita: percentuali ("56%"),
+    stringhe numeriche e numeri; default se il valore manca o non è valido
+    """
+    if value is None:
+        return default
+    if isinstance(value, str):
+        value = value.strip()
+        if value.endswith('%'):
+            value = value[:-1]
+        try:
+            return float(value)
+        except ValueError:
+            return default
+    return float(value) if isinstance(value, (int, float)) else default
+
+
+def find_team_statistic(stats_dict, key: str, default_value=0):
+    """
+    Valore di una statistica di squadra: chiave diretta del dizionario oppure
+    voce {'type': key, 'value': ...} della lista 'statistics' (formato api-football)
+    """
+    if not isinstance(stats_dict, dict):
+        return default_value
+    if key in stats_dict:
+        return parse_numeric(stats_dict[key])
+    if 'statistics' in stats_dict:
+        for stat in stats_dict['statistics']:
+            if isinstance(stat, dict) and 'type' in stat and stat['type'] == key:
+                value = stat.get('value', default_value)
+                if value is None:
+                    return default_value
+                return parse_numeric(value)
+    return default_value
+
+
+_PARSERS = {'stat': parse_stat, 'count': parse_count}
+
+
+def _walk(value, path: tuple):
+    for key in path:
+        value = value[key]
+    return value
+
+
+def _statistics_by_side(match: Dict) -> Tuple[Dict, Dict]:
+    """Statistiche partita per squadra (tipo -> valore); accetta la risposta completa o la sola lista"""
+    # Mapping e non dict: anche le partite lette in modo differito (LazyMatch) dell'archivio colonnare
+    statistics = match.get('match_statistics') if isinstance(match, Mapping) else None
+    if isinstance(statistics, dict):
+        statistics = statistics.get('response')
+    sides = [{}, {}]
+    if isinstance(statistics, list):
+        for index, team in enumerate(statistics[:2]):
+            if isinstance(team, dict):
+                sides[index] = {
+                    stat.get('type'): stat.get('value')
+                    for stat in team.get('statistics') or [] if isinstance(stat, dict)
+                }
+    return sides[0], sides[1]
+
+
+def _extract_values(match: Dict, names: Iterable[str]) -> Dict[str, Optional[float]]:
+    """Valori delle feature indicate (None = mancante)"""
+    values = {}
+    sides = None
+    for name in names:
+        if name in PATH_FEATURES:
+            path, kind = PATH_FEATURES[name]
+            try:
+                raw = _walk(match, path)
+            except (KeyError, TypeError, IndexError):
+                values[name] = None
+                continue
+            values[name] = _PARSERS[kind](raw)
+        else:
+            if sides is None:
+                sides = _statistics_by_side(match)
+            statistic, side = name.rsplit('_', 1)
+            raw = sides[0 if side == 'home' else 1].get(MATCH_STATISTICS[statistic])
+            values[name] = None if raw is None else parse_numeric(raw, default=None)
+    return values
+
+
+class MatchRecord:
+    """
+    Feature di una singola partita a schema fisso (attributi float, NaN se mancanti).
+
+    Si usa nelle valutazioni per partita: require() solleva ValueError se una delle
+    feature richieste manca, come farebbe l'accesso diretto al dizionario.
+    """
+    __slots__ = tuple(FEATURE_NAMES) + ('missing',)
+
+    def __init__(self, values: Dict[str, Optional[float]]):
+        missing = set()
+        for name in FEATURE_NAMES:
+            value = values.get(name)
+            if value is None:
+                missing.add(name)
+                value = float('nan')
+            setattr(self, name, value)
+        self.missing = frozenset(missing)
+
+    @classmethod
+    def from_match(cls, match: Dict, names: Optional[Iterable[str]] = None) -> 'MatchRecord':
+        """Estrae le feature di una partita (solo quelle indicate, se names)"""
+        return cls(_extract_values(match, names or FEATURE_NAMES))
+
+    def require(self, *names: str) -> 'MatchRecord':
+        absent = [name for name in names if name in self.missing]
+        if absent:
+            raise ValueError(f"Statistiche mancanti o non valide: {', '.join(absent)}")
+        return self
+
+
+class MatchFeatures:
+    """
+    Feature di un insieme di partite in un array strutturato NumPy.
+
+    - records: una riga per partita, un campo float64 per feature (NaN se mancante)
+    - missing: stessa forma, True dove il valore manca o non è valido
+    - home_names / away_names: nomi delle squadre ('' se mancanti, vedi names_missing)
+    """
+
+    def __init__(self, records: np.ndarray, missing: np.ndarray, home_names: np.ndarray,
+                 away_names: np.ndarray, names_missing: np.ndarray):
+        self.records = records
+        self.missing = missing
+        self.home_names = home_names
+        self.away_names = away_names
+        self.names_missing = names_missing
+
+    @classmethod
+    def from_matches(cls, matches: Iterable[Dict]) -> 'MatchFeatures':
+        nan = float('nan')
+        columns = {name: [] for name in FEATURE_NAMES}
+        masks = {name: [] for name in FEATURE_NAMES}
+        home_names, away_names, names_missing = [], [], []
+        # Percorsi raggruppati per sezione: ogni sotto-dizionario viene visitato una volta
+        sections = {}
+        for name, (path, kind) in PATH_FEATURES.items():
+            sections.setdefault(path[0], []).append(
+                (path[1:], _PARSERS[kind], columns[name].append, masks[name].append)
+            )
+        statistic_columns = [
+            (MATCH_STATISTICS[name.rsplit('_', 1)[0]], 0 if name.endswith('_home') else 1,
+             columns[name].append, masks[name].append)
+            for name in MATCH_STATISTIC_FEATURES
+        ]
+
+        for match in matches:
+            for section, specs in sections.items():
+                try:
+                    data = match[section]
+                except (KeyError, TypeError, IndexError):
+                    data = None
+                for path, parse, add_value, add_missing in specs:
+                    try:
+                        value = data
+                        for key in path:
+                            value = value[key]
+                        value = parse(value)
+                    except (KeyError, TypeError, IndexError):
+                        value = None
+                    add_value(nan if value is None else value)
+                    add_missing(value is None)
+
+            sides = _statistics_by_side(match)
+            for statistic, side, add_value, add_missing in statistic_columns:
+                raw = sides[side].get(statistic)
+                value = None if raw is None else parse_numeric(raw, default=None)
+                add_value(nan if value is None else value)
+                add_missing(value is None)
+
+            try:
+                home_names.append(str(match['teams']['home']['name']))
+                away_names.append(str(match['teams']['away']['name']))
+                names_missing.append(False)
+            except (KeyError, TypeError):
+                home_names.append('')
+                away_names.append('')
+                names_missing.append(True)
+
+        size = len(names_missing)
+        records = np.empty(size, dtype=FEATURE_DTYPE)
+        missing = np.empty(size, dtype=MISSING_DTYPE)
+        for name in FEATURE_NAMES:
+            records[name] = columns[name]
+            missing[name] = masks[name]
+        return cls(records, missing, np.array(home_names, dtype=str), np.array(away_names, dtype=str),
+                   np.array(names_missing, dtype=bool))
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def column(self, name: str) -> np.ndarray:
+        return self.records[name]
+
+    def valid(self, name: str) -> np.ndarray:
+        return ~self.missing[name]
+
+    def subset(self, positions: np.ndarray) -> 'MatchFeatures':
+        """Tabella ridotta alle partite indicate (nell'ordine dato)"""
+        return MatchFeatures(self.records[positions], self.missing[positions], self.home_names[positions],
+                             self.away_names[positions], self.names_missing[positions])
+
+    def content_hash(self) -> str:
+        """Impronta dei dati della tabella (valori, maschere e nomi), per le cache dei risultati"""
+        digest = hashlib.sha1(schema_hash().encode('utf-8'))
+        for array in (self.records, self.missing, self.names_missing):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        for names in (self.home_names, self.away_names):
+            digest.update('\x00'.join(names.tolist()).encode('utf-8'))
+        return digest.hexdigest()
+
+    def label(self, pos: int) -> Optional[str]:
+        """'Casa vs Ospite' della partita, None se mancano i nomi"""
+        if self.names_missing[pos]:
+            return None
+        return f"{self.home_names[pos]} vs {self.away_names[pos]}"
+
+    def save(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.npz', dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, records=self.records, missing=self.missing, home_names=self.home_names,
+                     away_names=self.away_names, names_missing=self.names_missing)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'MatchFeatures':
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['records'], data['missing'], data['home_names'],
+                       data['away_names'], data['names_missing'])
+
+
+def schema_hash() -> str:
+    """Impronta dello schema: cambia se cambiano feature o percorsi, invalidando la cache"""
+    schema = json.dumps([FEATURE_NAMES, {k: list(v[0]) for k, v in PATH_FEATURES.items()}, MATCH_STATISTICS])
+    return hashlib.sha1(schema.encode('utf-8')).hexdigest()[:12]
+
+
+class FeatureCache:
+    """
+    Cache su disco delle tabelle delle feature.
+
+    La chiave è scelta dal chiamante (MatchDataManager: impronta dell'archivio
+    colonnare più schema delle feature). La tabella è salvata in
+    {cache_dir}/{chiave}.npz e tenuta anche in memoria per il processo corrente;
+    ogni nuova tabella sostituisce le precedenti, che non verrebbero più lette.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.memory = {}
+
+    def _remove_stale(self, keep: str):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz') and name != keep:
+                os.remove(os.path.join(self.cache_dir, name))
+
+    def load_or_build(self, key: str, build: Callable[[], MatchFeatures]) -> MatchFeatures:
+        """Feature del dataset dalla cache (memoria o disco), altrimenti costruite e salvate"""
+        with self.lock:
+            if key in self.memory:
+                return self.memory[key]
+        path = os.path.join(self.cache_dir, f"{key}.npz")
+        if os.path.exists(path):
+            features = MatchFeatures.load(path)
+        else:
+            features = build()
+            features.save(path)
+            with self.lock:
+                self._remove_stale(os.path.basename(path))
+        with self.lock:
+            self.memory = {key: features}
+        return features
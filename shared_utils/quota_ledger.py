@@ -0,0 +1,176 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# Percorso di default del registro quota, condiviso da calculator, optimizer e job cron
+DEFAULT_QUOTA_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "api_quota.sqlite"
+)
+
+# Classi di priorità delle richieste (valore più basso = più importante)
+PRIORITY_HIGH = 0     # partite del giorno e statistiche squadra per le previsioni
+PRIORITY_NORMAL = 1   # statistiche ed eventi delle partite, metadati di lega
+PRIORITY_LOW = 2      # formazioni e recupero dello storico
+
+PRIORITY_NAMES = {PRIORITY_HIGH: 'alta', PRIORITY_NORMAL: 'normale', PRIORITY_LOW: 'bassa'}
+
+# Quota giornaliera utilizzabile da ogni classe: oltre questa soglia le richieste
+# della classe vengono rinviate, lasciando il resto alle classi più importanti
+PRIORITY_SHARES = {
+    PRIORITY_HIGH: 1.0,
+    PRIORITY_NORMAL: 0.9,
+    PRIORITY_LOW: 0.75,
+}
+
+# Priorità di default per endpoint api-football
+ENDPOINT_PRIORITIES = {
+    'fixtures': PRIORITY_HIGH,
+    'teams/statistics': PRIORITY_HIGH,
+    'leagues': PRIORITY_NORMAL,
+    'fixtures/statistics': PRIORITY_NORMAL,
+    'fixtures/events': PRIORITY_NORMAL,
+    'fixtures/lineups': PRIORITY_LOW,
+}
+
+
+class QuotaExceeded(Exception):
+    """Quota giornaliera esaurita"""
+
+
+class QuotaDeferred(QuotaExceeded):
+    """Richiesta a bassa priorità rinviata per preservare la quota residua"""
+
+
+def utc_day() -> str:
+    """Giorno corrente in UTC: la quota RapidAPI si azzera a mezzanotte UTC"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+class QuotaLedger:
+    """
+    Registro persistente (SQLite) delle chiamate API consumate per giorno UTC.
+
+    Più processi condividono lo stesso file: ogni prenotazione avviene in una
+    transazione BEGIN IMMEDIATE, che prende il lock di scrittura del database,
+    quindi lettura e incremento del contatore sono atomici anche tra processi.
+    """
+
+    def __init__(self, daily_limit: int, db_path: str = None, shares: Dict[int, float] = None):
+        self.daily_limit = daily_limit
+        self.db_path = db_path or os.getenv('XGOALS_QUOTA_PATH', DEFAULT_QUOTA_PATH)
+        self.shares = shares or PRIORITY_SHARES
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        # isolation_level=None: le transazioni sono gestite esplicitamente
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30,
+                                    isolation_level=None)
+        self.lock = threading.Lock()
+        self.deferred = {priority: 0 for priority in PRIORITY_NAMES}
+        with self.lock:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS quota (
+                    day TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    used INTEGER NOT NULL,
+                    PRIMARY KEY (day, priority)
+                )
+            """)
+
+    def limit_for(self, priority: int) -> int:
+        """Chiamate giornaliere utilizzabili fino alla classe di priorità indicata"""
+        return int(self.daily_limit * self.shares.get(priority, 1.0))
+
+    def _used(self, day: str) -> int:
+        return self.conn.execute(
+            "SELECT COALESCE(SUM(used), 0) FROM quota WHERE day = ?", (day,)
+        ).fetchone()[0]
+
+    def _add(self, day: str, priority: int, calls: int):
+        self.conn.execute(
+            "INSERT INTO quota (day, priority, used) VALUES (?, ?, ?) "
+            "ON CONFLICT(day, priority) DO UPDATE SET used = MAX(0, used + excluded.used)",
+            (day, priority, calls)
+        )
+
+    def acquire(self, priority: int = PRIORITY_NORMAL) -> None:
+        """
+        Prenota una chiamata per la classe indicata.
+
+        Solleva QuotaDeferred se la classe ha superato la sua soglia ma la quota
+        non è esaurita, QuotaExceeded se la quota giornaliera è esaurita.
+        """
+        day = utc_day()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                used = self._used(day)
+                granted = used < self.limit_for(priority)
+                if granted:
+                    self._add(day, priority, 1)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            if granted:
+                return
+            if used < self.daily_limit:
+                self.deferred[priority] = self.deferred.get(priority, 0) + 1
+        if used >= self.daily_limit:
+            raise QuotaExceeded("Limite giornaliero raggiunto")
+        raise QuotaDeferred(
+            f"Richiesta a priorità {PRIORITY_NAMES.get(priority, priority)} rinviata: "
+            f"usate {used}/{self.daily_limit} chiamate, soglia {self.limit_for(priority)}"
+        )
+
+    def release(self, priority: int = PRIORITY_NORMAL) -> None:
+        """Restituisce una prenotazione per una chiamata che non ha raggiunto il server"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._add(utc_day(), priority, -1)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def sync_remaining(self, remaining: int) -> None:
+        """
+        Allinea il registro al residuo dichiarato dal server (header
+        x-ratelimit-requests-remaining): conta anche le chiamate di client esterni.
+        """
+        day = utc_day()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                missing = (self.daily_limit - remaining) - self._used(day)
+                if missing > 0:
+                    self._add(day, PRIORITY_HIGH, missing)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def used_today(self, priority: Optional[int] = None) -> int:
+        day = utc_day()
+        with self.lock:
+            if priority is None:
+                return self._used(day)
+            row = self.conn.execute(
+                "SELECT used FROM quota WHERE day = ? AND priority = ?", (day, priority)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def remaining_today(self) -> int:
+        return max(0, self.daily_limit - self.used_today())
+
+    def summary(self) -> str:
+        by_class = ", ".join(
+            f"{name} {self.used_today(priority)}" for priority, name in PRIORITY_NAMES.items()
+        )
+        deferred = sum(self.deferred.values())
+        return (f"quota API {utc_day()} (UTC): {self.used_today()}/{self.daily_limit} "
+                f"chiamate ({by_class}), {deferred} richieste rinviate")
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,48 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Rate limiter a token bucket, thread-safe.
+
+    Il bucket si riempie a `rate_per_minute` token al minuto fino a `capacity`;
+    ogni richiesta consuma un token e, se il bucket è vuoto, attende il prossimo.
+    Più thread possono condividere lo stesso bucket: il limite vale per l'insieme.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: int = None):
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute deve essere positivo")
+        self.rate = rate_per_minute / 60.0  # token al secondo
+        self.capacity = capacity if capacity is not None else max(1, int(rate_per_minute // 60) or 1)
+        self.tokens = float(self.capacity)
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def try_acquire(self, tokens: int = 1) -> bool:
+        """Consuma i token se disponibili, senza attendere"""
+        with self.lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: int = 1) -> float:
+        """Attende finché i token sono disponibili e li consuma; restituisce il tempo atteso"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
@@ -0,0 +1,167 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+# Sotto-risorse di una partita: endpoint api-football e metodo del collector
+FIXTURE_RESOURCES = {
+    'statistics': ('fixtures/statistics', 'get_match_statistics'),
+    'events': ('fixtures/events', 'get_match_events'),
+    'lineups': ('fixtures/lineups', 'get_match_lineups'),
+}
+
+
+class PlannedRequest:
+    """Una richiesta API del piano: endpoint, parametri e chiamata del collector che la esegue"""
+    __slots__ = ('kind', 'endpoint', 'params', 'method', 'args', 'cached')
+
+    def __init__(self, kind: str, endpoint: str, params: Dict, method: str, args: tuple):
+        self.kind = kind
+        self.endpoint = endpoint
+        self.params = params
+        self.method = method
+        self.args = args
+        self.cached = False
+
+    @property
+    def key(self) -> tuple:
+        return (self.endpoint, tuple(sorted(self.params.items())))
+
+
+class RequestPlan:
+    """Richieste uniche di una giornata, con il confronto rispetto alla raccolta partita per partita"""
+
+    def __init__(self):
+        self.requests = []
+        self.naive_calls = 0  # chiamate che farebbe la raccolta partita per partita
+        self.executed = 0
+        self.failed = []
+
+    @property
+    def cached_calls(self) -> int:
+        return sum(1 for request in self.requests if request.cached)
+
+    @property
+    def planned_calls(self) -> int:
+        """Chiamate che consumano quota"""
+        return len(self.requests) - self.cached_calls
+
+    @property
+    def saved_calls(self) -> int:
+        return self.naive_calls - self.planned_calls
+
+    def by_kind(self) -> Dict[str, int]:
+        counts = {}
+        for request in self.requests:
+            counts[request.kind] = counts.get(request.kind, 0) + 1
+        return counts
+
+    def summary(self) -> str:
+        kinds = ", ".join(f"{kind}: {count}" for kind, count in self.by_kind().items())
+        return (f"📋 Piano richieste: {len(self.requests)} uniche ({kinds}), "
+                f"{self.cached_calls} già in cache, {self.planned_calls} da chiamare "
+                f"invece di {self.naive_calls} ({self.saved_calls} chiamate risparmiate)")
+
+
+class RequestPlanner:
+    """
+    Pianificatore delle richieste di una giornata.
+
+    Dalla lista delle partite calcola l'insieme unico di statistiche squadra
+    (squadra, lega), metadati di lega e sotto-risorse delle partite, poi esegue
+    ogni richiesta una sola volta: prima quelle già nella cache persistente
+    (gratuite), poi per lega, così le statistiche della stessa lega restano vicine.
+    """
+
+    def __init__(self, collector):
+        self.collector = collector
+
+    def _season(self) -> int:
+        return getattr(self.collector, 'season', 2024)
+
+    def _add(self, plan: RequestPlan, seen: set, request: PlannedRequest):
+        plan.naive_calls += 1
+        if request.key in seen:
+            return
+        seen.add(request.key)
+        plan.requests.append(request)
+
+    def plan(self, fixtures: Iterable[Dict], team_stats: bool = True, league_stats: bool = False,
+             fixture_resources: Iterable[str] = tuple(FIXTURE_RESOURCES)) -> RequestPlan:
+        """Costruisce il piano per le partite indicate (formato della risposta 'fixtures')"""
+        plan = RequestPlan()
+        seen = set()
+        season = self._season()
+        for match in fixtures:
+            league_id = match['league']['id']
+            if league_stats:
+                self._add(plan, seen, PlannedRequest(
+                    'league', 'leagues', {'id': league_id, 'season': season},
+                    'get_league_stats', (league_id,)
+                ))
+            if team_stats:
+                for side in ('home', 'away'):
+                    team_id = match['teams'][side]['id']
+                    self._add(plan, seen, PlannedRequest(
+                        'team_stats', 'teams/statistics',
+                        {'team': team_id, 'league': league_id, 'season': season},
+                        'get_team_stats', (team_id, league_id)
+                    ))
+            fixture_id = match['fixture']['id']
+            for resource in fixture_resources:
+                endpoint, method = FIXTURE_RESOURCES[resource]
+                self._add(plan, seen, PlannedRequest(
+                    resource, endpoint, {'fixture': fixture_id}, method, (fixture_id,)
+                ))
+        self._order(plan)
+        return plan
+
+    def plan_team_stats(self, teams: Iterable[tuple]) -> RequestPlan:
+        """Piano per una lista di coppie (squadra, lega)"""
+        plan = RequestPlan()
+        seen = set()
+        season = self._season()
+        for team_id, league_id in teams:
+            self._add(plan, seen, PlannedRequest(
+                'team_stats', 'teams/statistics',
+                {'team': team_id, 'league': league_id, 'season': season},
+                'get_team_stats', (team_id, league_id)
+            ))
+        self._order(plan)
+        return plan
+
+    def _order(self, plan: RequestPlan):
+        """Ordina: risposte in cache, metadati di lega, statistiche squadra per lega, sotto-risorse"""
+        response_cache = getattr(self.collector, 'response_cache', None)
+        if response_cache is not None:
+            for request in plan.requests:
+                request.cached = response_cache.contains(request.endpoint, request.params)
+        kind_order = {'league': 0, 'team_stats': 1}
+        plan.requests.sort(key=lambda r: (
+            not r.cached,
+            kind_order.get(r.kind, 2),
+            r.params.get('league', r.params.get('id', 0)),
+            r.args,
+        ))
+
+    def execute(self, plan: RequestPlan, workers: Optional[int] = 1,
+                priority: Optional[int] = None) -> Dict[tuple, Dict]:
+        """
+        Esegue il piano; restituisce le risposte indicizzate per chiave della richiesta.
+        priority sostituisce la priorità di quota per endpoint (es. recupero dello storico).
+        """
+        kwargs = {} if priority is None else {'priority': priority}
+
+        def run(request: PlannedRequest):
+            try:
+                return request.key, getattr(self.collector, request.method)(*request.args, **kwargs)
+            except Exception as e:
+                print(f"Errore nella richiesta {request.endpoint} {request.params}: {str(e)}")
+                plan.failed.append(request)
+                return request.key, None
+
+        if workers and workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(run, plan.requests))
+        else:
+            results = [run(request) for request in plan.requests]
+        plan.executed = sum(1 for _, value in results if value is not None)
+        return {key: value for key, value in results if value is not None}
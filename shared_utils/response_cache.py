@@ -0,0 +1,211 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Optional
+
+# Percorso di default della cache, condivisa da calculator e optimizer
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "api_responses.sqlite"
+)
+
+FOREVER = None  # TTL: la risposta non scade mai
+USE_POLICY = object()  # TTL: usa la politica per endpoint (ttl_for)
+
+# Stati api-football di una partita conclusa: da qui in poi i suoi dati non cambiano più
+FINAL_STATUSES = ('FT', 'AET', 'PEN')
+
+# TTL in secondi per endpoint
+ENDPOINT_TTLS = {
+    'fixtures': 10 * 60,                # partite per data: cambiano durante la giornata
+    'teams/statistics': 6 * 3600,       # statistiche stagionali: cambiano solo dopo una giornata
+    'leagues': 24 * 3600,
+    'fixtures/statistics': FOREVER,     # per sempre solo se la partita è conclusa (vedi ttl_for)
+    'fixtures/events': FOREVER,
+    'fixtures/lineups': FOREVER,
+}
+DEFAULT_TTL = 3600
+# TTL per le risposte vuote (es. partita non ancora giocata): non vanno conservate a lungo
+EMPTY_RESPONSE_TTL = 10 * 60
+# TTL dei dettagli di una partita non (ancora) conclusa: statistiche ed eventi cambiano durante il gioco
+LIVE_FIXTURE_TTL = 5 * 60
+
+
+def fixture_is_final(fixture: Dict) -> bool:
+    """True se la partita (elemento di una risposta fixtures) è conclusa"""
+    status = ((fixture or {}).get('fixture') or {}).get('status') or {}
+    return status.get('short') in FINAL_STATUSES
+
+
+def ttl_for(endpoint: str, params: Dict, payload: Dict, final: bool = False) -> Optional[float]:
+    """
+    TTL della risposta in base a endpoint, parametri e contenuto.
+
+    final: la partita a cui si riferisce la risposta è conclusa; senza, i dettagli
+    di partita (statistiche, eventi, formazioni) scadono dopo LIVE_FIXTURE_TTL.
+    """
+    ttl = ENDPOINT_TTLS.get(endpoint, DEFAULT_TTL)
+    if isinstance(payload, dict) and not payload.get('response'):
+        return EMPTY_RESPONSE_TTL if ttl is FOREVER else min(ttl, EMPTY_RESPONSE_TTL)
+    if ttl is FOREVER and not final:
+        return LIVE_FIXTURE_TTL
+    if endpoint == 'fixtures' and 'date' not in params:
+        # ultime partite di una squadra, dettaglio per id, ...
+        return DEFAULT_TTL
+    return ttl
+
+
+class ResponseCache:
+    """
+    Cache persistente (SQLite) delle risposte API.
+
+    Chiave: endpoint + parametri normalizzati. Ogni voce ha un TTL che dipende
+    dall'endpoint; quando la dimensione totale supera max_bytes vengono rimosse
+    le voci usate meno di recente. Thread-safe (una connessione protetta da lock).
+
+    Le partite concluse viste nelle risposte fixtures sono registrate: i loro
+    dettagli (statistiche, eventi, formazioni) sono conservati per sempre.
+    """
+    # Ogni quante scritture rimuovere le voci scadute e ricontare la dimensione totale
+    PURGE_INTERVAL = 100
+
+    def __init__(self, db_path: str = None, max_bytes: int = 200 * 1024 * 1024):
+        self.db_path = db_path or os.getenv('XGOALS_CACHE_PATH', DEFAULT_CACHE_PATH)
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'stores': 0}
+        # Dimensione totale delle voci, aggiornata a ogni scrittura e ricontata a ogni pulizia
+        self.total_bytes = None
+        self.puts_since_purge = 0
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    payload BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    expires REAL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS final_fixtures (fixture_id INTEGER PRIMARY KEY)")
+
+    @staticmethod
+    def make_key(endpoint: str, params: Dict) -> str:
+        """Chiave normalizzata: parametri ordinati e convertiti in stringa"""
+        normalized = sorted((str(k), str(v)) for k, v in (params or {}).items())
+        return f"{endpoint.strip('/')}?{json.dumps(normalized, separators=(',', ':'))}"
+
+    def get(self, endpoint: str, params: Dict) -> Optional[Dict]:
+        key = self.make_key(endpoint, params)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT payload, expires, size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            payload, expires, size = row
+            if expires is not None and expires < now:
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                with self.conn:
+                    self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                if self.total_bytes is not None:
+                    self.total_bytes -= size
+                return None
+            with self.conn:
+                self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.stats['hits'] += 1
+        return json.loads(zlib.decompress(payload))
+
+    def contains(self, endpoint: str, params: Dict) -> bool:
+        """Verifica se esiste una risposta valida, senza aggiornare contatori e ultimo accesso"""
+        key = self.make_key(endpoint, params)
+        with self.lock:
+            row = self.conn.execute("SELECT expires FROM responses WHERE key = ?", (key,)).fetchone()
+        return row is not None and (row[0] is None or row[0] >= time.time())
+
+    def put(self, endpoint: str, params: Dict, payload: Dict, ttl=USE_POLICY):
+        """Salva una risposta; di default il TTL segue la politica per endpoint, None = per sempre"""
+        params = params or {}
+        key = self.make_key(endpoint, params)
+        blob = zlib.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+        now = time.time()
+        with self.lock:
+            if endpoint == 'fixtures' and isinstance(payload, dict):
+                self._record_final_fixtures(payload.get('response') or [])
+            if ttl is USE_POLICY:
+                ttl = ttl_for(endpoint, params, payload, final=self._is_final(params.get('fixture')))
+            expires = None if ttl is None else now + ttl
+            with self.conn:
+                previous = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, endpoint, blob, len(blob), now, expires, now)
+                )
+            if self.total_bytes is not None:
+                self.total_bytes += len(blob) - (previous[0] if previous else 0)
+            self.stats['stores'] += 1
+            self._evict()
+
+    def _record_final_fixtures(self, fixtures):
+        final_ids = [
+            (fixture['fixture']['id'],) for fixture in fixtures
+            if isinstance(fixture, dict) and fixture_is_final(fixture)
+        ]
+        if final_ids:
+            with self.conn:
+                self.conn.executemany("INSERT OR IGNORE INTO final_fixtures VALUES (?)", final_ids)
+
+    def _is_final(self, fixture_id) -> bool:
+        if fixture_id is None or not str(fixture_id).isdigit():
+            return False
+        return self.conn.execute(
+            "SELECT 1 FROM final_fixtures WHERE fixture_id = ?", (int(fixture_id),)
+        ).fetchone() is not None
+
+    def _evict(self):
+        """
+        Ogni PURGE_INTERVAL scritture rimuove le voci scadute e riconta la dimensione
+        totale; oltre max_bytes rimuove le voci usate meno di recente.
+        """
+        self.puts_since_purge += 1
+        with self.conn:
+            if self.total_bytes is None or self.puts_since_purge >= self.PURGE_INTERVAL:
+                self.conn.execute("DELETE FROM responses WHERE expires IS NOT NULL AND expires < ?", (time.time(),))
+                self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                self.puts_since_purge = 0
+            if self.total_bytes <= self.max_bytes:
+                return
+            target = self.max_bytes * 0.9
+            for key, size in self.conn.execute(
+                    "SELECT key, size FROM responses ORDER BY last_access").fetchall():
+                if self.total_bytes <= target:
+                    break
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_bytes -= size
+                self.stats['evictions'] += 1
+
+    def hit_rate(self) -> float:
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def summary(self) -> str:
+        return (f"cache API: {self.stats['hits']} hit, {self.stats['misses']} miss "
+                f"({self.hit_rate() * 100:.1f}% hit rate), {self.stats['evictions']} rimozioni")
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM responses")
+            self.total_bytes = 0
+
+    def close(self):
+        self.conn.close()
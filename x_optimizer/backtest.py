@@ -0,0 +1,280 @@
+"""
+Backtest delle formule con divisioni temporali (walk-forward / rolling origin).
+
+Le partite vengono ordinate per fixture.timestamp (per campionato, con la
+stratificazione) e divise in n_folds + 1 blocchi consecutivi: il fold k stima i
+pesi sui blocchi precedenti e viene valutato sul blocco successivo, che non
+ha mai visto. I fold sono valutati in parallelo in un pool di processi e ogni
+risultato è conservato in cache per (dataset, formula, parametri, fold).
+
+Nota: le medie stagionali in home_stats/away_stats sono quelle salvate al
+momento della raccolta e possono includere partite successive; il backtest
+esclude il futuro dalla scelta dei parametri, non da quelle statistiche.
+
+Uso:
+    python backtest.py --formula formula2 --folds 5 --fit mae
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from formula_engine import ERROR_CATEGORIES, VECTORISED_FORMULAS, FormulaEngine
+from formula_evaluator import FormulaParameters
+from match_data_manager import MatchDataManager
+from parameter_search import PARAMETER_BOUNDS
+from shared_utils.match_features import MatchFeatures
+from weight_fitter import FIT_LOSSES, WeightFitter
+
+DEFAULT_BACKTEST_CACHE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "backtest.sqlite"
+)
+
+
+def walk_forward_splits(timestamps: np.ndarray, league_ids: Optional[np.ndarray] = None,
+                        n_folds: int = 5, window: Optional[int] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Divisioni walk-forward: [(posizioni di stima, posizioni di test)] per fold.
+
+    Args:
+        timestamps: fixture.timestamp di ogni partita (NaN = partita esclusa)
+        league_ids: se indicato, la divisione è fatta per campionato (stratificazione):
+            ogni fold contiene la stessa porzione della stagione di ogni campionato
+        window: blocchi di stima per fold (None = finestra crescente da inizio storico)
+
+    Partite con lo stesso timestamp finiscono sempre nello stesso blocco.
+    """
+    valid = ~np.isnan(timestamps)
+    if league_ids is None:
+        groups = [np.flatnonzero(valid)]
+    else:
+        # Campionato mancante (NaN) raggruppato a parte
+        keys = np.where(np.isnan(league_ids), -1, league_ids)
+        groups = [np.flatnonzero(valid & (keys == key)) for key in np.unique(keys[valid])]
+
+    train_parts = [[] for _ in range(n_folds)]
+    test_parts = [[] for _ in range(n_folds)]
+    for positions in groups:
+        order = positions[np.argsort(timestamps[positions], kind='stable')]
+        ordered = timestamps[order]
+        # Confini dei blocchi per numero di partite, spostati al primo timestamp uguale
+        cuts = np.linspace(0, len(order), n_folds + 2).round().astype(int)
+        cuts = [0] + [int(np.searchsorted(ordered, ordered[c], side='left')) if c < len(order) else len(order)
+                      for c in cuts[1:-1]] + [len(order)]
+        for k in range(n_folds):
+            start = cuts[0] if window is None else cuts[max(0, k + 1 - window)]
+            train_parts[k].append(order[start:cuts[k + 1]])
+            test_parts[k].append(order[cuts[k + 1]:cuts[k + 2]])
+
+    empty = np.array([], dtype=np.int64)
+    return [
+        (np.sort(np.concatenate(train or [empty])), np.sort(np.concatenate(test or [empty])))
+        for train, test in zip(train_parts, test_parts)
+    ]
+
+
+class BacktestCache:
+    """
+    Cache persistente (SQLite) dei risultati dei fold.
+
+    La chiave comprende l'impronta del dataset, formula, parametri, modalità di
+    stima e le posizioni di stima/test del fold: un fold cambia chiave appena
+    cambia una di queste.
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or os.getenv('XGOALS_BACKTEST_CACHE', DEFAULT_BACKTEST_CACHE)
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS folds (
+                    key TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    created REAL NOT NULL
+                )
+            """)
+
+    @staticmethod
+    def make_key(dataset_hash: str, formula_name: str, params: Dict[str, float], fit: Optional[str],
+                 bounds: Optional[Dict], train: np.ndarray, test: np.ndarray) -> str:
+        digest = hashlib.sha1(json.dumps(
+            [dataset_hash, formula_name, sorted(params.items()), fit, sorted((bounds or {}).items())],
+            separators=(',', ':')
+        ).encode('utf-8'))
+        digest.update(np.asarray(train, dtype=np.int64).tobytes())
+        digest.update(b'|')
+        digest.update(np.asarray(test, dtype=np.int64).tobytes())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self.lock:
+            row = self.conn.execute("SELECT result FROM folds WHERE key = ?", (key,)).fetchone()
+            self.stats['hits' if row else 'misses'] += 1
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, result: Dict):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO folds (key, result, created) VALUES (?, ?, ?)",
+                              (key, json.dumps(result), time.time()))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+# Tabella delle feature dei processi del pool (inviata una volta per processo)
+_worker_features = {}
+
+
+def _init_worker(features: MatchFeatures):
+    _worker_features['features'] = features
+
+
+def _run_fold(formula_name: str, params: Dict[str, float], fit: Optional[str], bounds: Optional[Dict],
+              train: np.ndarray, test: np.ndarray) -> Dict:
+    """Stima (facoltativa) sui blocchi precedenti e valutazione sul blocco di test"""
+    features = _worker_features['features']
+    fitted = FormulaParameters.from_dict(params)
+    train_error = None
+    if len(train):
+        train_features = features.subset(train)
+        if fit:
+            fitted = WeightFitter(train_features, formula_name).fit(fitted, loss=fit, bounds=bounds)['params']
+        train_error = FormulaEngine(train_features).evaluate(formula_name, fitted)['avg_error']
+
+    result = FormulaEngine(features.subset(test)).evaluate(formula_name, fitted)
+    timestamps = features.column('timestamp')
+    return {
+        'params': fitted.to_dict(),
+        'train_matches': int(len(train)),
+        'test_matches': int(len(test)),
+        'test_start': float(timestamps[test].min()) if len(test) else None,
+        'test_end': float(timestamps[test].max()) if len(test) else None,
+        'train_avg_error': train_error,
+        'avg_error': result['avg_error'],
+        'accuracy': result['accuracy'],
+        'accurates': result['accurates'],
+        'valid_matches': result['valid_matches'],
+        'total_error': result['total_error'],
+        'error_distribution': result['error_distribution'],
+    }
+
+
+class Backtest:
+    """
+    Valutazione walk-forward di una formula su una tabella di feature.
+
+    run() restituisce i risultati per fold e l'errore complessivo sul fuori
+    campione (somma degli errori di tutti i blocchi di test / partite valide).
+    """
+
+    def __init__(self, features: MatchFeatures, formula_name: str = 'formula2', n_folds: int = 5,
+                 stratify: bool = True, window: Optional[int] = None, workers: Optional[int] = None,
+                 cache: Optional[BacktestCache] = None, bounds: Optional[Dict] = PARAMETER_BOUNDS):
+        if formula_name not in VECTORISED_FORMULAS:
+            raise ValueError(f"Formula non supportata: {formula_name}")
+        if not features.valid('timestamp').any():
+            raise ValueError("Nessuna partita con fixture.timestamp: impossibile ordinare nel tempo")
+        self.features = features
+        self.formula_name = formula_name
+        self.workers = min(workers or os.cpu_count() or 1, n_folds)
+        self.cache = cache if cache is not None else BacktestCache()
+        self.bounds = bounds
+        self.dataset_hash = features.content_hash()
+        league_ids = features.column('league_id') if stratify else None
+        self.splits = walk_forward_splits(features.column('timestamp'), league_ids, n_folds, window)
+
+    def run(self, params: Optional[FormulaParameters] = None, fit: Optional[str] = None) -> Dict:
+        """
+        Args:
+            params: parametri valutati (o punto di partenza della stima); predefiniti se None
+            fit: None (parametri fissi) o 'mse'/'mae' per stimare i pesi su ogni fold (WeightFitter)
+        """
+        if fit is not None and fit not in FIT_LOSSES:
+            raise ValueError(f"Stima non supportata: {fit} (valide: {', '.join(FIT_LOSSES)})")
+        params = (params or FormulaParameters()).to_dict()
+        bounds = self.bounds if fit else None
+
+        folds: List[Optional[Dict]] = [None] * len(self.splits)
+        keys = [BacktestCache.make_key(self.dataset_hash, self.formula_name, params, fit, bounds, train, test)
+                for train, test in self.splits]
+        pending = []
+        for index, key in enumerate(keys):
+            folds[index] = self.cache.get(key)
+            if folds[index] is None:
+                pending.append(index)
+
+        if pending:
+            args = [(self.formula_name, params, fit, bounds) + self.splits[index] for index in pending]
+            if self.workers <= 1 or len(pending) == 1:
+                _init_worker(self.features)
+                computed = [_run_fold(*arg) for arg in args]
+            else:
+                with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                         initargs=(self.features,)) as executor:
+                    computed = list(executor.map(_run_fold, *zip(*args)))
+            for index, result in zip(pending, computed):
+                folds[index] = result
+                self.cache.put(keys[index], result)
+
+        for index, fold in enumerate(folds):
+            fold['fold'] = index
+        valid_matches = sum(fold['valid_matches'] for fold in folds)
+        total_error = sum(fold['total_error'] for fold in folds)
+        accurates = sum(fold['accurates'] for fold in folds)
+        categories = [category for _, category in ERROR_CATEGORIES] + ['Molto Alto']
+        return {
+            'formula': self.formula_name,
+            'fit': fit,
+            'folds': folds,
+            'cached_folds': len(folds) - len(pending),
+            'avg_error': total_error / valid_matches if valid_matches > 0 else float('inf'),
+            'accuracy': (accurates / valid_matches * 100) if valid_matches > 0 else 0,
+            'valid_matches': valid_matches,
+            'error_distribution': {
+                category: sum(fold['error_distribution'][category] for fold in folds) for category in categories
+            },
+        }
+
+
+def print_backtest(result: Dict):
+    print(f"\nBacktest walk-forward di {result['formula']} "
+          f"(stima: {result['fit'] or 'nessuna'}, fold in cache: {result['cached_folds']}/{len(result['folds'])})")
+    print(f"{'fold':>4} {'stima':>7} {'test':>6} {'err. stima':>10} {'errore':>8} {'accur.':>7}")
+    for fold in result['folds']:
+        train_error = f"{fold['train_avg_error']:.4f}" if fold['train_avg_error'] is not None else '-'
+        print(f"{fold['fold']:>4} {fold['train_matches']:>7} {fold['test_matches']:>6} {train_error:>10} "
+              f"{fold['avg_error']:8.4f} {fold['accuracy']:6.2f}%")
+    print(f"Fuori campione: errore medio {result['avg_error']:.4f}, accuratezza {result['accuracy']:.2f}% "
+          f"su {result['valid_matches']} partite, distribuzione {result['error_distribution']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="../match_data")
+    parser.add_argument("--formula", default="formula2", choices=list(VECTORISED_FORMULAS))
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--window", type=int, default=None, help="blocchi di stima per fold (default: tutti i precedenti)")
+    parser.add_argument("--fit", default=None, choices=FIT_LOSSES, help="stima dei pesi su ogni fold")
+    parser.add_argument("--no-stratify", action="store_true", help="divisione globale invece che per campionato")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    features = MatchDataManager(None, data_dir=args.data_dir).load_feature_table()
+    backtest = Backtest(features, args.formula, n_folds=args.folds, stratify=not args.no_stratify,
+                        window=args.window, workers=args.workers)
+    print_backtest(backtest.run(fit=args.fit))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+from match_io import write_json_file
+
+# Lo stato delle partite concluse è definito con la cache delle risposte in shared_utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared_utils.response_cache import fixture_is_final  # noqa: E402
+
+
+class CollectionCheckpoint:
+    """
+    Checkpoint della raccolta dati di una giornata.
+
+    Per ogni partita non ancora completa salva le sotto-risorse già recuperate
+    (statistiche squadre, statistiche partita, eventi, formazioni, meteo) in
+    checkpoints/{data}/{fixture_id}.json, così una raccolta interrotta da quota
+    o errori di rete riprende recuperando solo i pezzi mancanti.
+
+    La lista delle partite del giorno è riusata senza scadenza solo se tutte le
+    partite sono concluse; altrimenti viene riscaricata dopo FIXTURES_TTL secondi.
+    """
+    FIXTURES_FILE = "_fixtures.json"
+    FIXTURES_TTL = 15 * 60
+
+    def __init__(self, checkpoint_root: str, date: str):
+        self.date = date
+        self.checkpoint_dir = os.path.join(checkpoint_root, date)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.checkpoint_dir, name)
+
+    def _read(self, name: str):
+        path = self._path(name)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write(self, name: str, data):
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        write_json_file(self._path(name), data)
+
+    def load_fixtures(self) -> Optional[List[Dict]]:
+        """Lista delle partite del giorno salvata dal tentativo precedente, None se da riscaricare"""
+        saved = self._read(self.FIXTURES_FILE)
+        if saved is None:
+            return None
+        fixtures = saved['fixtures']
+        if fixtures and all(fixture_is_final(fixture) for fixture in fixtures):
+            return fixtures
+        if time.time() - saved['saved_at'] > self.FIXTURES_TTL:
+            return None
+        return fixtures
+
+    def save_fixtures(self, fixtures: List[Dict]):
+        self._write(self.FIXTURES_FILE, {'saved_at': time.time(), 'fixtures': fixtures})
+
+    def load_resources(self, fixture_id: int) -> Dict:
+        """Sotto-risorse già recuperate per una partita"""
+        return self._read(f"{fixture_id}.json") or {}
+
+    def save_resources(self, fixture_id: int, resources: Dict):
+        self._write(f"{fixture_id}.json", resources)
+
+    def complete_fixture(self, fixture_id: int):
+        """Rimuove il checkpoint di una partita salvata per intero"""
+        path = self._path(f"{fixture_id}.json")
+        if os.path.exists(path):
+            os.remove(path)
+
+    def pending_fixtures(self) -> List[int]:
+        if not os.path.isdir(self.checkpoint_dir):
+            return []
+        return [
+            int(name[:-len('.json')]) for name in os.listdir(self.checkpoint_dir)
+            if name.endswith('.json') and name != self.FIXTURES_FILE
+        ]
+
+    def clear(self):
+        """Rimuove il checkpoint della giornata (raccolta completata)"""
+        if not os.path.isdir(self.checkpoint_dir):
+            return
+        for name in os.listdir(self.checkpoint_dir):
+            os.remove(self._path(name))
+        os.rmdir(self.checkpoint_dir)
@@ -0,0 +1,174 @@
+"""
+Cache dei risultati di FormulaEngine.evaluate.
+
+La chiave è (impronta del dataset, identità della formula, parametri): la stessa
+valutazione ripetuta tra iterazioni, sessioni o processi diversi viene letta
+invece di essere ricalcolata. Due livelli:
+- memoria: LRU dei risultati completi, per le ripetizioni nello stesso processo
+- disco: SQLite (metriche in JSON, array per partita compressi), condiviso tra processi,
+  limitato per numero di righe ed età delle valutazioni
+"""
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+DEFAULT_EVALUATION_CACHE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "evaluations.sqlite"
+)
+
+# Array per partita del risultato di evaluate(), salvati in formato npz
+ARRAY_FIELDS = ('predicted', 'errors', 'valid')
+
+
+class EvaluationCache:
+    """
+    Risultati delle valutazioni in memoria (LRU) e su disco (SQLite).
+
+    db_path=None usa XGOALS_EVALUATION_CACHE o .cache/evaluations.sqlite;
+    persistent=False tiene solo il livello in memoria. Su disco restano al più
+    max_rows valutazioni, non più vecchie di max_age secondi (None = nessun limite):
+    oltre vengono rimosse le più vecchie.
+    """
+    # Ogni quante scritture rimuovere le valutazioni scadute e ricontare le righe
+    PURGE_INTERVAL = 100
+
+    def __init__(self, db_path: str = None, memory_size: int = 128, persistent: bool = True,
+                 max_rows: int = 20000, max_age: Optional[float] = 30 * 24 * 3600):
+        self.memory_size = memory_size
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self.max_rows = max_rows
+        self.max_age = max_age
+        # Righe su disco, aggiornate a ogni scrittura e ricontate a ogni pulizia
+        self.row_count = None
+        self.puts_since_purge = 0
+        self.conn = None
+        if persistent:
+            self.db_path = db_path or os.getenv('XGOALS_EVALUATION_CACHE', DEFAULT_EVALUATION_CACHE)
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            with self.conn:
+                self.conn.execute("""
+                    CREATE TABLE IF NOT EXISTS evaluations (
+                        key TEXT PRIMARY KEY,
+                        metrics TEXT NOT NULL,
+                        arrays BLOB NOT NULL,
+                        created REAL NOT NULL
+                    )
+                """)
+                self.conn.execute("CREATE INDEX IF NOT EXISTS idx_evaluations_created ON evaluations(created)")
+
+    @staticmethod
+    def make_key(dataset_hash: str, formula_key: str, params: Dict[str, float]) -> str:
+        payload = json.dumps([dataset_hash, formula_key, sorted(params.items())], separators=(',', ':'))
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def _remember(self, key: str, result: Dict):
+        self.memory[key] = result
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Risultato in cache (copia del dizionario, array in sola lettura) o None"""
+        with self.lock:
+            result = self.memory.get(key)
+            if result is not None:
+                self.memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return dict(result)
+            row = None
+            if self.conn is not None:
+                row = self.conn.execute("SELECT metrics, arrays FROM evaluations WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['disk_hits'] += 1
+            result = json.loads(row[0])
+            with np.load(io.BytesIO(row[1])) as arrays:
+                for name in ARRAY_FIELDS:
+                    result[name] = arrays[name]
+                    result[name].setflags(write=False)
+            self._remember(key, result)
+            return dict(result)
+
+    def put(self, key: str, result: Dict):
+        stored = dict(result)
+        for name in ARRAY_FIELDS:
+            # Gli array in cache sono condivisi tra i lettori: copie in sola lettura
+            stored[name] = np.array(result[name])
+            stored[name].setflags(write=False)
+        with self.lock:
+            self._remember(key, stored)
+            self.stats['stores'] += 1
+            if self.conn is None:
+                return
+            metrics = {name: value for name, value in stored.items() if name not in ARRAY_FIELDS}
+            buffer = io.BytesIO()
+            np.savez_compressed(buffer, **{name: stored[name] for name in ARRAY_FIELDS})
+            with self.conn:
+                existing = self.conn.execute("SELECT 1 FROM evaluations WHERE key = ?", (key,)).fetchone()
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO evaluations (key, metrics, arrays, created) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(metrics), buffer.getvalue(), time.time())
+                )
+            if self.row_count is not None and existing is None:
+                self.row_count += 1
+            self._evict()
+
+    def _evict(self):
+        """
+        Ogni PURGE_INTERVAL scritture rimuove le valutazioni più vecchie di max_age e
+        riconta le righe; oltre max_rows rimuove le più vecchie fino al 90% del limite.
+        """
+        self.puts_since_purge += 1
+        with self.conn:
+            if self.row_count is None or self.puts_since_purge >= self.PURGE_INTERVAL:
+                if self.max_age is not None:
+                    self.stats['evictions'] += self.conn.execute(
+                        "DELETE FROM evaluations WHERE created < ?", (time.time() - self.max_age,)
+                    ).rowcount
+                self.row_count = self.conn.execute("SELECT COUNT(*) FROM evaluations").fetchone()[0]
+                self.puts_since_purge = 0
+            if self.max_rows is None or self.row_count <= self.max_rows:
+                return
+            excess = self.row_count - int(self.max_rows * 0.9)
+            removed = self.conn.execute(
+                "DELETE FROM evaluations WHERE key IN (SELECT key FROM evaluations ORDER BY created LIMIT ?)",
+                (excess,)
+            ).rowcount
+            self.row_count -= removed
+            self.stats['evictions'] += removed
+
+    def hit_rate(self) -> float:
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        lookups = hits + self.stats['misses']
+        return hits / lookups if lookups else 0.0
+
+    def summary(self) -> str:
+        return (f"cache valutazioni: {self.stats['memory_hits']} hit in memoria, "
+                f"{self.stats['disk_hits']} hit su disco, {self.stats['misses']} miss "
+                f"({self.hit_rate() * 100:.1f}% hit rate)")
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            if self.conn is not None:
+                with self.conn:
+                    self.conn.execute("DELETE FROM evaluations")
+                self.row_count = 0
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
@@ -0,0 +1,331 @@
+import os
+import sys
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Lo schema delle feature è condiviso con x_score_calculator: l'implementazione è in shared_utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared_utils.formula_dsl import CompiledFormula, compile_formula  # noqa: E402
+from shared_utils.match_features import MatchFeatures  # noqa: E402
+
+# Statistiche lette dalle formule: nome breve -> feature di shared_utils.match_features
+STAT_FEATURES = {
+    'hs': 'home_for_avg_home',
+    'hc': 'home_against_avg_home',
+    'aws': 'away_for_avg_away',
+    'awc': 'away_against_avg_away',
+    'home_total': 'home_for_avg_total',
+    'away_total': 'away_for_avg_total',
+}
+
+# Statistiche richieste da ogni formula: una partita senza una di queste viene esclusa
+FORMULA_STATS = {
+    'formula1': ('hs', 'hc', 'aws', 'awc', 'home_total', 'away_total'),
+    'formula2': ('hs', 'hc', 'aws', 'awc', 'home_total', 'away_total'),
+    'formula3': ('hs', 'hc', 'aws', 'awc'),
+}
+
+# Categorie di errore: soglia massima inclusa -> nome (oltre l'ultima: 'Molto Alto')
+ERROR_CATEGORIES = [(0.5, 'Buono'), (1.0, 'Accettabile'), (2.0, 'Alto')]
+
+
+class MatchArrays:
+    """
+    Colonne delle feature lette dalle formule, da una tabella MatchFeatures.
+
+    La conversione delle statistiche è quella delle formule per partita
+    (float(str(v).replace(',', '.'))) e una statistica non è valida dove quelle
+    solleverebbero un'eccezione, così i risultati coincidono con il ciclo originale.
+    """
+
+    def __init__(self, matches):
+        self.features = matches if isinstance(matches, MatchFeatures) else MatchFeatures.from_matches(matches)
+        features = self.features
+        self.values = {name: features.column(feature) for name, feature in STAT_FEATURES.items()}
+        self.valid = {name: features.valid(feature) for name, feature in STAT_FEATURES.items()}
+        # Gol reali: validi se entrambi numerici (come la somma nel ciclo originale)
+        self.actual_valid = features.valid('goals_home') & features.valid('goals_away')
+        self.actual = features.column('goals_home') + features.column('goals_away')
+
+    def label(self, pos: int) -> Optional[str]:
+        return self.features.label(pos)
+
+    def actual_goals(self, pos: int):
+        """Gol reali della partita, interi se lo sono (come nel ciclo originale)"""
+        value = float(self.actual[pos])
+        return int(value) if value.is_integer() else value
+
+    def __len__(self) -> int:
+        return len(self.features)
+
+
+def _formula1(s: Dict[str, np.ndarray], params) -> np.ndarray:
+    league_avg = (s['home_total'] + s['away_total']) / 2
+    off_perspective = (s['hs'] * params.home_weight + s['aws'] * params.away_weight)
+    def_perspective = (s['hc'] * params.away_weight + s['awc'] * params.home_weight)
+    return (off_perspective * params.off_weight + def_perspective * params.def_weight) * (league_avg / 2.5)
+
+
+def _formula2(s: Dict[str, np.ndarray], params) -> np.ndarray:
+    league_avg = (s['home_total'] + s['away_total']) / 2
+    league_avg = np.maximum(league_avg, 0.1)
+    hc = np.maximum(s['hc'], 0.1)
+    awc = np.maximum(s['awc'], 0.1)
+    home_strength = (s['hs'] / league_avg) * (1 / (hc / league_avg))
+    away_strength = (s['aws'] / league_avg) * (1 / (awc / league_avg))
+    home_xg = league_avg * home_strength * params.home_weight
+    away_xg = league_avg * away_strength * params.away_weight
+    return home_xg + away_xg
+
+
+def _formula3(s: Dict[str, np.ndarray], params) -> np.ndarray:
+    home_def_factor = 1 / (s['hc'] + 0.5)
+    away_def_factor = 1 / (s['awc'] + 0.5)
+    return ((s['hs'] * home_def_factor * params.home_weight) +
+            (s['aws'] * away_def_factor * params.away_weight)) * params.league_factor
+
+
+def _formula3_invalid(s: Dict[str, np.ndarray]) -> np.ndarray:
+    """Partite in cui la versione per partita solleverebbe ZeroDivisionError"""
+    return (s['hc'] + 0.5 == 0) | (s['awc'] + 0.5 == 0)
+
+
+VECTORISED_FORMULAS = {
+    'formula1': _formula1,
+    'formula2': _formula2,
+    'formula3': _formula3,
+}
+
+# Le stesse formule nel linguaggio di espressioni (shared_utils.formula_dsl), con lo
+# stesso ordine delle operazioni: sono le formule salvate da AlgorithmSaver
+FORMULA_EXPRESSIONS = {
+    'formula1': (
+        "((home_for_avg_home * home_weight + away_for_avg_away * away_weight) * off_weight"
+        " + (home_against_avg_home * away_weight + away_against_avg_away * home_weight) * def_weight)"
+        " * ((home_for_avg_total + away_for_avg_total) / 2 / 2.5)"
+    ),
+    'formula2': (
+        "max((home_for_avg_total + away_for_avg_total) / 2, 0.1)"
+        " * ((home_for_avg_home / max((home_for_avg_total + away_for_avg_total) / 2, 0.1))"
+        " * (1 / (max(home_against_avg_home, 0.1) / max((home_for_avg_total + away_for_avg_total) / 2, 0.1))))"
+        " * home_weight"
+        " + max((home_for_avg_total + away_for_avg_total) / 2, 0.1)"
+        " * ((away_for_avg_away / max((home_for_avg_total + away_for_avg_total) / 2, 0.1))"
+        " * (1 / (max(away_against_avg_away, 0.1) / max((home_for_avg_total + away_for_avg_total) / 2, 0.1))))"
+        " * away_weight"
+    ),
+    'formula3': (
+        "(home_for_avg_home * (1 / (home_against_avg_home + 0.5)) * home_weight"
+        " + away_for_avg_away * (1 / (away_against_avg_away + 0.5)) * away_weight) * league_factor"
+    ),
+}
+
+
+class FormulaEngine:
+    """
+    Valutazione vettoriale delle formule su tutte le partite in un solo passaggio.
+
+    Le operazioni seguono lo stesso ordine delle formule per partita di
+    FormulaEvaluator e l'errore totale è una somma sequenziale (np.cumsum),
+    quindi previsioni, errore medio e distribuzione coincidono esattamente.
+    """
+
+    def __init__(self, matches, cache=None):
+        """
+        matches: lista di partite, MatchFeatures già estratte o MatchArrays
+        cache: EvaluationCache (opzionale) per i risultati di evaluate()
+        """
+        self.arrays = matches if isinstance(matches, MatchArrays) else MatchArrays(matches)
+        self.cache = cache
+        self._dataset_hash = None
+
+    def supports(self, formula_name: str) -> bool:
+        return formula_name in VECTORISED_FORMULAS
+
+    def predict(self, formula_name, params):
+        """
+        Previsioni di tutte le partite e maschera delle partite valutabili.
+
+        formula_name: nome di una formula vettoriale oppure una CompiledFormula
+        (shared_utils.formula_dsl), valida dove le sue feature sono presenti e il risultato è finito
+        """
+        arrays = self.arrays
+        if isinstance(formula_name, CompiledFormula):
+            predicted, valid = formula_name.predict(arrays.features, params)
+            return predicted, valid & arrays.actual_valid
+        valid = arrays.actual_valid.copy()
+        for name in FORMULA_STATS[formula_name]:
+            valid &= arrays.valid[name]
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            predicted = VECTORISED_FORMULAS[formula_name](arrays.values, params)
+            if formula_name == 'formula3':
+                valid &= ~_formula3_invalid(arrays.values)
+        return predicted, valid
+
+    @staticmethod
+    def formula_key(formula_name) -> str:
+        """Identità della formula per le cache: impronta della sua espressione"""
+        if isinstance(formula_name, CompiledFormula):
+            return formula_name.key
+        return f"{formula_name}:{compile_formula(FORMULA_EXPRESSIONS[formula_name]).key}"
+
+    def cache_key(self, formula_name, params) -> str:
+        if self._dataset_hash is None:
+            self._dataset_hash = self.arrays.features.content_hash()
+        values = params.to_dict() if hasattr(params, 'to_dict') else dict(params or {})
+        return self.cache.make_key(self._dataset_hash, self.formula_key(formula_name), values)
+
+    def evaluate(self, formula_name, params) -> Dict:
+        """
+        Errore medio, accuratezza (errore <= 0.5) e distribuzione degli errori.
+
+        Restituisce anche gli array per partita (predicted, errors, valid) per le
+        analisi dettagliate. Con una cache, i risultati già calcolati per lo stesso
+        dataset, formula e parametri vengono letti (array in sola lettura).
+        """
+        if self.cache is None:
+            return self._evaluate(formula_name, params)
+        key = self.cache_key(formula_name, params)
+        result = self.cache.get(key)
+        if result is None:
+            result = self._evaluate(formula_name, params)
+            self.cache.put(key, result)
+        return result
+
+    def _evaluate(self, formula_name, params) -> Dict:
+        predicted, valid = self.predict(formula_name, params)
+        errors = np.abs(predicted[valid] - self.arrays.actual[valid])
+        valid_matches = int(valid.sum())
+        total_error = float(np.cumsum(errors)[-1]) if valid_matches else 0
+        accurates = int(np.count_nonzero(errors <= 0.5))
+        distribution = self.error_distribution(errors)
+        return {
+            'avg_error': total_error / valid_matches if valid_matches > 0 else float('inf'),
+            'accuracy': (accurates / valid_matches * 100) if valid_matches > 0 else 0,
+            'accurates': accurates,
+            'valid_matches': valid_matches,
+            'skipped': len(self.arrays) - valid_matches,
+            'total_error': total_error,
+            'error_distribution': distribution,
+            'predicted': predicted,
+            'errors': errors,
+            'valid': valid,
+        }
+
+    def _predict_group(self, formula_name, params: List[Dict[str, float]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Previsioni (k x partite) di una formula per k vettori di parametri, in un passaggio"""
+        arrays = self.arrays
+        # Ogni parametro diventa una colonna (k x 1): le operazioni della formula si estendono a tutte le righe
+        stacked = {name: np.array([values[name] for values in params], dtype=np.float64)[:, None]
+                   for name in params[0]}
+        shape = (len(params), len(arrays))
+        if isinstance(formula_name, CompiledFormula):
+            columns = {name: arrays.features.column(name) for name in formula_name.features}
+            predicted = np.broadcast_to(formula_name(columns, stacked), shape)
+            valid = np.isfinite(predicted) & arrays.actual_valid
+            for name in formula_name.features:
+                valid &= arrays.features.valid(name)
+            return predicted, valid
+        _, valid = self.predict(formula_name, SimpleNamespace(**params[0]))
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            predicted = np.broadcast_to(VECTORISED_FORMULAS[formula_name](arrays.values, SimpleNamespace(**stacked)), shape)
+        return predicted, np.broadcast_to(valid, shape)
+
+    def score_batch(self, candidates: Sequence[Tuple[object, object]]) -> Dict:
+        """
+        Valuta N candidati (formula, parametri) in un solo passaggio sulle colonne condivise.
+
+        formula: nome di una formula vettoriale, CompiledFormula o espressione;
+        parametri: FormulaParameters o dizionario completo. I candidati della stessa
+        formula sono calcolati insieme come matrice; nessuno stato passa da un candidato all'altro.
+
+        Returns:
+            'predicted' e 'valid' (matrici N x partite) e le metriche di evaluate()
+            come array di N elementi ('error_distribution': categoria -> array),
+            identiche a quelle di evaluate() candidato per candidato
+        """
+        arrays = self.arrays
+        n, m = len(candidates), len(arrays)
+        predicted = np.empty((n, m), dtype=np.float64)
+        valid = np.empty((n, m), dtype=bool)
+
+        groups = {}
+        for index, (formula_name, params) in enumerate(candidates):
+            if isinstance(formula_name, str) and formula_name not in VECTORISED_FORMULAS:
+                formula_name = compile_formula(formula_name)
+            values = params.to_dict() if hasattr(params, 'to_dict') else dict(params)
+            key = (self.formula_key(formula_name), tuple(sorted(values)))
+            groups.setdefault(key, (formula_name, [], []))
+            groups[key][1].append(index)
+            groups[key][2].append(values)
+        for formula_name, indices, params in groups.values():
+            predicted[indices], valid[indices] = self._predict_group(formula_name, params)
+
+        with np.errstate(invalid='ignore'):
+            errors = np.abs(predicted - arrays.actual)
+            # Le partite escluse contano 0: la somma cumulativa per riga coincide con quella di evaluate()
+            total_error = np.cumsum(np.where(valid, errors, 0.0), axis=1)[:, -1] if m else np.zeros(n)
+            accurate = valid & (errors <= 0.5)
+            distribution = {}
+            remaining = valid.copy()
+            for threshold, category in ERROR_CATEGORIES:
+                in_category = remaining & (errors <= threshold)
+                distribution[category] = in_category.sum(axis=1)
+                remaining &= ~in_category
+        distribution['Molto Alto'] = remaining.sum(axis=1)
+        valid_matches = valid.sum(axis=1)
+        accurates = accurate.sum(axis=1)
+        has_valid = valid_matches > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            avg_error = np.where(has_valid, total_error / valid_matches, np.inf)
+            accuracy = np.where(has_valid, accurates / valid_matches * 100, 0.0)
+        return {
+            'avg_error': avg_error,
+            'accuracy': accuracy,
+            'accurates': accurates,
+            'valid_matches': valid_matches,
+            'skipped': m - valid_matches,
+            'total_error': total_error,
+            'error_distribution': distribution,
+            'predicted': predicted,
+            'valid': valid,
+        }
+
+    @staticmethod
+    def error_distribution(errors: np.ndarray) -> Dict[str, int]:
+        distribution = {}
+        remaining = np.ones(len(errors), dtype=bool)
+        for threshold, category in ERROR_CATEGORIES:
+            in_category = remaining & (errors <= threshold)
+            distribution[category] = int(in_category.sum())
+            remaining &= ~in_category
+        distribution['Molto Alto'] = int(remaining.sum())  # include gli errori NaN, come il ciclo
+        return distribution
+
+    @staticmethod
+    def categorize(error: float) -> str:
+        for threshold, category in ERROR_CATEGORIES:
+            if error <= threshold:
+                return category
+        return 'Molto Alto'
+
+    def analyses(self, result: Dict) -> List[Dict]:
+        """Analisi per partita (come test_formula2_detailed) dai risultati di evaluate()"""
+        arrays = self.arrays
+        analyses = []
+        positions = np.flatnonzero(result['valid']).tolist()
+        for pos, predicted, error in zip(positions, result['predicted'][result['valid']].tolist(),
+                                         result['errors'].tolist()):
+            label = arrays.label(pos)
+            if label is None:
+                continue
+            analyses.append({
+                'match': label,
+                'predicted': round(predicted, 2),
+                'actual': arrays.actual_goals(pos),
+                'error': round(error, 2),
+                'category': self.categorize(error)
+            })
+        return analyses
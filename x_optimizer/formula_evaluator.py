@@ -1,4 +1,16 @@
+from typing import Dict, Optional
+
+from formula_engine import FORMULA_STATS, STAT_FEATURES, VECTORISED_FORMULAS, FormulaEngine
+from shared_utils.formula_dsl import PARAMETER_NAMES, CompiledFormula, compile_formula
+from shared_utils.match_features import MatchFeatures, MatchRecord
+
+# Campi delle partite letti dalle formule: lineups, eventi e statistiche partita non servono
+FORMULA_FIELDS = ['teams', 'goals', 'home_stats.goals', 'away_stats.goals']
+
+
 class FormulaParameters:
+    FIELDS = PARAMETER_NAMES
+
     def __init__(self):
         self.home_weight = 0.6
         self.away_weight = 0.4
@@ -6,6 +18,19 @@ class FormulaParameters:
         self.def_weight = 0.45
         self.league_factor = 1.0
 
+    @classmethod
+    def from_dict(cls, values: Dict[str, float]) -> 'FormulaParameters':
+        """Parametri dai valori indicati (i campi assenti restano ai valori predefiniti)"""
+        params = cls()
+        for field, value in values.items():
+            if field not in cls.FIELDS:
+                raise ValueError(f"Parametro sconosciuto: {field}")
+            setattr(params, field, float(value))
+        return params
+
+    def to_dict(self) -> Dict[str, float]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
     def adjust(self, error):
         """Aggiusta i parametri in base all'errore"""
         step = 0.05
@@ -17,34 +42,58 @@ class FormulaParameters:
 
 
 class FormulaEvaluator:
-    def __init__(self, historical_matches):
+    def __init__(self, historical_matches, features: Optional[MatchFeatures] = None, cache=None):
+        """
+        features: tabella delle feature già estratte per historical_matches (stesso ordine),
+        ad es. da MatchDataManager.load_feature_table(); se assente viene costruita alla prima valutazione
+        cache: EvaluationCache (opzionale) condivisa tra valutatori, iterazioni e sessioni
+        """
         self.historical_matches = historical_matches
+        self.features = features if features is not None and len(features) == len(historical_matches) else None
+        self.cache = cache
         self.best_formula = None
         self.best_error = float('inf')
         self.parameters = FormulaParameters()
+        self.engine = None
+
+    @staticmethod
+    def _features(match, formula_name: str) -> MatchRecord:
+        """Feature lette dalla formula; ValueError se una manca o non è valida"""
+        names = [STAT_FEATURES[stat] for stat in FORMULA_STATS[formula_name]]
+        return MatchRecord.from_match(match, names).require(*names)
+
+    @staticmethod
+    def formula1(match, params):
+        """Formula 1: originale modificata con pesi"""
+        f = FormulaEvaluator._features(match, 'formula1')
+
+        # Calcola la media del campionato
+        league_avg = (f.home_for_avg_total + f.away_for_avg_total) / 2
+
+        # Prospettiva offensiva pesata
+        off_perspective = (f.home_for_avg_home * params.home_weight + f.away_for_avg_away * params.away_weight)
+
+        # Prospettiva difensiva pesata
+        def_perspective = (f.home_against_avg_home * params.away_weight + f.away_against_avg_away * params.home_weight)
+
+        # Media pesata finale
+        xgoals = (off_perspective * params.off_weight + def_perspective * params.def_weight) * (league_avg / 2.5)
+
+        return xgoals
 
     @staticmethod
     def formula2(match, params):
         """Formula 2: basata sulla forza relativa"""
-        home_stats = match['home_stats']
-        away_stats = match['away_stats']
-
-        # Estrai e converti le statistiche
-        hs = float(str(home_stats['goals']['for']['average']['home']).replace(',', '.'))
-        hc = float(str(home_stats['goals']['against']['average']['home']).replace(',', '.'))
-        aws = float(str(away_stats['goals']['for']['average']['away']).replace(',', '.'))
-        awc = float(str(away_stats['goals']['against']['average']['away']).replace(',', '.'))
+        f = FormulaEvaluator._features(match, 'formula2')
+        hs, aws = f.home_for_avg_home, f.away_for_avg_away
 
         # Calcola la media del campionato
-        league_avg = (
-                             float(str(home_stats['goals']['for']['average']['total']).replace(',', '.')) +
-                             float(str(away_stats['goals']['for']['average']['total']).replace(',', '.')
-                                   )) / 2
+        league_avg = (f.home_for_avg_total + f.away_for_avg_total) / 2
 
         # Previeni divisione per zero
         league_avg = max(league_avg, 0.1)
-        hc = max(hc, 0.1)
-        awc = max(awc, 0.1)
+        hc = max(f.home_against_avg_home, 0.1)
+        awc = max(f.away_against_avg_away, 0.1)
 
         # Calcola la forza relativa delle squadre
         home_strength = (hs / league_avg) * (1 / (hc / league_avg))
@@ -56,56 +105,54 @@ class FormulaEvaluator:
 
         return home_xg + away_xg
 
-    def test_formula2_detailed(self, params):
-        """Test dettagliato della Formula 2 con analisi degli errori"""
-        analyses = []
-        total_error = 0
-        error_distribution = {'Buono': 0, 'Accettabile': 0, 'Alto': 0, 'Molto Alto': 0}
+    @staticmethod
+    def formula3(match, params):
+        """Formula 3: media ponderata con fattore difensivo"""
+        f = FormulaEvaluator._features(match, 'formula3')
 
-        for match in self.historical_matches:
-            try:
-                predicted = self.formula2(match, params)
-                actual = match['goals']['home'] + match['goals']['away']
-                error = abs(predicted - actual)
+        # Fattore difensivo
+        home_def_factor = 1 / (f.home_against_avg_home + 0.5)
+        away_def_factor = 1 / (f.away_against_avg_away + 0.5)
 
-                # Categorizza l'errore
-                if error <= 0.5:
-                    category = 'Buono'
-                elif error <= 1.0:
-                    category = 'Accettabile'
-                elif error <= 2.0:
-                    category = 'Alto'
-                else:
-                    category = 'Molto Alto'
-
-                error_distribution[category] += 1
-                total_error += error
+        # xgoals pesati con fattore difensivo
+        xgoals = ((f.home_for_avg_home * home_def_factor * params.home_weight) +
+                  (f.away_for_avg_away * away_def_factor * params.away_weight)) * params.league_factor
 
-                analyses.append({
-                    'match': f"{match['teams']['home']['name']} vs {match['teams']['away']['name']}",
-                    'predicted': round(predicted, 2),
-                    'actual': actual,
-                    'error': round(error, 2),
-                    'category': category
-                })
+        return xgoals
 
-            except Exception as e:
-                print(f"Errore nell'analisi della partita: {e}")
-                continue
+    def _engine(self) -> FormulaEngine:
+        """Motore vettoriale, creato alla prima valutazione: le statistiche vengono estratte una volta"""
+        if self.engine is None:
+            self.engine = FormulaEngine(self.features if self.features is not None else self.historical_matches,
+                                        cache=self.cache)
+        return self.engine
 
-        avg_error = total_error / len(analyses) if analyses else float('inf')
+    @staticmethod
+    def _vectorised_name(formula_func) -> Optional[str]:
+        """Nome della versione vettoriale di una formula della classe, None per formule esterne"""
+        for name in VECTORISED_FORMULAS:
+            if formula_func is getattr(FormulaEvaluator, name):
+                return name
+        return None
+
+    def test_formula2_detailed(self, params):
+        """Test dettagliato della Formula 2 con analisi degli errori"""
+        engine = self._engine()
+        result = engine.evaluate('formula2', params)
+        if result['skipped']:
+            print(f"Partite escluse dall'analisi per dati mancanti: {result['skipped']}")
+
+        analyses = engine.analyses(result)
+        avg_error = result['total_error'] / len(analyses) if analyses else float('inf')
 
         return {
             'analyses': analyses,
             'avg_error': avg_error,
-            'error_distribution': error_distribution
+            'error_distribution': result['error_distribution']
         }
 
-    def test_formula(self, formula_func, formula_name):
-        """
-        Testa una formula specifica sui dati storici
-        formula_func: funzione che prende i dati di una partita e restituisce xgoals
-        """
+    def _test_formula_per_match(self, formula_func):
+        """Valutazione partita per partita, per le formule senza versione vettoriale"""
         total_error = 0
         valid_matches = 0
         accurates = 0  # partite con errore <= 0.5
@@ -125,86 +172,90 @@ class FormulaEvaluator:
                 print(f"Errore nell'analisi della partita: {e}")
                 continue
 
+        return total_error, valid_matches, accurates
+
+    def test_formula(self, formula_func, formula_name):
+        """
+        Testa una formula specifica sui dati storici
+        formula_func: funzione che prende i dati di una partita e restituisce xgoals,
+            oppure un'espressione di shared_utils.formula_dsl (stringa o CompiledFormula)
+
+        Le formule della classe (formula1/2/3) e le espressioni vengono valutate dal
+        motore vettoriale, le altre funzioni partita per partita.
+        """
+        if isinstance(formula_func, str):
+            # Espressione del linguaggio di formule (es. proposta da un agente): compilata e valutata in un passaggio
+            formula_func = compile_formula(formula_func)
+        vectorised_name = formula_func if isinstance(formula_func, CompiledFormula) \
+            else self._vectorised_name(formula_func)
+        if vectorised_name is not None:
+            result = self._engine().evaluate(vectorised_name, self.parameters)
+            total_error, valid_matches, accurates = result['total_error'], result['valid_matches'], result['accurates']
+            if result['skipped']:
+                print(f"Partite escluse dall'analisi per dati mancanti: {result['skipped']}")
+        else:
+            total_error, valid_matches, accurates = self._test_formula_per_match(formula_func)
+
         avg_error = total_error / valid_matches if valid_matches > 0 else float('inf')
         accuracy = (accurates / valid_matches * 100) if valid_matches > 0 else 0
 
+        self._report(formula_name, avg_error, accuracy, accurates, valid_matches, self.parameters)
+
+        # Aggiusta i parametri per la prossima iterazione
+        self.parameters.adjust(avg_error)
+
+        return avg_error, accuracy
+
+    def _report(self, formula_name, avg_error, accuracy, accurates, valid_matches, params):
+        """Stampa i risultati di una formula e aggiorna la migliore"""
         print(f"\nRisultati formula '{formula_name}':")
         print(f"Errore medio: {avg_error:.2f} gol")
         print(f"Accuratezza (errore <= 0.5): {accuracy:.2f}%")
         print(f"Partite accurate: {accurates}/{valid_matches}")
-        print(
-            f"Parametri usati: home_weight={self.parameters.home_weight:.2f}, off_weight={self.parameters.off_weight:.2f}")
+        print(f"Parametri usati: home_weight={params.home_weight:.2f}, off_weight={params.off_weight:.2f}")
 
         if avg_error < self.best_error:
             self.best_formula = formula_name
             self.best_error = avg_error
 
-        # Aggiusta i parametri per la prossima iterazione
-        self.parameters.adjust(avg_error)
+    def score_formulas(self, candidates) -> Dict:
+        """
+        Valuta più candidati (formula, parametri) in un solo passaggio (FormulaEngine.score_batch).
 
-        return avg_error, accuracy
+        formula: formula della classe (formula1/2/3), nome, espressione o CompiledFormula;
+        parametri: FormulaParameters, dizionario (campi assenti ai valori predefiniti) o
+        None per una copia di self.parameters. self.parameters non viene modificato.
+        """
+        batch = []
+        for formula_func, params in candidates:
+            if callable(formula_func) and not isinstance(formula_func, CompiledFormula):
+                name = self._vectorised_name(formula_func)
+                if name is None:
+                    raise ValueError(f"Formula senza versione vettoriale: {formula_func!r}")
+                formula_func = name
+            if params is None:
+                params = self.parameters
+            values = params if isinstance(params, dict) else params.to_dict()
+            batch.append((formula_func, FormulaParameters.from_dict(values)))
+        return self._engine().score_batch(batch)
 
 
 def test_formulas(historical_matches):
     evaluator = FormulaEvaluator(historical_matches)
-
-    # Formula 1: originale modificata con pesi
-    def formula1(match, params):
-        home_stats = match['home_stats']
-        away_stats = match['away_stats']
-
-        # Estrai e converti le statistiche
-        hs = float(str(home_stats['goals']['for']['average']['home']).replace(',', '.'))
-        hc = float(str(home_stats['goals']['against']['average']['home']).replace(',', '.'))
-        aws = float(str(away_stats['goals']['for']['average']['away']).replace(',', '.'))
-        awc = float(str(away_stats['goals']['against']['average']['away']).replace(',', '.'))
-
-        # Calcola la media del campionato
-        league_avg = (
-                             float(str(home_stats['goals']['for']['average']['total']).replace(',', '.')) +
-                             float(str(away_stats['goals']['for']['average']['total']).replace(',', '.')
-                                   )) / 2
-
-        # Prospettiva offensiva pesata
-        off_perspective = (hs * params.home_weight + aws * params.away_weight)
-
-        # Prospettiva difensiva pesata
-        def_perspective = (hc * params.away_weight + awc * params.home_weight)
-
-        # Media pesata finale
-        xgoals = (off_perspective * params.off_weight + def_perspective * params.def_weight) * (league_avg / 2.5)
-
-        return xgoals
-
-    # Formula 3: media ponderata con fattore difensivo
-    def formula3(match, params):
-        home_stats = match['home_stats']
-        away_stats = match['away_stats']
-
-        # Estrai e converti le statistiche
-        hs = float(str(home_stats['goals']['for']['average']['home']).replace(',', '.'))
-        hc = float(str(home_stats['goals']['against']['average']['home']).replace(',', '.'))
-        aws = float(str(away_stats['goals']['for']['average']['away']).replace(',', '.'))
-        awc = float(str(away_stats['goals']['against']['average']['away']).replace(',', '.'))
-
-        # Fattore difensivo
-        home_def_factor = 1 / (hc + 0.5)
-        away_def_factor = 1 / (awc + 0.5)
-
-        # xgoals pesati con fattore difensivo
-        xgoals = ((hs * home_def_factor * params.home_weight) +
-                  (aws * away_def_factor * params.away_weight)) * params.league_factor
-
-        return xgoals
-
-    # Test delle formule
-    print("\nTesting Formula 1 - Pesi differenziati")
-    evaluator.test_formula(formula1, "Formula 1 - Pesi differenziati")
-
-    print("\nTesting Formula 2 - Forza relativa")
-    evaluator.test_formula(evaluator.formula2, "Formula 2 - Forza relativa")
-
-    print("\nTesting Formula 3 - Fattore difensivo")
-    evaluator.test_formula(formula3, "Formula 3 - Fattore difensivo")
-
-    return evaluator.best_formula, evaluator.best_error
\ No newline at end of file
+    formulas = [
+        (evaluator.formula1, "Formula 1 - Pesi differenziati"),
+        (evaluator.formula2, "Formula 2 - Forza relativa"),
+        (evaluator.formula3, "Formula 3 - Fattore difensivo"),
+    ]
+
+    # Le tre formule vengono valutate insieme con gli stessi parametri: il risultato non dipende dall'ordine
+    params = FormulaParameters.from_dict(evaluator.parameters.to_dict())
+    result = evaluator.score_formulas([(formula_func, params) for formula_func, _ in formulas])
+    for index, (_, formula_name) in enumerate(formulas):
+        print(f"\nTesting {formula_name}")
+        if result['skipped'][index]:
+            print(f"Partite escluse dall'analisi per dati mancanti: {result['skipped'][index]}")
+        evaluator._report(formula_name, float(result['avg_error'][index]), float(result['accuracy'][index]),
+                          int(result['accurates'][index]), int(result['valid_matches'][index]), params)
+
+    return evaluator.best_formula, evaluator.best_error
@@ -0,0 +1,224 @@
+"""
+Valutazione incrementale delle formule sulle partite dell'archivio colonnare.
+
+Per ogni coppia (formula, parametri) registrata vengono tenuti gli aggregati
+dell'errore (somma degli errori assoluti, partite valide, accurate, conteggi
+per categoria) e il contributo di ogni partita già valutata (id, versione
+nell'archivio, errore), salvati tra un'esecuzione e l'altra. update() legge
+dall'archivio solo le partite nuove o sostituite e aggiorna gli aggregati: la
+valutazione giornaliera costa O(partite nuove) invece di O(storico).
+
+Uso:
+    python incremental_evaluator.py --data-dir ../match_data
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from formula_engine import ERROR_CATEGORIES, VECTORISED_FORMULAS, FormulaEngine
+from formula_evaluator import FormulaParameters
+from match_io import atomic_write, write_json_file
+from match_store import MatchStore
+from shared_utils.match_features import FEATURE_SOURCE_FIELDS, MatchFeatures
+
+ERROR_CATEGORY_NAMES = [category for _, category in ERROR_CATEGORIES] + ['Molto Alto']
+
+
+def _empty_aggregates() -> Dict:
+    return {
+        'total_error': 0.0,
+        'valid_matches': 0,
+        'accurates': 0,
+        'skipped': 0,
+        'error_distribution': {category: 0 for category in ERROR_CATEGORY_NAMES},
+    }
+
+
+def _empty_contributions() -> Dict[str, np.ndarray]:
+    return {
+        'fixture_id': np.empty(0, dtype=np.int64),
+        'version': np.empty(0, dtype=np.int64),
+        'error': np.empty(0, dtype=np.float64),
+        'valid': np.empty(0, dtype=bool),
+    }
+
+
+def _add_contributions(entry: Dict, errors: np.ndarray, valid: np.ndarray, sign: int = 1):
+    """Somma (sign=1) o sottrae (sign=-1) agli aggregati il contributo delle partite"""
+    valid_errors = errors[valid]
+    entry['total_error'] += sign * float(valid_errors.sum())
+    entry['valid_matches'] += sign * int(valid.sum())
+    entry['accurates'] += sign * int(np.count_nonzero(valid_errors <= 0.5))
+    entry['skipped'] += sign * int(np.count_nonzero(~valid))
+    for category, count in FormulaEngine.error_distribution(valid_errors).items():
+        entry['error_distribution'][category] += sign * count
+
+
+class IncrementalEvaluator:
+    """
+    Aggregati persistenti dell'errore per (formula, parametri).
+
+    Stato in state_dir: state.json (aggregati di ogni coppia registrata) e
+    {chiave}.npz (per partita valutata: id, versione, errore, validità). La versione
+    è l'offset della partita nel blob dell'archivio: una partita sostituita (ad es.
+    raccolta di nuovo a fine gara) cambia offset, il suo vecchio contributo viene
+    sottratto dagli aggregati e la nuova versione valutata. Se l'archivio viene
+    riscritto e mancano partite già valutate, gli aggregati ripartono da zero.
+    """
+    STATE_FILE = "state.json"
+
+    def __init__(self, match_store: MatchStore, state_dir: str):
+        self.match_store = match_store
+        self.state_dir = state_dir
+        os.makedirs(self.state_dir, exist_ok=True)
+        state_path = os.path.join(self.state_dir, self.STATE_FILE)
+        if os.path.exists(state_path):
+            with open(state_path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        else:
+            self.entries = {}
+
+    @staticmethod
+    def make_key(formula_name: str, params: Dict[str, float]) -> str:
+        payload = json.dumps([formula_name, sorted(params.items())], separators=(',', ':'))
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+    def register(self, formula_name: str, params: Optional[FormulaParameters] = None) -> str:
+        """Registra una coppia (formula, parametri) e ne restituisce la chiave"""
+        if formula_name not in VECTORISED_FORMULAS:
+            raise ValueError(f"Formula non supportata: {formula_name}")
+        values = (params or FormulaParameters()).to_dict()
+        key = self.make_key(formula_name, values)
+        if key not in self.entries:
+            self.entries[key] = {'formula': formula_name, 'params': values, **_empty_aggregates()}
+        return key
+
+    def _contributions_path(self, key: str) -> str:
+        return os.path.join(self.state_dir, f"{key}.npz")
+
+    def _load_contributions(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        path = self._contributions_path(key)
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            return {name: data[name] for name in data.files}
+
+    def _save(self, contributions: Dict[str, Dict[str, np.ndarray]]):
+        # Prima i contributi, poi lo stato: un'interruzione lascia al più partite da rivalutare
+        for key, arrays in contributions.items():
+            buffer = io.BytesIO()
+            np.savez(buffer, **arrays)
+            atomic_write(self._contributions_path(key), buffer.getvalue())
+        write_json_file(os.path.join(self.state_dir, self.STATE_FILE), self.entries)
+
+    def update(self) -> Dict[str, int]:
+        """
+        Valuta le partite dell'archivio non ancora viste o sostituite, per ogni coppia registrata.
+
+        Returns:
+            chiave -> numero di partite nuove o sostituite valutate
+        """
+        store_ids = self.match_store.fixture_ids()
+        offsets = self.match_store.load_features().get('offsets')
+        store_versions = offsets[:, 0] if offsets is not None else np.empty(0, dtype=np.int64)
+        order = np.argsort(store_ids)
+        contributions = {}
+        new_ids = {}
+        for key, entry in self.entries.items():
+            seen = self._load_contributions(key)
+            if seen is None or not np.all(np.isin(seen['fixture_id'], store_ids)):
+                if seen is not None:
+                    print(f"♻️ Archivio riscritto: valutazione di {entry['formula']} ricalcolata da zero")
+                entry.update(_empty_aggregates())
+                seen = _empty_contributions()
+            # Partite sostituite nell'archivio: il contributo della versione valutata esce dagli aggregati
+            positions = order[np.searchsorted(store_ids, seen['fixture_id'], sorter=order)]
+            replaced = store_versions[positions] != seen['version']
+            if replaced.any():
+                _add_contributions(entry, seen['error'][replaced], seen['valid'][replaced], sign=-1)
+                seen = {name: values[~replaced] for name, values in seen.items()}
+            contributions[key] = seen
+            new_ids[key] = store_ids[~np.isin(store_ids, seen['fixture_id'])]
+
+        pending = np.unique(np.concatenate(list(new_ids.values()) or [np.empty(0, dtype=np.int64)]))
+        if len(pending) == 0:
+            return {key: 0 for key in self.entries}
+
+        # Le partite nuove vengono lette una volta sola per tutte le coppie, nell'ordine dell'archivio
+        loaded = np.isin(store_ids, pending)
+        loaded_ids = store_ids[loaded]
+        loaded_versions = store_versions[loaded]
+        features = MatchFeatures.from_matches(
+            self.match_store.iter_matches(fixture_ids=loaded_ids.tolist(), fields=FEATURE_SOURCE_FIELDS)
+        )
+
+        added = {}
+        for key, entry in self.entries.items():
+            positions = np.flatnonzero(np.isin(loaded_ids, new_ids[key]))
+            added[key] = len(positions)
+            if not len(positions):
+                continue
+            result = FormulaEngine(features.subset(positions)).evaluate(
+                entry['formula'], FormulaParameters.from_dict(entry['params'])
+            )
+            errors = np.full(len(positions), np.nan)
+            errors[result['valid']] = result['errors']
+            _add_contributions(entry, errors, result['valid'])
+            added_rows = {
+                'fixture_id': loaded_ids[positions],
+                'version': loaded_versions[positions],
+                'error': errors,
+                'valid': np.asarray(result['valid'], dtype=bool),
+            }
+            contributions[key] = {
+                name: np.concatenate([values, added_rows[name]]) for name, values in contributions[key].items()
+            }
+
+        self._save(contributions)
+        return added
+
+    def summary(self, key: str) -> Dict:
+        """Errore medio, accuratezza e distribuzione della coppia, come FormulaEngine.evaluate"""
+        entry = self.entries[key]
+        valid_matches = entry['valid_matches']
+        return {
+            'formula': entry['formula'],
+            'params': entry['params'],
+            'avg_error': entry['total_error'] / valid_matches if valid_matches > 0 else float('inf'),
+            'accuracy': (entry['accurates'] / valid_matches * 100) if valid_matches > 0 else 0,
+            'accurates': entry['accurates'],
+            'valid_matches': valid_matches,
+            'skipped': entry['skipped'],
+            'error_distribution': dict(entry['error_distribution']),
+        }
+
+    def summaries(self) -> List[Dict]:
+        return sorted((self.summary(key) for key in self.entries), key=lambda s: s['avg_error'])
+
+
+def main():
+    # Import locale: match_data_manager dipende da questo modulo
+    from match_data_manager import MatchDataManager
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="../match_data")
+    args = parser.parse_args()
+
+    data_manager = MatchDataManager(None, data_dir=args.data_dir)
+    evaluator = data_manager.incremental_evaluator()
+    for formula_name in VECTORISED_FORMULAS:
+        evaluator.register(formula_name)
+    added = evaluator.update()
+    print(f"Partite nuove valutate: {max(added.values(), default=0)}")
+    for summary in evaluator.summaries():
+        print(f"{summary['formula']}: errore medio {summary['avg_error']:.4f}, "
+              f"accuratezza {summary['accuracy']:.2f}% su {summary['valid_matches']} partite")
+
+
+if __name__ == "__main__":
+    main()
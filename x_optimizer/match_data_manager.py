@@ -1,15 +1,39 @@
+import hashlib
 import json
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import partial
 from datetime import datetime
-from typing import Dict, List
-from api_client import FootballDataCollector
+from typing import Callable, Dict, Iterator, List, Optional
+import numpy as np
+from api_client import FootballDataCollector  # aggiunge anche la root del progetto a sys.path
+from shared_utils.match_features import FEATURE_SOURCE_FIELDS, FeatureCache, MatchFeatures, schema_hash
+from shared_utils.quota_ledger import PRIORITY_LOW, QuotaDeferred, QuotaExceeded, utc_day
+from shared_utils.request_planner import RequestPlanner
+from shared_utils.response_cache import fixture_is_final
+from match_store import MatchStore
+from match_index import MatchIndex
+from match_io import STORAGE_FORMATS, match_filename, read_match_file, write_match_file
+from collection_checkpoint import CollectionCheckpoint
+from incremental_evaluator import IncrementalEvaluator
 
 
 class MatchDataManager:
-    def __init__(self, api_client: FootballDataCollector):
+    def __init__(self, api_client: FootballDataCollector, data_dir: str = "../match_data",
+                 storage_format: str = "json", collection_workers: int = 8):
+        if storage_format not in STORAGE_FORMATS:
+            raise ValueError(f"Formato di salvataggio non supportato: {storage_format}")
         self.api_client = api_client
-        self.data_dir = "../match_data"
+        self.data_dir = data_dir
+        self.storage_format = storage_format  # 'json' (indentato) o 'json.gz' (compatto compresso)
+        self.collection_workers = collection_workers  # partite raccolte in parallelo
         self.ensure_data_directory()
+        self.match_store = MatchStore(os.path.join(self.data_dir, "store"))
+        self.match_index = MatchIndex(os.path.join(self.data_dir, "match_index.sqlite"))
+        self.checkpoint_dir = os.path.join(self.data_dir, "checkpoints")
+        self.feature_cache = FeatureCache(os.path.join(self.data_dir, "features"))
+        if self.match_index.count() == 0:
+            self.rebuild_index()
 
     def ensure_data_directory(self):
         if not os.path.exists(self.data_dir):
@@ -18,121 +42,360 @@ class MatchDataManager:
         else:
             print(f"📂 Directory '{self.data_dir}' già esistente.")
 
+    def rebuild_index(self) -> int:
+        """Ricostruisce l'indice scansionando (una sola volta) i file JSON della directory"""
+        entries = []
+        for filename in os.listdir(self.data_dir):
+            parsed = MatchIndex.parse_filename(filename)
+            if not parsed:
+                continue
+            filepath = os.path.join(self.data_dir, filename)
+            try:
+                match_data = read_match_file(filepath)
+            except (json.JSONDecodeError, EOFError, OSError):
+                # Solo file scritti prima del salvataggio atomico possono essere troncati
+                print(f"File corrotto: {filename}, escluso dall'indice")
+                continue
+            entries.append((match_data, parsed[0], filename))
+
+        self.match_index.clear()
+        self.match_index.add_many(entries)
+        if entries:
+            print(f"🗂️ Indice partite ricostruito con {len(entries)} file")
+        return len(entries)
+
     def save_match_data(self, match_data: Dict, date: str):
-        """Salva i dati della partita in un file JSON"""
-        filename = f"match_{date}_{match_data['fixture']['id']}.json"
+        """Salva i dati della partita in un file JSON (scrittura atomica, eventualmente compressa)"""
+        fixture_id = match_data['fixture']['id']
+        filename = match_filename(date, fixture_id, self.storage_format)
         filepath = os.path.join(self.data_dir, filename)
 
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(match_data, f, ensure_ascii=False, indent=4)
-            print(f"💾 File salvato: {filepath}")
+        write_match_file(filepath, match_data, self.storage_format)
+        print(f"💾 File salvato: {filepath}")
 
-    def collect_match_data(self, date: str) -> List[Dict]:
-        """Raccoglie e salva i dati completi delle partite per una data"""
-        print(f"\nRaccolta dati per {date}...")
+        # Rimuove l'eventuale copia della stessa partita salvata nell'altro formato
+        previous = self.match_index.get_filename(fixture_id)
+        if previous and previous != filename:
+            previous_path = os.path.join(self.data_dir, previous)
+            if os.path.exists(previous_path):
+                os.remove(previous_path)
+        self.match_index.add(match_data, date, filename)
 
-        # Controlla dati esistenti
-        existing_matches = []
-        for filename in os.listdir(self.data_dir):
-            if filename.startswith(f"match_{date}_"):
-                filepath = os.path.join(self.data_dir, filename)
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        match_data = json.load(f)
-                        existing_matches.append(match_data)
-                except json.JSONDecodeError:
-                    print(f"File corrotto: {filename}, verrà ricreato")
-                    os.remove(filepath)
-
-        if existing_matches:
-            print(f"Trovati {len(existing_matches)} match già salvati per {date}")
-            return existing_matches
-
-        # Recupero nuovi dati
-        try:
-            matches = self.api_client.get_matches(date)
-            collected_data = []
+    def _fixture_resources(self, match: Dict, priority: Optional[int] = None) -> Dict[str, Callable[[], object]]:
+        """Sotto-risorse da recuperare per una partita, nell'ordine di raccolta"""
+        match_id = match['fixture']['id']
+        league_id = match['league']['id']
+        home_id = match['teams']['home']['id']
+        away_id = match['teams']['away']['id']
+        return {
+            'home_stats': lambda: self.api_client.get_team_stats(home_id, league_id, priority=priority)['response'],
+            'away_stats': lambda: self.api_client.get_team_stats(away_id, league_id, priority=priority)['response'],
+            'match_statistics': lambda: self.api_client.get_match_statistics(match_id, priority=priority),
+            'match_events': lambda: self.api_client.get_match_events(match_id, priority=priority),
+            'lineups': lambda: self.api_client.get_match_lineups(match_id, priority=priority),
+            # Dati meteo con città e timestamp
+            'weather': lambda: self.api_client.get_match_weather(
+                match_id, match['fixture']['venue']['city'], match['fixture']['timestamp'],
+                match['fixture']['venue'].get('id')
+            ),
+        }
 
-            total_matches = len(matches['response'])
-            print(f"Trovate {total_matches} partite da elaborare")
+    def _stored_is_final(self, filename: str) -> bool:
+        """True se la partita salvata nel file era già conclusa (file mancante = da raccogliere)"""
+        filepath = os.path.join(self.data_dir, filename)
+        return os.path.exists(filepath) and fixture_is_final(read_match_file(filepath, ['fixture']))
 
-            for i, match in enumerate(matches['response'], 1):
-                match_id = match['fixture']['id']
-                try:
-                    print(
-                        f"Elaborazione partita {i}/{total_matches}: {match['teams']['home']['name']} vs {match['teams']['away']['name']}")
-
-                    # Recupero dati in sequenza
-                    home_stats = self.api_client.get_team_stats(
-                        match['teams']['home']['id'],
-                        match['league']['id']
-                    )
-                    away_stats = self.api_client.get_team_stats(
-                        match['teams']['away']['id'],
-                        match['league']['id']
-                    )
-                    match_statistics = self.api_client.get_match_statistics(match_id)
-                    match_events = self.api_client.get_match_events(match_id)
-                    match_lineups = self.api_client.get_match_lineups(match_id)
-
-                    # Nuova chiamata per i dati meteo con città e timestamp
-                    city = match['fixture']['venue']['city']
-                    timestamp = match['fixture']['timestamp']
-                    match_weather = self.api_client.get_match_weather(match_id, city, timestamp)
-
-                    # Componi il dizionario completo
-                    match_data = {
-                        'fixture': match['fixture'],
-                        'league': match['league'],
-                        'teams': match['teams'],
-                        'goals': match['goals'],
-                        'home_stats': home_stats['response'],
-                        'away_stats': away_stats['response'],
-                        'match_statistics': match_statistics,
-                        'match_events': match_events,
-                        'lineups': match_lineups,
-                        'weather': match_weather
-                    }
-
-                    # Verifica la completezza dei dati
-                    if all(v is not None for v in match_data.values()):
-                        self.save_match_data(match_data, date)
-                        collected_data.append(match_data)
-                        print(f"✓ Dati completi salvati per la partita {i}/{total_matches}")
-                    else:
-                        print(f"⚠ Dati incompleti per la partita {i}/{total_matches}")
-
-                except Exception as e:
-                    print(f"Errore nell'elaborazione della partita {match_id}: {str(e)}")
-                    continue
-
-            success_rate = (len(collected_data) / total_matches) * 100
-            print(f"Raccolti dati per {len(collected_data)}/{total_matches} partite ({success_rate:.1f}% completato)")
-            return collected_data
+    def _get_day_fixtures(self, date: str, checkpoint: CollectionCheckpoint, refresh: bool,
+                          priority: Optional[int] = None) -> List[Dict]:
+        """Lista delle partite del giorno: dal checkpoint se disponibile, altrimenti dall'API"""
+        fixtures = None if refresh else checkpoint.load_fixtures()
+        if fixtures is None:
+            fixtures = self.api_client.get_matches(date, priority=priority)['response']
+            checkpoint.save_fixtures(fixtures)
+        return fixtures
+
+    def _fetch_missing_resources(self, match: Dict, checkpoint: CollectionCheckpoint,
+                                 priority: Optional[int] = None) -> Dict:
+        """Recupera le sotto-risorse mancanti di una partita (eseguito nei thread di raccolta)"""
+        match_id = match['fixture']['id']
+        resources = checkpoint.load_resources(match_id)
+        if resources:
+            print(f"↻ Partita {match_id}: ripresa dal checkpoint ({', '.join(resources)} già recuperati)")
+
+        for name, fetch in self._fixture_resources(match, priority).items():
+            if resources.get(name) is not None:
+                continue
+            try:
+                value = fetch()
+            except QuotaDeferred as e:
+                # Resta nel checkpoint: verrà recuperata alla prossima raccolta
+                print(f"⏸ '{name}' rinviato per la partita {match_id}: {str(e)}")
+                continue
+            except QuotaExceeded as e:
+                print(f"Quota esaurita durante il recupero di '{name}' per la partita {match_id}: {str(e)}")
+                break
+            except Exception as e:
+                print(f"Errore nel recupero di '{name}' per la partita {match_id}: {str(e)}")
+                continue
+            if value is not None:
+                resources[name] = value
+                checkpoint.save_resources(match_id, resources)
+        return resources
+
+    def collect_match_data(self, date: str, refresh_fixtures: bool = False,
+                           workers: Optional[int] = None, priority: Optional[int] = None) -> List[Dict]:
+        """
+        Raccoglie e salva i dati completi delle partite per una data, in modo incrementale
+
+        Confronta la lista delle partite del giorno con quelle già salvate e, per le
+        mancanti o salvate quando non erano ancora concluse, recupera solo le
+        sotto-risorse non ancora presenti nel checkpoint.
+        Rilanciata dopo un errore di rete o di quota riprende da dove si era fermata.
+        Le partite vengono elaborate in parallelo; la frequenza delle chiamate resta
+        limitata dai token bucket del client API.
 
+        Args:
+            date: data delle partite (YYYY-MM-DD)
+            refresh_fixtures: riscarica la lista delle partite anche se già nel checkpoint
+            workers: partite elaborate in parallelo (default: self.collection_workers)
+            priority: priorità di quota delle richieste; default bassa per le date
+                passate (recupero dello storico), per endpoint per oggi e il futuro
+        """
+        print(f"\nRaccolta dati per {date}...")
+        checkpoint = CollectionCheckpoint(self.checkpoint_dir, date)
+        if priority is None and date < utc_day():
+            priority = PRIORITY_LOW
+
+        # Recupero lista partite
+        try:
+            fixtures = self._get_day_fixtures(date, checkpoint, refresh_fixtures, priority)
         except Exception as e:
             print(f"Errore nella raccolta dati: {str(e)}")
             return self.load_matches_for_date(date)
 
+        stored_files = self.match_index.fixture_files()
+        # Partite salvate prima del fischio finale (es. gol null): raccolte di nuovo e sostituite
+        unfinished = {
+            fixture_id for fixture_id in (match['fixture']['id'] for match in fixtures)
+            if fixture_id in stored_files and not self._stored_is_final(stored_files[fixture_id])
+        }
+        missing = [
+            match for match in fixtures
+            if match['fixture']['id'] not in stored_files or match['fixture']['id'] in unfinished
+        ]
+        total_matches = len(fixtures)
+        print(f"Trovate {total_matches} partite, {total_matches - len(missing)} già salvate, "
+              f"{len(missing)} da completare ({len(unfinished)} salvate prima della fine)")
+
+        collected_data = []
+        workers = workers or self.collection_workers
+
+        # Statistiche squadra uniche della giornata: ogni (squadra, lega) richiesta una sola volta
+        # prima dell'elaborazione parallela, poi servita dalla cache del client
+        needs_team_stats = [
+            match for match in missing
+            if not {'home_stats', 'away_stats'} <= set(checkpoint.load_resources(match['fixture']['id']))
+        ]
+        if needs_team_stats:
+            planner = RequestPlanner(self.api_client)
+            plan = planner.plan(needs_team_stats, fixture_resources=())
+            planner.execute(plan, workers=workers, priority=priority)
+            print(plan.summary())
+
+        # Statistiche, eventi e formazioni in blocco: una richiesta fixtures?ids= ogni 20 partite
+        detail_keys = {'match_statistics', 'match_events', 'lineups'}
+        needs_details = [
+            match['fixture']['id'] for match in missing
+            if not detail_keys <= set(checkpoint.load_resources(match['fixture']['id']))
+        ]
+        if needs_details and hasattr(self.api_client, 'get_fixture_details_batch'):
+            batch_kwargs = {} if priority is None else {'priority': priority}
+            details = self.api_client.get_fixture_details_batch(needs_details, **batch_kwargs)
+            for fixture_id, fixture_details in details.items():
+                resources = checkpoint.load_resources(fixture_id)
+                resources.update(fixture_details)
+                checkpoint.save_resources(fixture_id, resources)
+
+        # Meteo in blocco: una richiesta all'archivio per località e finestra di date
+        needs_weather = [
+            match for match in missing
+            if 'weather' not in checkpoint.load_resources(match['fixture']['id'])
+        ]
+        if needs_weather and hasattr(self.api_client, 'get_weather_batch'):
+            for fixture_id, weather in self.api_client.get_weather_batch(needs_weather).items():
+                resources = checkpoint.load_resources(fixture_id)
+                resources['weather'] = weather
+                checkpoint.save_resources(fixture_id, resources)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = {
+                executor.submit(self._fetch_missing_resources, match, checkpoint, priority): match
+                for match in missing
+            }
+            # Salvataggio e indice restano nel thread principale (connessione SQLite)
+            for i, future in enumerate(as_completed(futures), 1):
+                match = futures[future]
+                match_id = match['fixture']['id']
+                resources = future.result()
+
+                # Componi il dizionario completo
+                match_data = {
+                    'fixture': match['fixture'],
+                    'league': match['league'],
+                    'teams': match['teams'],
+                    'goals': match['goals'],
+                    'home_stats': resources.get('home_stats'),
+                    'away_stats': resources.get('away_stats'),
+                    'match_statistics': resources.get('match_statistics'),
+                    'match_events': resources.get('match_events'),
+                    'lineups': resources.get('lineups'),
+                    'weather': resources.get('weather')
+                }
+
+                teams = f"{match['teams']['home']['name']} vs {match['teams']['away']['name']}"
+                # Verifica la completezza dei dati
+                if all(v is not None for v in match_data.values()):
+                    self.save_match_data(match_data, date)
+                    checkpoint.complete_fixture(match_id)
+                    collected_data.append(match_data)
+                    print(f"✓ Dati completi salvati per {teams} ({i}/{len(missing)})")
+                else:
+                    pending = [name for name, value in match_data.items() if value is None]
+                    print(f"⚠ Dati incompleti per {teams} ({i}/{len(missing)}), mancano: {', '.join(pending)}")
+
+        # Aggiorna l'archivio colonnare con le nuove partite
+        if collected_data:
+            self.match_store.append(collected_data)
+
+        completed = total_matches - len(missing) + len(collected_data)
+        if completed == total_matches:
+            checkpoint.clear()
+        success_rate = (completed / total_matches) * 100 if total_matches else 100.0
+        print(f"Raccolti dati per {completed}/{total_matches} partite ({success_rate:.1f}% completato)")
+        if isinstance(self.api_client, FootballDataCollector):
+            print(f"Risposte servite dalla {self.api_client.response_cache.summary()}")
+            print(f"Consumo {self.api_client.quota.summary()}")
+            print(f"Latenze HTTP:\n{self.api_client.latency_summary()}")
+        return self.load_matches_for_date(date)
+
+    def _load_files(self, filenames: List[str]) -> List[Dict]:
+        """Carica i file partita indicati (nomi relativi a data_dir)"""
+        return [read_match_file(os.path.join(self.data_dir, filename)) for filename in filenames]
+
     def load_matches_for_date(self, date: str) -> List[Dict]:
         """Carica le partite salvate per una specifica data"""
-        matches = []
-        for filename in os.listdir(self.data_dir):
-            if filename.startswith(f"match_{date}_"):
-                filepath = os.path.join(self.data_dir, filename)
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    match_data = json.load(f)
-                    matches.append(match_data)
-        return matches
-
-    def load_all_matches(self) -> List[Dict]:
-        """Carica tutti i dati delle partite salvati"""
-        all_matches = []
-        for filename in os.listdir(self.data_dir):
-            if filename.endswith('.json'):
-                filepath = os.path.join(self.data_dir, filename)
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    match_data = json.load(f)
-                    all_matches.append(match_data)
-        print(f"Caricati dati per {len(all_matches)} partite")
-        return all_matches
\ No newline at end of file
+        return self._load_files(self.match_index.files_for_date(date))
+
+    def load_matches_for_league(self, league_id: int) -> List[Dict]:
+        """Carica le partite salvate di una lega"""
+        return self._load_files(self.match_index.files_for_league(league_id))
+
+    def load_matches_for_team(self, team_id: int) -> List[Dict]:
+        """Carica le partite salvate in cui gioca una squadra (in casa o in trasferta)"""
+        return self._load_files(self.match_index.files_for_team(team_id))
+
+    def sync_match_store(self, workers: Optional[int] = 1, use_processes: bool = True) -> int:
+        """
+        Aggiunge all'archivio colonnare i file JSON non ancora convertiti e
+        sostituisce le partite i cui file sono stati risalvati dopo l'ultimo aggiornamento
+
+        workers: decodifica parallela dei file da convertire, come in iter_all_matches
+        """
+        stored_ids = set(self.match_store.fixture_ids().tolist())
+        updated_ns = self.match_store.updated_ns()
+        missing = []
+        for fixture_id, filename in sorted(self.match_index.fixture_files().items()):
+            filepath = os.path.join(self.data_dir, filename)
+            if fixture_id not in stored_ids:
+                missing.append(filepath)
+            elif os.path.exists(filepath) and os.stat(filepath).st_mtime_ns > updated_ns:
+                missing.append(filepath)
+        if not missing:
+            return 0
+
+        added = self.match_store.append(self._read_files(missing, workers, use_processes))
+        print(f"🗄️ Archivio colonnare aggiornato con {added} partite")
+        return added
+
+    @staticmethod
+    def _read_files(filepaths: List[str], workers: Optional[int] = 1, use_processes: bool = True,
+                    chunksize: int = 16, fields: Optional[List[str]] = None) -> Iterator[Dict]:
+        """Decodifica i file partita nell'ordine dato, in parallelo se workers != 1"""
+        reader = partial(read_match_file, fields=fields)
+        workers = workers or os.cpu_count() or 1
+        if workers <= 1 or len(filepaths) <= chunksize:
+            for filepath in filepaths:
+                yield reader(filepath)
+            return
+
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        # Finestra limitata: i risultati non consumati non si accumulano tutti in memoria
+        window = workers * chunksize * 4
+        with executor_class(max_workers=workers) as executor:
+            for start in range(0, len(filepaths), window):
+                yield from executor.map(reader, filepaths[start:start + window], chunksize=chunksize)
+
+    def load_match_features(self) -> Dict[str, np.ndarray]:
+        """Carica la tabella colonnare delle feature (senza ricostruire i dizionari)"""
+        self.sync_match_store()
+        return self.match_store.load_features()
+
+    def load_feature_table(self, workers: Optional[int] = 1) -> MatchFeatures:
+        """
+        Tabella delle feature di tutte le partite (stesso ordine di iter_all_matches),
+        estratta una volta per contenuto dell'archivio colonnare e poi letta dalla cache
+        """
+        # La tabella viene costruita dall'archivio: la chiave ne descrive il contenuto, non i file JSON
+        self.sync_match_store(workers)
+        key = hashlib.sha1(f"{schema_hash()}:{self.match_store.content_hash()}".encode('utf-8')).hexdigest()
+        return self.feature_cache.load_or_build(
+            key, lambda: MatchFeatures.from_matches(self.iter_all_matches(workers=workers,
+                                                                           fields=FEATURE_SOURCE_FIELDS))
+        )
+
+    def incremental_evaluator(self) -> IncrementalEvaluator:
+        """Valutatore incrementale sull'archivio colonnare (stato in {data_dir}/incremental)"""
+        self.sync_match_store()
+        return IncrementalEvaluator(self.match_store, os.path.join(self.data_dir, "incremental"))
+
+    def iter_all_matches(self, workers: Optional[int] = 1, use_processes: bool = True,
+                         chunksize: int = 16, use_store: bool = True,
+                         fields: Optional[List[str]] = None, lazy: bool = False) -> Iterator[Dict]:
+        """
+        Restituisce le partite salvate una alla volta, man mano che vengono decodificate
+
+        Args:
+            workers: numero di worker per la decodifica JSON (1 = sequenziale, None = tutti i core)
+            use_processes: pool di processi (decodifica realmente parallela) o di thread
+            chunksize: file assegnati a ogni worker per volta nel pool di processi
+            use_store: legge dall'archivio colonnare se presente
+            fields: sezioni o percorsi puntati da caricare, es. ['goals', 'home_stats.goals'];
+                con l'archivio colonnare le altre sezioni non vengono neppure lette
+            lazy: restituisce partite che leggono ogni sezione solo al primo accesso
+
+        Con l'archivio colonnare (creato dalla prima raccolta o dal primo uso di fields/lazy)
+        le partite vengono lette dall'archivio in sequenza: workers e use_processes servono
+        solo a decodificare i file JSON non ancora convertiti.
+        """
+        if use_store and (fields or lazy) and not self.match_store.exists():
+            # La proiezione richiede il layout a sezioni separate: lo creiamo al primo uso
+            self.sync_match_store(workers, use_processes)
+
+        if use_store and self.match_store.exists():
+            # L'archivio colonnare è già più veloce della decodifica parallela dei JSON
+            self.sync_match_store(workers, use_processes)
+            yield from self.match_store.iter_matches(fields=fields, lazy=lazy)
+            return
+
+        filepaths = [os.path.join(self.data_dir, filename) for filename in self.match_index.all_files()]
+        yield from self._read_files(filepaths, workers, use_processes, chunksize, fields)
+
+    def load_all_matches(self, workers: Optional[int] = 1, use_processes: bool = True,
+                         use_store: bool = True, fields: Optional[List[str]] = None,
+                         lazy: bool = False) -> List[Dict]:
+        """Carica tutti i dati delle partite salvati (in parallelo se workers != 1, proiettati se fields)"""
+        all_matches = list(self.iter_all_matches(workers=workers, use_processes=use_processes,
+                                                 use_store=use_store, fields=fields, lazy=lazy))
+        source = " (archivio colonnare)" if use_store and self.match_store.exists() else ""
+        print(f"Caricati dati per {len(all_matches)} partite{source}")
+        return all_matches
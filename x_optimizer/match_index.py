@@ -0,0 +1,113 @@
+import sqlite3
+from typing import Dict, List, Optional
+
+from match_io import is_match_file, strip_match_suffix
+
+
+class MatchIndex:
+    """
+    Indice persistente (SQLite) dei file partita salvati in match_data/.
+
+    Chiavi: data di raccolta, fixture id, lega e squadre. Permette di trovare i file
+    per data, lega o squadra senza scansionare né aprire l'intera directory.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self._create_schema()
+
+    def _create_schema(self):
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS matches (
+                    fixture_id INTEGER PRIMARY KEY,
+                    date TEXT NOT NULL,
+                    league_id INTEGER,
+                    home_team_id INTEGER,
+                    away_team_id INTEGER,
+                    timestamp INTEGER,
+                    filename TEXT NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_date ON matches(date)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_league ON matches(league_id)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_home ON matches(home_team_id)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_away ON matches(away_team_id)")
+
+    @staticmethod
+    def _row_from_match(match_data: Dict, date: str, filename: str) -> tuple:
+        fixture = match_data.get('fixture', {})
+        teams = match_data.get('teams', {})
+        return (
+            fixture.get('id'),
+            date,
+            match_data.get('league', {}).get('id'),
+            teams.get('home', {}).get('id'),
+            teams.get('away', {}).get('id'),
+            fixture.get('timestamp'),
+            filename
+        )
+
+    def add(self, match_data: Dict, date: str, filename: str):
+        """Registra (o aggiorna) una partita nell'indice"""
+        self.add_many([(match_data, date, filename)])
+
+    def add_many(self, entries: List[tuple]):
+        """Registra più partite in un'unica transazione: [(match_data, date, filename), ...]"""
+        rows = [self._row_from_match(match_data, date, filename) for match_data, date, filename in entries]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO matches VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def remove(self, fixture_id: int):
+        with self.conn:
+            self.conn.execute("DELETE FROM matches WHERE fixture_id = ?", (fixture_id,))
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM matches")
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+
+    def _filenames(self, where: str = "", params: tuple = ()) -> List[str]:
+        query = f"SELECT filename FROM matches {where} ORDER BY fixture_id"
+        return [row[0] for row in self.conn.execute(query, params)]
+
+    def files_for_date(self, date: str) -> List[str]:
+        return self._filenames("WHERE date = ?", (date,))
+
+    def files_for_league(self, league_id: int) -> List[str]:
+        return self._filenames("WHERE league_id = ?", (league_id,))
+
+    def files_for_team(self, team_id: int) -> List[str]:
+        return self._filenames("WHERE home_team_id = ? OR away_team_id = ?", (team_id, team_id))
+
+    def all_files(self) -> List[str]:
+        return self._filenames()
+
+    def fixture_files(self) -> Dict[int, str]:
+        """Mappa fixture id -> nome file per tutte le partite indicizzate"""
+        return dict(self.conn.execute("SELECT fixture_id, filename FROM matches"))
+
+    def get_filename(self, fixture_id: int) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT filename FROM matches WHERE fixture_id = ?", (fixture_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def parse_filename(filename: str) -> Optional[tuple]:
+        """Estrae (data, fixture id) da un nome file 'match_{data}_{id}.json[.gz]'"""
+        if not is_match_file(filename):
+            return None
+        try:
+            date, fixture_id = strip_match_suffix(filename)[len('match_'):].rsplit('_', 1)
+            return date, int(fixture_id)
+        except ValueError:
+            return None
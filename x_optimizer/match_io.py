@@ -0,0 +1,80 @@
+import gzip
+import json
+import os
+import tempfile
+from typing import Dict, List, Optional
+
+from match_store import project_match
+
+
+# Formati di salvataggio dei file partita: estensione e opzioni di serializzazione
+STORAGE_FORMATS = {
+    'json': '.json',        # formato storico: JSON indentato, non compresso
+    'json.gz': '.json.gz',  # JSON compatto compresso con gzip
+}
+MATCH_FILE_SUFFIXES = tuple(STORAGE_FORMATS.values())
+
+
+def match_filename(date: str, fixture_id: int, storage_format: str = 'json') -> str:
+    return f"match_{date}_{fixture_id}{STORAGE_FORMATS[storage_format]}"
+
+
+def is_match_file(filename: str) -> bool:
+    return filename.startswith('match_') and filename.endswith(MATCH_FILE_SUFFIXES)
+
+
+def strip_match_suffix(filename: str) -> str:
+    """Nome file senza estensione ('match_{data}_{id}')"""
+    for suffix in sorted(MATCH_FILE_SUFFIXES, key=len, reverse=True):
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
+
+def read_match_file(filepath: str, fields: Optional[List[str]] = None) -> Dict:
+    """
+    Legge un file partita in uno qualsiasi dei formati supportati.
+
+    Funzione di modulo, utilizzabile dai worker dei pool di processi.
+    """
+    if filepath.endswith('.gz'):
+        with gzip.open(filepath, 'rt', encoding='utf-8') as f:
+            return project_match(json.load(f), fields)
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return project_match(json.load(f), fields)
+
+
+def atomic_write(filepath: str, payload: bytes):
+    """
+    Scrive un file in modo atomico: file temporaneo nella stessa directory,
+    fsync e rename. Un crash a metà scrittura non lascia mai un file troncato.
+    """
+    directory = os.path.dirname(filepath) or '.'
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.part', dir=directory)
+    try:
+        os.chmod(tmp_path, 0o644)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_json_file(filepath: str, data) -> None:
+    """Scrive un JSON compatto in modo atomico"""
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    atomic_write(filepath, payload.encode('utf-8'))
+
+
+def write_match_file(filepath: str, match_data: Dict, storage_format: str = 'json'):
+    """Scrive un file partita in modo atomico nel formato indicato"""
+    if storage_format == 'json.gz':
+        payload = json.dumps(match_data, ensure_ascii=False, separators=(',', ':'))
+        atomic_write(filepath, gzip.compress(payload.encode('utf-8'), mtime=0))
+    else:
+        payload = json.dumps(match_data, ensure_ascii=False, indent=4)
+        atomic_write(filepath, payload.encode('utf-8'))
@@ -0,0 +1,373 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import zlib
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+
+# Sezioni di ogni partita, salvate come blob JSON compressi separati
+SECTIONS = [
+    'fixture', 'league', 'teams', 'goals', 'home_stats', 'away_stats',
+    'match_statistics', 'match_events', 'lineups', 'weather'
+]
+
+# Colonne intere della tabella delle feature: nome -> percorso nel dizionario della partita
+ID_COLUMNS = {
+    'fixture_id': ('fixture', 'id'),
+    'timestamp': ('fixture', 'timestamp'),
+    'league_id': ('league', 'id'),
+    'home_team_id': ('teams', 'home', 'id'),
+    'away_team_id': ('teams', 'away', 'id'),
+}
+
+# Colonne numeriche (NaN se il valore manca o non è convertibile)
+FLOAT_COLUMNS = {
+    'goals_home': ('goals', 'home'),
+    'goals_away': ('goals', 'away'),
+    'home_for_avg_home': ('home_stats', 'goals', 'for', 'average', 'home'),
+    'home_for_avg_away': ('home_stats', 'goals', 'for', 'average', 'away'),
+    'home_for_avg_total': ('home_stats', 'goals', 'for', 'average', 'total'),
+    'home_against_avg_home': ('home_stats', 'goals', 'against', 'average', 'home'),
+    'home_against_avg_away': ('home_stats', 'goals', 'against', 'average', 'away'),
+    'home_against_avg_total': ('home_stats', 'goals', 'against', 'average', 'total'),
+    'away_for_avg_home': ('away_stats', 'goals', 'for', 'average', 'home'),
+    'away_for_avg_away': ('away_stats', 'goals', 'for', 'average', 'away'),
+    'away_for_avg_total': ('away_stats', 'goals', 'for', 'average', 'total'),
+    'away_against_avg_home': ('away_stats', 'goals', 'against', 'average', 'home'),
+    'away_against_avg_away': ('away_stats', 'goals', 'against', 'average', 'away'),
+    'away_against_avg_total': ('away_stats', 'goals', 'against', 'average', 'total'),
+}
+
+
+def _get_path(match: Dict, path: tuple):
+    """Segue un percorso di chiavi nel dizionario, restituisce None se manca"""
+    value = match
+    for key in path:
+        if not isinstance(value, Mapping) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def _to_float(value) -> float:
+    """Converte una statistica (anche stringa con virgola) in float, NaN se non valida"""
+    if value is None or isinstance(value, bool):
+        return np.nan
+    try:
+        return float(str(value).replace(',', '.'))
+    except ValueError:
+        return np.nan
+
+
+def field_sections(fields: Iterable[str]) -> List[str]:
+    """Sezioni di primo livello necessarie per i campi richiesti"""
+    sections = []
+    for field in fields:
+        section = field.split('.', 1)[0]
+        if section not in sections:
+            sections.append(section)
+    return sections
+
+
+def project_match(match: Dict, fields: Optional[List[str]]) -> Dict:
+    """
+    Riduce una partita ai soli campi richiesti.
+
+    I campi sono sezioni ('goals') o percorsi puntati ('home_stats.goals'):
+    di una sezione indicata con un percorso viene mantenuto solo quel sotto-albero.
+    """
+    if not fields:
+        return match
+
+    projected = {}
+    for field in fields:
+        path = field.split('.')
+        parent = _get_path(match, tuple(path[:-1]))
+        if not isinstance(parent, Mapping) or path[-1] not in parent:
+            continue
+        target = projected
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        target[path[-1]] = parent[path[-1]]
+    return projected
+
+
+class LazyMatch(Mapping):
+    """
+    Partita in sola lettura le cui sezioni vengono lette dal blob solo al primo accesso.
+
+    Si usa come un dizionario (match['goals'], match.get('lineups')); dict(match)
+    materializza tutte le sezioni, ad esempio prima di serializzarla in JSON.
+    Con campi puntati ('home_stats.goals') di una sezione resta solo quel sotto-albero,
+    come in project_match (None se il percorso manca).
+    """
+
+    def __init__(self, store: 'MatchStore', offsets: np.ndarray, sections: List[str],
+                 fields: Optional[List[str]] = None):
+        self._store = store
+        self._offsets = offsets
+        self._sections = sections
+        self._fields = fields
+        self._loaded = {}
+
+    def __getitem__(self, key):
+        if key not in self._loaded:
+            if key not in self._sections:
+                raise KeyError(key)
+            value = self._store.read_section(self._offsets, key)
+            section_fields = [field for field in self._fields or [] if field.split('.', 1)[0] == key]
+            if key not in section_fields and section_fields:
+                value = project_match({key: value}, section_fields).get(key)
+            self._loaded[key] = value
+        return self._loaded[key]
+
+    def __iter__(self):
+        return iter(self._sections)
+
+    def __len__(self):
+        return len(self._sections)
+
+    def loaded_sections(self) -> List[str]:
+        return list(self._loaded)
+
+
+class MatchStore:
+    """
+    Archivio colonnare delle partite.
+
+    - features.npz: tabella di colonne NumPy (id, timestamp, gol, medie gol delle squadre)
+      più la matrice degli offset delle sezioni nel blob
+    - payloads.bin: sezioni JSON compatte compresse con zlib, una per (partita, sezione)
+    """
+    FEATURES_FILE = "features.npz"
+    BLOB_FILE = "payloads.bin"
+
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        self.features_path = os.path.join(store_dir, self.FEATURES_FILE)
+        self.blob_path = os.path.join(store_dir, self.BLOB_FILE)
+        self._features = None
+        self._reader = None
+        # Un solo handle del blob per tutte le LazyMatch: seek e read non devono intrecciarsi tra thread
+        self._reader_lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.features_path) and os.path.exists(self.blob_path)
+
+    @staticmethod
+    def extract_row(match: Dict) -> Dict:
+        """Estrae la riga della tabella delle feature da una partita"""
+        row = {}
+        for name, path in ID_COLUMNS.items():
+            value = _get_path(match, path)
+            row[name] = int(value) if value is not None else -1
+        for name, path in FLOAT_COLUMNS.items():
+            row[name] = _to_float(_get_path(match, path))
+        return row
+
+    def load_features(self) -> Dict[str, np.ndarray]:
+        """Carica la tabella delle feature (colonna -> array)"""
+        if self._features is None:
+            if not self.exists():
+                return {}
+            with np.load(self.features_path, allow_pickle=False) as data:
+                self._features = {name: data[name] for name in data.files}
+        return self._features
+
+    def fixture_ids(self) -> np.ndarray:
+        features = self.load_features()
+        return features.get('fixture_id', np.empty(0, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self.fixture_ids())
+
+    def write(self, matches: Iterable[Dict]) -> int:
+        """Riscrive l'archivio da zero con le partite fornite"""
+        self.close()
+        os.makedirs(self.store_dir, exist_ok=True)
+        if os.path.exists(self.blob_path):
+            os.remove(self.blob_path)
+        if os.path.exists(self.features_path):
+            os.remove(self.features_path)
+        self._features = None
+        return self.append(matches)
+
+    def append(self, matches: Iterable[Dict]) -> int:
+        """
+        Aggiunge partite all'archivio; una partita già presente viene sostituita
+
+        La riga precedente esce dalla tabella (i suoi byte restano nel blob fino
+        alla prossima write()), così una partita risalvata, ad es. raccolta di
+        nuovo a fine gara, viene letta nella versione aggiornata.
+        """
+        os.makedirs(self.store_dir, exist_ok=True)
+        existing = self.load_features()
+
+        rows = {}
+        offsets = {}
+        blob_size = os.path.getsize(self.blob_path) if os.path.exists(self.blob_path) else 0
+        with open(self.blob_path, 'ab') as blob:
+            for match in matches:
+                row = self.extract_row(match)
+                match_offsets = [blob_size]
+                for section in SECTIONS:
+                    payload = json.dumps(match.get(section), ensure_ascii=False, separators=(',', ':'))
+                    chunk = zlib.compress(payload.encode('utf-8'))
+                    blob.write(chunk)
+                    blob_size += len(chunk)
+                    match_offsets.append(blob_size)
+                # Più versioni della stessa partita nello stesso blocco: vale l'ultima
+                rows.pop(row['fixture_id'], None)
+                offsets.pop(row['fixture_id'], None)
+                rows[row['fixture_id']] = row
+                offsets[row['fixture_id']] = match_offsets
+
+        if not rows:
+            return 0
+
+        replaced = np.isin(existing.get('fixture_id', np.empty(0, dtype=np.int64)), list(rows))
+        kept = {name: values[~replaced] for name, values in existing.items() if name != 'sections'}
+        rows = list(rows.values())
+        columns = {}
+        for name in ID_COLUMNS:
+            new_values = np.array([row[name] for row in rows], dtype=np.int64)
+            columns[name] = self._concat(kept.get(name), new_values)
+        for name in FLOAT_COLUMNS:
+            new_values = np.array([row[name] for row in rows], dtype=np.float64)
+            columns[name] = self._concat(kept.get(name), new_values)
+        columns['offsets'] = self._concat(kept.get('offsets'), np.array(list(offsets.values()), dtype=np.int64))
+        columns['sections'] = np.array(SECTIONS)
+
+        # Scrittura su file temporaneo e rename, per non lasciare una tabella troncata
+        tmp_path = self.features_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **columns)
+        os.replace(tmp_path, self.features_path)
+        self._features = columns
+        return len(rows)
+
+    def updated_ns(self) -> int:
+        """Istante dell'ultima modifica della tabella (0 se l'archivio non esiste)"""
+        return os.stat(self.features_path).st_mtime_ns if self.exists() else 0
+
+    def content_hash(self) -> str:
+        """Impronta del contenuto: la tabella cambia a ogni aggiunta o sostituzione (offset inclusi)"""
+        digest = hashlib.sha1()
+        if self.exists():
+            with open(self.features_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _concat(old: Optional[np.ndarray], new: np.ndarray) -> np.ndarray:
+        if old is None or len(old) == 0:
+            return new
+        return np.concatenate([old, new])
+
+    def _read_section(self, blob, offsets: np.ndarray, section_idx: int):
+        start, end = int(offsets[section_idx]), int(offsets[section_idx + 1])
+        blob.seek(start)
+        return json.loads(zlib.decompress(blob.read(end - start)))
+
+    def read_section(self, offsets: np.ndarray, section: str):
+        """Legge una singola sezione di una partita (usata da LazyMatch)"""
+        section_idx = self.load_features()['sections'].tolist().index(section)
+        start, end = int(offsets[section_idx]), int(offsets[section_idx + 1])
+        with self._reader_lock:
+            if self._reader is None:
+                self._reader = open(self.blob_path, 'rb')
+            self._reader.seek(start)
+            chunk = self._reader.read(end - start)
+        # Decompressione fuori dal lock: i thread si serializzano solo sulla lettura
+        return json.loads(zlib.decompress(chunk))
+
+    def close(self):
+        with self._reader_lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+
+    def iter_matches(self, fixture_ids: Optional[Iterable[int]] = None,
+                     fields: Optional[List[str]] = None, lazy: bool = False) -> Iterator[Mapping]:
+        """
+        Ricostruisce le partite una alla volta (tutte o solo quelle richieste)
+
+        Args:
+            fixture_ids: partite da leggere (None = tutte)
+            fields: sezioni o percorsi puntati da leggere (None = tutto); le altre
+                sezioni non vengono né lette né decompresse
+            lazy: restituisce LazyMatch che leggono ogni sezione al primo accesso
+        """
+        features = self.load_features()
+        if not features:
+            return
+
+        all_ids = features['fixture_id']
+        if fixture_ids is None:
+            positions = range(len(all_ids))
+        else:
+            wanted = set(int(fid) for fid in fixture_ids)
+            positions = [i for i, fid in enumerate(all_ids.tolist()) if fid in wanted]
+
+        stored_sections = features['sections'].tolist()
+        requested = field_sections(fields) if fields else stored_sections
+        section_indices = [
+            (name, stored_sections.index(name))
+            for name in requested
+            if name in stored_sections
+        ]
+
+        if lazy:
+            available = [name for name, _ in section_indices]
+            for pos in positions:
+                yield LazyMatch(self, features['offsets'][pos], available, fields)
+            return
+
+        with open(self.blob_path, 'rb') as blob:
+            for pos in positions:
+                offsets = features['offsets'][pos]
+                match = {
+                    name: self._read_section(blob, offsets, idx)
+                    for name, idx in section_indices
+                }
+                yield project_match(match, fields)
+
+    def load_matches(self, fixture_ids: Optional[Iterable[int]] = None,
+                     fields: Optional[List[str]] = None, lazy: bool = False) -> List[Mapping]:
+        """Ricostruisce le partite (tutte o solo quelle richieste)"""
+        return list(self.iter_matches(fixture_ids, fields, lazy))
+
+
+def convert_directory(data_dir: str, store_dir: Optional[str] = None) -> MatchStore:
+    """Converte la directory match_data/ (file JSON per partita) nell'archivio colonnare"""
+    # Import locale: match_io dipende da questo modulo
+    from match_io import is_match_file, read_match_file
+
+    store_dir = store_dir or os.path.join(data_dir, "store")
+    store = MatchStore(store_dir)
+
+    def iter_json_matches():
+        for filename in sorted(os.listdir(data_dir)):
+            if not is_match_file(filename):
+                continue
+            try:
+                yield read_match_file(os.path.join(data_dir, filename))
+            except (json.JSONDecodeError, EOFError, OSError):
+                print(f"File corrotto ignorato: {filename}")
+
+    written = store.write(iter_json_matches())
+    print(f"Archivio colonnare creato in '{store_dir}' con {written} partite")
+    return store
+
+
+if __name__ == "__main__":
+    # Uso: python match_store.py [data_dir] [store_dir]
+    source_dir = sys.argv[1] if len(sys.argv) > 1 else "../match_data"
+    target_dir = sys.argv[2] if len(sys.argv) > 2 else None
+    convert_directory(source_dir, target_dir)
@@ -0,0 +1,260 @@
+"""
+Ricerca dei parametri delle formule (FormulaParameters) su tutta la griglia dei campi.
+
+Strategie di campionamento: griglia, casuale e ipercubo latino; i candidati
+vengono valutati a blocchi in un pool di processi dal motore vettoriale
+(formula_engine.FormulaEngine) e ordinati in una classifica per errore medio.
+Con successive_halving i candidati sono prima valutati su un sottoinsieme
+delle partite e solo i migliori passano ai sottoinsiemi più grandi.
+
+Uso:
+    python parameter_search.py --strategy lhs --samples 2000 --formula formula2 --halving
+"""
+import argparse
+import itertools
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from formula_engine import VECTORISED_FORMULAS, FormulaEngine
+from formula_evaluator import FormulaParameters
+from match_data_manager import MatchDataManager
+from shared_utils.match_features import MatchFeatures
+
+# Intervalli di ricerca di ogni parametro (estremi inclusi)
+PARAMETER_BOUNDS = {
+    'home_weight': (0.3, 0.8),
+    'away_weight': (0.2, 0.7),
+    'off_weight': (0.3, 0.8),
+    'def_weight': (0.2, 0.7),
+    'league_factor': (0.5, 1.5),
+}
+
+SEARCH_STRATEGIES = ('grid', 'random', 'lhs')
+
+
+def grid_candidates(points_per_axis: int = 5,
+                    bounds: Optional[Dict[str, Tuple[float, float]]] = None) -> List[Dict[str, float]]:
+    """Griglia regolare: points_per_axis valori equispaziati per parametro (prodotto cartesiano)"""
+    bounds = bounds or PARAMETER_BOUNDS
+    axes = [np.linspace(low, high, points_per_axis).tolist() for low, high in bounds.values()]
+    return [dict(zip(bounds, values)) for values in itertools.product(*axes)]
+
+
+def random_candidates(samples: int, seed: int = 0,
+                      bounds: Optional[Dict[str, Tuple[float, float]]] = None) -> List[Dict[str, float]]:
+    """Campionamento uniforme indipendente per parametro"""
+    bounds = bounds or PARAMETER_BOUNDS
+    rng = np.random.default_rng(seed)
+    unit = rng.random((samples, len(bounds)))
+    return _scale(unit, bounds)
+
+
+def latin_hypercube_candidates(samples: int, seed: int = 0,
+                               bounds: Optional[Dict[str, Tuple[float, float]]] = None) -> List[Dict[str, float]]:
+    """Ipercubo latino: ogni parametro ha esattamente un campione per ognuno dei samples strati"""
+    bounds = bounds or PARAMETER_BOUNDS
+    rng = np.random.default_rng(seed)
+    unit = np.empty((samples, len(bounds)))
+    for column in range(len(bounds)):
+        strata = (np.arange(samples) + rng.random(samples)) / samples
+        unit[:, column] = rng.permutation(strata)
+    return _scale(unit, bounds)
+
+
+def _scale(unit: np.ndarray, bounds: Dict[str, Tuple[float, float]]) -> List[Dict[str, float]]:
+    low = np.array([b[0] for b in bounds.values()])
+    high = np.array([b[1] for b in bounds.values()])
+    values = low + unit * (high - low)
+    return [dict(zip(bounds, row)) for row in values.tolist()]
+
+
+def sample_candidates(strategy: str, samples: int = 1000, seed: int = 0,
+                      bounds: Optional[Dict[str, Tuple[float, float]]] = None) -> List[Dict[str, float]]:
+    """
+    Candidati secondo la strategia indicata; per 'grid' i punti per asse sono
+    scelti in modo che la griglia non superi samples candidati
+    """
+    if strategy == 'grid':
+        axes = len(bounds or PARAMETER_BOUNDS)
+        points = max(2, int(math.floor(samples ** (1 / axes) + 1e-9)))
+        return grid_candidates(points, bounds)
+    if strategy == 'random':
+        return random_candidates(samples, seed, bounds)
+    if strategy == 'lhs':
+        return latin_hypercube_candidates(samples, seed, bounds)
+    raise ValueError(f"Strategia non supportata: {strategy} (valide: {', '.join(SEARCH_STRATEGIES)})")
+
+
+# Stato dei processi del pool: tabella delle feature e motori per dimensione del sottoinsieme
+_worker_state = {}
+
+
+def _init_worker(features: MatchFeatures, formula_name: str, seed: int):
+    _worker_state.clear()
+    _worker_state.update({'features': features, 'formula_name': formula_name, 'seed': seed, 'engines': {}})
+
+
+def _subset_positions(size: int, total: int, seed: int) -> np.ndarray:
+    """Prime size partite di una permutazione fissa (uguale in tutti i processi), in ordine originale"""
+    if size >= total:
+        return np.arange(total)
+    return np.sort(np.random.default_rng(seed).permutation(total)[:size])
+
+
+def _worker_engine(size: int) -> FormulaEngine:
+    engines = _worker_state['engines']
+    if size not in engines:
+        features = _worker_state['features']
+        positions = _subset_positions(size, len(features), _worker_state['seed'])
+        engines[size] = FormulaEngine(features if len(positions) == len(features) else features.subset(positions))
+    return engines[size]
+
+
+def _evaluate_batch(candidates: List[Dict[str, float]], size: int) -> List[Dict]:
+    engine = _worker_engine(size)
+    formula_name = _worker_state['formula_name']
+    # Tutto il blocco in un passaggio: matrice candidati x partite
+    result = engine.score_batch([(formula_name, FormulaParameters.from_dict(candidate)) for candidate in candidates])
+    return [
+        {
+            'params': candidate,
+            'avg_error': float(result['avg_error'][index]),
+            'accuracy': float(result['accuracy'][index]),
+            'valid_matches': int(result['valid_matches'][index]),
+        }
+        for index, candidate in enumerate(candidates)
+    ]
+
+
+def _ranking_key(entry: Dict):
+    error = entry['avg_error']
+    # NaN in fondo alla classifica, a parità di errore vince l'accuratezza più alta
+    return (math.isnan(error), error, -entry['accuracy'])
+
+
+class ParameterSearch:
+    """
+    Valutazione parallela di molti FormulaParameters su una tabella di feature.
+
+    La tabella viene inviata una volta a ogni processo del pool; i candidati
+    viaggiano a blocchi di batch_size e ogni processo tiene i propri motori
+    vettoriali, così il costo per candidato è solo la valutazione NumPy.
+    """
+
+    def __init__(self, features: MatchFeatures, formula_name: str = 'formula2',
+                 workers: Optional[int] = None, batch_size: int = 64, seed: int = 0):
+        if formula_name not in VECTORISED_FORMULAS:
+            raise ValueError(f"Formula non supportata: {formula_name}")
+        self.features = features
+        self.formula_name = formula_name
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.seed = seed
+        self.evaluations = 0
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 1:
+            return None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(self.features, self.formula_name, self.seed))
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def evaluate(self, candidates: List[Dict[str, float]], size: Optional[int] = None) -> List[Dict]:
+        """
+        Valuta i candidati su size partite (tutte se None) e restituisce la classifica:
+        [{'params', 'avg_error', 'accuracy', 'valid_matches', 'matches'}] per errore medio crescente
+        """
+        size = min(size or len(self.features), len(self.features))
+        batches = [candidates[start:start + self.batch_size] for start in range(0, len(candidates), self.batch_size)]
+        executor = self._executor()
+        if executor is None:
+            _init_worker(self.features, self.formula_name, self.seed)
+            results = [entry for batch in batches for entry in _evaluate_batch(batch, size)]
+        else:
+            results = [entry for batch_results in executor.map(_evaluate_batch, batches, [size] * len(batches))
+                       for entry in batch_results]
+        for entry in results:
+            entry['matches'] = size
+        self.evaluations += len(results)
+        return sorted(results, key=_ranking_key)
+
+    def successive_halving(self, candidates: List[Dict[str, float]], eta: int = 3,
+                           min_matches: int = 200) -> List[Dict]:
+        """
+        Successive halving: a ogni turno i candidati rimasti sono valutati su un
+        sottoinsieme eta volte più grande e ne resta 1/eta; l'ultimo turno usa tutte
+        le partite. Restituisce la classifica dell'ultimo turno.
+        """
+        total = len(self.features)
+        rounds = max(0, int(math.log(max(len(candidates), 1), eta)))
+        size = max(min_matches, total // eta ** rounds)
+        survivors = candidates
+        while True:
+            size = min(size, total)
+            leaderboard = self.evaluate(survivors, size)
+            print(f"🔎 Halving: {len(survivors)} candidati su {size} partite, "
+                  f"miglior errore {leaderboard[0]['avg_error']:.4f}")
+            if size >= total or len(leaderboard) <= 1:
+                if size < total:
+                    leaderboard = self.evaluate([leaderboard[0]['params']])
+                return leaderboard
+            survivors = [entry['params'] for entry in leaderboard[:max(1, math.ceil(len(leaderboard) / eta))]]
+            size *= eta
+
+    def search(self, strategy: str = 'lhs', samples: int = 1000, halving: bool = False,
+               eta: int = 3, top: Optional[int] = None) -> List[Dict]:
+        """Campiona i candidati con la strategia indicata e restituisce la classifica (prime top voci)"""
+        candidates = sample_candidates(strategy, samples, self.seed)
+        leaderboard = self.successive_halving(candidates, eta) if halving else self.evaluate(candidates)
+        return leaderboard[:top] if top else leaderboard
+
+
+def print_leaderboard(leaderboard: List[Dict], top: int = 10):
+    print(f"\n{'#':>3} {'errore':>8} {'accur.':>7} {'partite':>8}  parametri")
+    for rank, entry in enumerate(leaderboard[:top], start=1):
+        params = ", ".join(f"{name}={value:.3f}" for name, value in entry['params'].items())
+        print(f"{rank:>3} {entry['avg_error']:8.4f} {entry['accuracy']:6.2f}% {entry['valid_matches']:>8}  {params}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="../match_data")
+    parser.add_argument("--formula", default="formula2", choices=list(VECTORISED_FORMULAS))
+    parser.add_argument("--strategy", default="lhs", choices=SEARCH_STRATEGIES)
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--halving", action="store_true", help="successive halving sui sottoinsiemi di partite")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    features = MatchDataManager(None, data_dir=args.data_dir).load_feature_table()
+    start = time.perf_counter()
+    with ParameterSearch(features, args.formula, workers=args.workers, seed=args.seed) as search:
+        leaderboard = search.search(args.strategy, args.samples, halving=args.halving)
+        elapsed = time.perf_counter() - start
+        print(f"\n{search.evaluations} valutazioni di {args.formula} in {elapsed:.2f} s "
+              f"({search.evaluations / elapsed * 60:.0f} al minuto)")
+    print_leaderboard(leaderboard, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Stima diretta dei pesi delle formule (FormulaParameters) con i minimi quadrati.
+
+Fissati gli altri parametri, ogni formula è lineare in un blocco di pesi:
+- formula2: home_weight, away_weight
+- formula3: home_weight, away_weight (league_factor resta fisso: moltiplica entrambi)
+- formula1: home_weight/away_weight oppure off_weight/def_weight (è bilineare:
+  si alternano i due blocchi finché l'errore non migliora più)
+
+Le colonne della matrice di regressione si ottengono dalle formule vettoriali
+stesse, ponendo a 1 un peso del blocco e a 0 gli altri. Per l'errore quadratico
+si risolvono le equazioni normali, per l'errore assoluto i minimi quadrati pesati iterati
+(IRLS); i vincoli di intervallo sono risolti enumerando i vincoli attivi.
+"""
+import itertools
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from formula_engine import VECTORISED_FORMULAS, FormulaEngine, MatchArrays
+from formula_evaluator import FormulaParameters
+
+# Blocchi di pesi in cui ogni formula è lineare (gli altri parametri restano fissi)
+LINEAR_BLOCKS = {
+    'formula1': [('home_weight', 'away_weight'), ('off_weight', 'def_weight')],
+    'formula2': [('home_weight', 'away_weight')],
+    'formula3': [('home_weight', 'away_weight')],
+}
+
+FIT_LOSSES = ('mse', 'mae')
+
+
+def _solve_weighted(X: np.ndarray, y: np.ndarray, sample_weights: Optional[np.ndarray],
+                    bounds: Optional[List[Tuple[float, float]]]) -> np.ndarray:
+    """
+    Minimi quadrati (pesati) con vincoli di intervallo opzionali.
+
+    Si lavora sulle equazioni normali (matrice k x k, k = pesi del blocco): con i
+    vincoli si prova ogni combinazione di variabili libere / fissate a un estremo
+    (3^k) e si tiene la soluzione ammissibile con l'errore più basso, che per un
+    problema quadratico convesso è l'ottimo esatto.
+    """
+    weighted = X if sample_weights is None else X * sample_weights[:, None]
+    gram = weighted.T @ X
+    moment = weighted.T @ y
+    if bounds is None:
+        return np.linalg.lstsq(gram, moment, rcond=None)[0]
+
+    best, best_cost = None, float('inf')
+    low = np.array([b[0] for b in bounds])
+    high = np.array([b[1] for b in bounds])
+    for active in itertools.product((None, 0, 1), repeat=len(bounds)):
+        coef = np.array([np.nan if side is None else bounds[j][side] for j, side in enumerate(active)])
+        free = np.isnan(coef)
+        if free.any():
+            rhs = moment[free] - gram[np.ix_(free, ~free)] @ coef[~free]
+            coef[free] = np.linalg.lstsq(gram[np.ix_(free, free)], rhs, rcond=None)[0]
+            if np.any(coef[free] < low[free] - 1e-12) or np.any(coef[free] > high[free] + 1e-12):
+                continue
+        # Errore quadratico pesato a meno della costante y'Wy
+        cost = float(coef @ gram @ coef - 2 * coef @ moment)
+        if cost < best_cost:
+            best, best_cost = coef, cost
+    return best
+
+
+class WeightFitter:
+    """
+    Stima dei pesi di una formula sulla tabella delle feature.
+
+    Ogni stima usa solo operazioni vettoriali su matrici n x 2 e sistemi 2 x 2:
+    decine di millisecondi anche su 100k partite, contro migliaia di valutazioni di una ricerca.
+    """
+
+    def __init__(self, matches, formula_name: str = 'formula2'):
+        if formula_name not in LINEAR_BLOCKS:
+            raise ValueError(f"Formula non supportata: {formula_name}")
+        self.engine = FormulaEngine(matches)
+        self.formula_name = formula_name
+
+    def _design(self, params: FormulaParameters, block: Tuple[str, ...]):
+        """Matrice di regressione del blocco (una colonna per peso), gol reali e maschera di validità"""
+        arrays: MatchArrays = self.engine.arrays
+        _, valid = self.engine.predict(self.formula_name, params)
+        columns = []
+        for name in block:
+            unit = params.to_dict()
+            unit.update({other: 0.0 for other in block})
+            unit[name] = 1.0
+            with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+                columns.append(VECTORISED_FORMULAS[self.formula_name](arrays.values, FormulaParameters.from_dict(unit)))
+        X = np.column_stack(columns)
+        # Partite con previsione non finita (es. divisione per zero) escluse dalla stima
+        valid = valid & np.all(np.isfinite(X), axis=1)
+        return X[valid], arrays.actual[valid]
+
+    def _fit_block(self, params: FormulaParameters, block: Tuple[str, ...], loss: str,
+                   bounds: Optional[Dict[str, Tuple[float, float]]], iterations: int, tolerance: float):
+        X, y = self._design(params, block)
+        if len(y) == 0:
+            return params
+        block_bounds = [bounds[name] for name in block] if bounds else None
+        coef = _solve_weighted(X, y, None, block_bounds)
+        if loss == 'mae':
+            # IRLS: pesi 1/|residuo| (limitati) trasformano i minimi quadrati in errore assoluto
+            for _ in range(iterations):
+                residuals = np.abs(X @ coef - y)
+                updated = _solve_weighted(X, y, 1.0 / np.maximum(residuals, 1e-6), block_bounds)
+                converged = np.max(np.abs(updated - coef)) < tolerance
+                coef = updated
+                if converged:
+                    break
+        fitted = params.to_dict()
+        fitted.update(dict(zip(block, coef.tolist())))
+        return FormulaParameters.from_dict(fitted)
+
+    def _loss(self, params: FormulaParameters, loss: str) -> float:
+        predicted, valid = self.engine.predict(self.formula_name, params)
+        residuals = predicted[valid] - self.engine.arrays.actual[valid]
+        if len(residuals) == 0:
+            return float('inf')
+        return float(np.mean(residuals ** 2) if loss == 'mse' else np.mean(np.abs(residuals)))
+
+    def fit(self, params: Optional[FormulaParameters] = None, loss: str = 'mae',
+            bounds: Optional[Dict[str, Tuple[float, float]]] = None, iterations: int = 50,
+            rounds: int = 20, tolerance: float = 1e-6) -> Dict:
+        """
+        Stima i pesi partendo da params (predefiniti se None).
+
+        Args:
+            loss: 'mse' (minimi quadrati) o 'mae' (IRLS)
+            bounds: intervalli ammessi per peso, es. parameter_search.PARAMETER_BOUNDS
+            iterations: iterazioni IRLS per blocco
+            rounds: alternanze massime tra i blocchi (formula1)
+
+        Returns:
+            {'params', 'loss', 'avg_error', 'accuracy', 'rounds'}: avg_error e accuracy
+            sono quelli di FormulaEngine.evaluate, confrontabili con test_formula
+        """
+        if loss not in FIT_LOSSES:
+            raise ValueError(f"Funzione di perdita non supportata: {loss} (valide: {', '.join(FIT_LOSSES)})")
+        params = FormulaParameters.from_dict((params or FormulaParameters()).to_dict())
+        if bounds:
+            # Punto di partenza ammissibile: i pesi fuori intervallo vengono riportati agli estremi
+            params = FormulaParameters.from_dict({
+                name: min(max(value, bounds[name][0]), bounds[name][1]) if name in bounds else value
+                for name, value in params.to_dict().items()
+            })
+
+        blocks = LINEAR_BLOCKS[self.formula_name]
+        current = self._loss(params, loss)
+        completed = 0
+        for completed in range(1, rounds + 1):
+            updated = current
+            for block in blocks:
+                candidate = self._fit_block(params, block, loss, bounds, iterations, tolerance)
+                candidate_loss = self._loss(candidate, loss)
+                # IRLS è approssimato: un blocco che peggiora la perdita viene scartato
+                if candidate_loss <= updated:
+                    params, updated = candidate, candidate_loss
+            improved = current - updated
+            current = updated
+            if len(blocks) == 1 or improved <= tolerance * max(1.0, abs(current)):
+                break
+
+        result = self.engine.evaluate(self.formula_name, params)
+        return {
+            'params': params,
+            'loss': current,
+            'avg_error': result['avg_error'],
+            'accuracy': result['accuracy'],
+            'rounds': completed,
+        }
@@ -1,3 +1,4 @@
+import argparse
 import autogen
 import os
 from dotenv import load_dotenv
@@ -5,9 +6,16 @@ import json
 import datetime
 from typing import Dict, List, Tuple, Optional
 import logging
-from formula_evaluator import FormulaEvaluator, FormulaParameters
+from formula_engine import FORMULA_EXPRESSIONS
+from formula_evaluator import FORMULA_FIELDS, FormulaEvaluator, FormulaParameters
+from match_io import write_json_file
 from api_client import FootballDataCollector
 from match_data_manager import MatchDataManager
+from backtest import Backtest
+from evaluation_cache import EvaluationCache
+from parameter_search import PARAMETER_BOUNDS, ParameterSearch
+from weight_fitter import WeightFitter
+from shared_utils.formula_dsl import compile_formula
 
 
 class AlgorithmSaver:
@@ -21,112 +29,38 @@ class AlgorithmSaver:
         version = 1.0
 
         while True:
-            file_name = f"{base_name}_v{version:.1f}.py"
-            if not os.path.exists(os.path.join(self.base_dir, file_name)):
+            # Le versioni già usate dai vecchi file .py generati restano occupate
+            if not any(os.path.exists(os.path.join(self.base_dir, f"{base_name}_v{version:.1f}{ext}"))
+                       for ext in (".py", ".json")):
                 return version
             version += 0.1
 
-    def generate_algorithm_file(self, formula: str, parameters: Dict) -> str:
+    def save_formula_spec(self, formula: str, parameters: Dict, metrics: Optional[Dict] = None) -> str:
         """
-        Genera un nuovo file Python contenente l'algoritmo di xGoals
+        Salva la formula come specifica JSON (espressione + parametri), servita da
+        XGoalsCalculator(formula=percorso) senza generare né importare codice
 
         Args:
-            formula: La formula matematica da implementare
+            formula: espressione del linguaggio di formule o nome in FORMULA_EXPRESSIONS
             parameters: I parametri ottimizzati dell'algoritmo
+            metrics: metriche di valutazione da salvare insieme alla formula (opzionale)
 
         Returns:
-            str: Il percorso del file generato
+            str: Il percorso del file generato ("" se la formula non è valida)
         """
         version = self.get_next_version()
-        file_name = f"algoritmo_xgoals_v{version:.1f}.py"
-        file_path = os.path.join(self.base_dir, file_name)
+        file_path = os.path.join(self.base_dir, f"algoritmo_xgoals_v{version:.1f}.json")
 
-        # Template del codice con documentazione estesa
-        code_template = f'''"""
-xGoals Algorithm Version {version:.1f}
-Generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-
-Questo algoritmo calcola gli Expected Goals (xG) per le partite di calcio
-basandosi su statistiche di gioco e condizioni ambientali.
-
-Parametri ottimizzati attraverso machine learning su dati storici.
-"""
-
-from typing import Dict, Tuple
-
-
-class XGoalsCalculator:
-    def __init__(self):
-        # Parametri ottimizzati
-        self.parameters = {parameters}
-
-        # Metadata
-        self.version = {version:.1f}
-        self.generated_date = "{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-
-    def calculate_xgoals(self, match_data: Dict) -> Tuple[float, float]:
-        """
-        Calcola gli Expected Goals per una partita
-
-        Args:
-            match_data: Dict contenente:
-                - home_stats (Dict): Statistiche squadra casa
-                - away_stats (Dict): Statistiche squadra trasferta
-                - weather (Dict): Condizioni meteo
-                - match_statistics (List): Statistiche partita
-
-        Returns:
-            Tuple[float, float]: (home_xg, away_xg)
-        """
         try:
-            # Estrai statistiche
-            home_stats = match_data.get('home_stats', {{}})
-            away_stats = match_data.get('away_stats', {{}})
-            weather = match_data.get('weather', {{}})
-            match_stats = match_data.get('match_statistics', [])
-
-            # Formula implementata
-            {formula}
-
-            return home_xg, away_xg
-
-        except Exception as e:
-            logging.error(f"Errore nel calcolo xG: {{str(e)}}")
-            return 0.0, 0.0
-
-    def get_metadata(self) -> Dict:
-        """Restituisce i metadata dell'algoritmo"""
-        return {{
-            "version": self.version,
-            "generated_date": self.generated_date,
-            "parameters": self.parameters
-        }}
-
-
-if __name__ == "__main__":
-    # Test dell'algoritmo
-    calculator = XGoalsCalculator()
-
-    # Esempio di utilizzo
-    test_match = {{
-        "home_stats": {{}},
-        "away_stats": {{}},
-        "weather": {{}},
-        "match_statistics": []
-    }}
-
-    home_xg, away_xg = calculator.calculate_xgoals(test_match)
-    print(f"Test Results:")
-    print(f"Home xG: {{home_xg:.2f}}")
-    print(f"Away xG: {{away_xg:.2f}}")
-    print("\\nAlgorithm Metadata:")
-    print(json.dumps(calculator.get_metadata(), indent=2))
-'''
-
-        # Salva il file
-        try:
-            with open(file_path, 'w') as f:
-                f.write(code_template)
+            compiled = compile_formula(FORMULA_EXPRESSIONS.get(formula, formula))
+            spec = {
+                "version": round(version, 1),
+                "generated_date": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                **compiled.to_spec(parameters),
+            }
+            if metrics:
+                spec["metrics"] = metrics
+            write_json_file(file_path, spec)
             self.logger.info(f"Algoritmo salvato in: {file_path}")
             return file_path
         except Exception as e:
@@ -368,6 +302,10 @@ IMPORTANTE:
     return agents
 
 
+# Campi caricati dall'archivio per prepare_match_data (lineups ed eventi non vengono letti)
+PREPARED_MATCH_FIELDS = FORMULA_FIELDS + ['match_statistics', 'weather']
+
+
 def prepare_match_data(match: Dict) -> Dict:
     """Prepara i dati della partita nel formato richiesto"""
     return {
@@ -381,10 +319,18 @@ def prepare_match_data(match: Dict) -> Dict:
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Ottimizzazione della formula xGoals con gli agenti")
+    parser.add_argument("--search", action="store_true",
+                        help="prima degli agenti cerca i parametri della Formula 2 (LHS su 2000 campioni), "
+                             "ne stima direttamente i pesi lineari e ne misura l'errore con il backtest")
+    args = parser.parse_args()
+
     # Inizializzazione
     load_dotenv()
     progress_tracker = AgentProgress()
     algorithm_saver = AlgorithmSaver()
+    # Valutazioni identiche (stessi dati, formula e parametri) tra iterazioni e sessioni vengono lette dalla cache
+    evaluation_cache = EvaluationCache()
 
     # Setup logging
     logging.basicConfig(
@@ -398,20 +344,45 @@ def main():
         data_manager = MatchDataManager(FootballDataCollector())
         logger.info("Data manager inizializzato")
 
-        # Carica le partite
-        historical_matches = data_manager.load_all_matches()
-        if not historical_matches:
+        # Carica e prepara le partite in streaming: vengono lette solo le sezioni
+        # necessarie, senza tenere in memoria l'intero archivio grezzo
+        processed_matches = [
+            prepare_match_data(match)
+            for match in data_manager.iter_all_matches(workers=os.cpu_count(),
+                                                       fields=PREPARED_MATCH_FIELDS)
+        ]
+        if not processed_matches:
             logger.error("Nessuna partita trovata")
             return
 
-        logger.info(f"Caricate {len(historical_matches)} partite per l'analisi")
-
-        # Prepara i dati
-        processed_matches = [prepare_match_data(match) for match in historical_matches]
+        logger.info(f"Caricate {len(processed_matches)} partite per l'analisi")
+        # Feature estratte una volta per contenuto dei file e riusate da ogni valutazione
+        features = data_manager.load_feature_table(workers=os.cpu_count())
         logger.info("Dati processati e preparati per l'analisi")
 
+        # Parametri di default, oppure con --search ricerca della Formula 2 su tutti i campi di
+        # FormulaParameters, stima diretta dei pesi e backtest dei parametri scelti
+        searched_parameters = FormulaParameters()
+        if args.search:
+            with ParameterSearch(features, 'formula2') as search:
+                leaderboard = search.search('lhs', samples=2000, halving=True)
+            searched_parameters = FormulaParameters.from_dict(leaderboard[0]['params'])
+            searched_error = leaderboard[0]['avg_error']
+            logger.info(f"Parametri migliori dalla ricerca ({search.evaluations} valutazioni): "
+                        f"errore medio {leaderboard[0]['avg_error']:.4f}")
+            # Rifinitura dei pesi lineari con la stima diretta (errore assoluto, stessi intervalli della ricerca)
+            fitted = WeightFitter(features, 'formula2').fit(searched_parameters, loss='mae', bounds=PARAMETER_BOUNDS)
+            if fitted['avg_error'] < searched_error:
+                searched_parameters = fitted['params']
+                logger.info(f"Pesi stimati direttamente: errore medio {fitted['avg_error']:.4f}")
+            # Errore fuori campione dei parametri scelti (walk-forward per data e campionato)
+            if features.valid('timestamp').any():
+                held_out = Backtest(features, 'formula2').run(searched_parameters)
+                logger.info(f"Backtest walk-forward: errore medio fuori campione {held_out['avg_error']:.4f} "
+                            f"su {held_out['valid_matches']} partite")
+
         # Setup degli agenti
-        agents = setup_agents(historical_matches, progress_tracker)
+        agents = setup_agents(processed_matches, progress_tracker)
         groupchat = autogen.GroupChat(agents=agents, messages=[], max_round=30)
         manager = autogen.GroupChatManager(groupchat=groupchat)
 
@@ -445,21 +416,23 @@ Data Analyst, analizza le statistiche e proponi miglioramenti alla formula.'''
                 chat_result = user_proxy.initiate_chat(manager, message=initial_message)
 
                 # Estrai e valuta la formula proposta
-                evaluator = FormulaEvaluator(processed_matches)
-                formula_result = evaluator.test_formula2_detailed(FormulaParameters())
+                evaluator = FormulaEvaluator(processed_matches, features=features, cache=evaluation_cache)
+                evaluator.parameters = FormulaParameters.from_dict(searched_parameters.to_dict())
+                formula_result = evaluator.test_formula2_detailed(evaluator.parameters)
                 current_error = formula_result['avg_error']
 
                 # Aggiorna la migliore formula se necessario
                 if current_error < best_overall_error:
-                    best_overall_formula = evaluator.best_formula
+                    best_overall_formula = evaluator.best_formula or 'formula2'
                     best_overall_error = current_error
-                    best_parameters = evaluator.parameters.__dict__
+                    best_parameters = evaluator.parameters.to_dict()
 
                     # Salva immediatamente la nuova migliore formula
                     logger.info(f"Nuova migliore formula trovata (errore: {best_overall_error:.2f})")
-                    algorithm_saver.generate_algorithm_file(
+                    algorithm_saver.save_formula_spec(
                         formula=best_overall_formula,
-                        parameters=best_parameters
+                        parameters=best_parameters,
+                        metrics={'avg_error': current_error}
                     )
 
                 # Salva il progresso dell'iterazione
@@ -488,9 +461,10 @@ Data Analyst, analizza le statistiche e proponi miglioramenti alla formula.'''
     finally:
         # Salva l'algoritmo finale se abbiamo trovato una formula valida
         if best_overall_formula and best_parameters:
-            final_algorithm_path = algorithm_saver.generate_algorithm_file(
+            final_algorithm_path = algorithm_saver.save_formula_spec(
                 formula=best_overall_formula,
-                parameters=best_parameters
+                parameters=best_parameters,
+                metrics={'avg_error': best_overall_error}
             )
             logger.info(f"Algoritmo finale salvato in: {final_algorithm_path}")
 
@@ -498,6 +472,8 @@ Data Analyst, analizza le statistiche e proponi miglioramenti alla formula.'''
         logger.info("\nOttimizzazione completata!")
         logger.info(f"Risultati salvati in: {progress_tracker.session_dir}")
         logger.info(f"Miglior errore ottenuto: {best_overall_error:.2f}")
+        logger.info(evaluation_cache.summary())
+        evaluation_cache.close()
 
 
 if __name__ == "__main__":
@@ -4,7 +4,8 @@ import logging
 from datetime import datetime, timedelta
 import pandas as pd
 from api_client import FootballDataCollector
-from xgoals_old import XGoalsCalculator
+from score_distribution import DEFAULT_RHO, ScoreDistribution
+from xgoals import XGoalsCalculator
 
 
 def get_date_from_input() -> str:
@@ -47,8 +48,8 @@ def analyze_daily_matches(date: str, collector: FootballDataCollector):
         print("Nessuna partita trovata")
         return
 
-    # 2. Inizializza il calcolatore
-    calculator = XGoalsCalculator(collector)
+    # 2. Inizializza il calcolatore (con la formula ottimizzata da x_optimizer, se indicata)
+    calculator = XGoalsCalculator(collector, formula=os.getenv('XGOALS_FORMULA'))
 
     # 3. Analizza le partite
     results = []
@@ -59,16 +60,35 @@ def analyze_daily_matches(date: str, collector: FootballDataCollector):
         print(
             f"\nAnalisi partita {i}/{total_matches}: {match['teams']['home']['name']} vs {match['teams']['away']['name']}")
         result = calculator.calculate_xgoals(match)
-        if result:
-            results.append(result)
+        if result is None:
+            # Né statistiche della partita né medie stagionali: nessuna stima (mai dal risultato finale)
+            print("xGoals non stimabili: statistiche non disponibili, partita esclusa")
+        else:
+            # Formula senza medie stagionali per ripartirla: il totale è diviso in parti uguali
+            home_xg = result.get('xgoals_home', result['xgoals'] / 2)
+            away_xg = result.get('xgoals_away', result['xgoals'] / 2)
+            results.append({
+                'datetime': match['fixture']['date'],
+                'home_team': match['teams']['home']['name'],
+                'away_team': match['teams']['away']['name'],
+                'league': match['league']['name'],
+                'country': match['league']['country'],
+                'xgoals': result['xgoals'],
+                'xgoals_home': home_xg,
+                'xgoals_away': away_xg,
+                'details': f"xG casa {home_xg:.2f} - ospiti {away_xg:.2f}",
+            })
             print(f"xGoals calcolati: {result['xgoals']}")
 
     if not results:
         print("\nNessun risultato valido")
         return
 
-    # 4. Crea il DataFrame e salva
+    # 4. Crea il DataFrame con le probabilità dei risultati (tutte le partite in un passaggio) e salva
     df = pd.DataFrame(results)
+    markets = ScoreDistribution(rho=DEFAULT_RHO).markets(df['xgoals_home'].to_numpy(), df['xgoals_away'].to_numpy())
+    market_columns = list(markets)
+    df = pd.concat([df, pd.DataFrame(markets, index=df.index)], axis=1)
     df = df.sort_values('xgoals', ascending=False)
 
     # Configura display pandas
@@ -78,7 +98,9 @@ def analyze_daily_matches(date: str, collector: FootballDataCollector):
     pd.set_option('display.expand_frame_repr', False)
 
     # Filtra le colonne per il CSV
-    csv_df = df[['datetime', 'home_team', 'away_team', 'league', 'country', 'xgoals', 'details']]
+    csv_df = df[['datetime', 'home_team', 'away_team', 'league', 'country', 'xgoals', 'details',
+                 'xgoals_home', 'xgoals_away'] + market_columns]
+    csv_df = csv_df.round({column: 4 for column in ['xgoals_home', 'xgoals_away'] + market_columns})
 
     # Crea il percorso completo per il file
     output_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), f"xgoals_{date}.csv")
@@ -86,7 +108,11 @@ def analyze_daily_matches(date: str, collector: FootballDataCollector):
 
     print(f"\nAnalisi completata!")
     print(f"Analizzate {len(results)}/{total_matches} partite")
-    print(f"Chiamate API effettuate: {collector.daily_calls}/{collector.MAX_DAILY_CALLS}")
+    print(f"Chiamate API effettuate: {collector.daily_calls} (oggi, tutti i processi: "
+          f"{collector.quota.used_today()}/{collector.MAX_DAILY_CALLS})")
+    print(f"Consumo {collector.quota.summary()}")
+    print(f"Risposte servite dalla {collector.response_cache.summary()}")
+    print(f"Latenze HTTP:\n{collector.latency_summary()}")
 
     print("\nTutte le partite ordinate per xGoals attesi:")
     display_df = df[['datetime', 'home_team', 'away_team', 'league', 'country', 'xgoals', 'details']]
@@ -0,0 +1,102 @@
+"""
+Distribuzione dei risultati esatti dagli xGoals di casa e ospiti.
+
+I gol di ogni squadra seguono una Poisson con media pari ai suoi xGoals; la
+griglia dei risultati (casa x ospiti) è il prodotto delle due distribuzioni,
+con correzione opzionale di Dixon-Coles per i risultati bassi (0-0, 1-0, 0-1, 1-1).
+Tutte le partite sono calcolate insieme: le griglie sono un array
+partite x (max_goals+1) x (max_goals+1) ottenuto con un solo broadcast.
+"""
+import math
+from typing import Dict, Optional
+
+import numpy as np
+
+# Gol massimi per squadra nella griglia: oltre, la probabilità è trascurabile per xGoals realistici
+MAX_GOALS = 10
+
+# Linee under/over calcolate sui gol totali
+OVER_UNDER_LINES = (1.5, 2.5, 3.5)
+
+# Valore tipico del parametro di Dixon-Coles stimato sui campionati europei
+DEFAULT_RHO = -0.13
+
+# Risultati esatti più probabili riportati per ogni partita
+TOP_SCORES = 5
+
+
+class ScoreDistribution:
+    """
+    Griglie dei risultati e probabilità dei mercati per molte partite in un passaggio.
+
+    Le tabelle (log-fattoriali, celle di ogni mercato, etichette dei risultati) sono
+    calcolate una volta nel costruttore.
+    """
+
+    def __init__(self, max_goals: int = MAX_GOALS, rho: Optional[float] = None):
+        """rho: parametro di Dixon-Coles (None = Poisson indipendenti)"""
+        self.max_goals = max_goals
+        self.rho = rho
+        self.goals = np.arange(max_goals + 1, dtype=np.float64)
+        self.log_factorials = np.array([math.lgamma(k + 1) for k in range(max_goals + 1)])
+        home, away = np.meshgrid(self.goals, self.goals, indexing='ij')
+        # Celle della griglia che compongono ogni mercato: una colonna per mercato
+        cells = {
+            'p_1': home > away,
+            'p_X': home == away,
+            'p_2': home < away,
+        }
+        for line in OVER_UNDER_LINES:
+            cells[f'p_under_{line}'] = home + away < line
+        # Entrambe segnano: esclusi i risultati con almeno una squadra a 0
+        cells['p_btts'] = (home > 0) & (away > 0)
+        self.market_names = list(cells)
+        self.market_cells = np.column_stack([mask.ravel() for mask in cells.values()]).astype(np.float64)
+        self.score_labels = np.array([f"{h}-{a}" for h in range(max_goals + 1) for a in range(max_goals + 1)])
+
+    def poisson(self, rates: np.ndarray) -> np.ndarray:
+        """Probabilità di 0..max_goals gol (partite x gol), con le tabelle dei log-fattoriali"""
+        rates = np.maximum(np.asarray(rates, dtype=np.float64), 0.0)[:, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # 0 * log(0) = 0: con media nulla la probabilità è tutta sullo 0
+            log_terms = np.where(self.goals == 0, 0.0, self.goals * np.log(rates))
+        return np.exp(log_terms - rates - self.log_factorials)
+
+    def grids(self, home_xg, away_xg) -> np.ndarray:
+        """Griglie dei risultati (partite x gol casa x gol ospiti)"""
+        home_xg = np.asarray(home_xg, dtype=np.float64)
+        away_xg = np.asarray(away_xg, dtype=np.float64)
+        grids = self.poisson(home_xg)[:, :, None] * self.poisson(away_xg)[:, None, :]
+        if self.rho is not None:
+            rho = self.rho
+            grids[:, 0, 0] *= np.maximum(1 - home_xg * away_xg * rho, 0.0)
+            grids[:, 0, 1] *= np.maximum(1 + home_xg * rho, 0.0)
+            grids[:, 1, 0] *= np.maximum(1 + away_xg * rho, 0.0)
+            grids[:, 1, 1] *= max(1 - rho, 0.0)
+        return grids
+
+    def markets(self, home_xg, away_xg, top_scores: int = TOP_SCORES) -> Dict[str, np.ndarray]:
+        """
+        Probabilità dei mercati per ogni partita (un prodotto matriciale griglie x celle).
+
+        Gli under sono sommati sulla griglia e gli over sono il complemento, così la
+        massa oltre max_goals finisce negli over. Il risultato esatto più probabile
+        e i top_scores più probabili ('1-0 12.3%, 1-1 11.0%, ...') sono letti dalla griglia.
+        """
+        grids = self.grids(home_xg, away_xg).reshape(len(home_xg), -1)
+        probabilities = grids @ self.market_cells
+        markets = {}
+        for index, name in enumerate(self.market_names):
+            markets[name] = probabilities[:, index]
+            if name.startswith('p_under_'):
+                markets[name.replace('under', 'over')] = 1 - probabilities[:, index]
+        best = grids.argmax(axis=1)
+        markets['risultato_esatto'] = self.score_labels[best]
+        markets['p_risultato_esatto'] = grids[np.arange(len(grids)), best]
+        top = np.argsort(-grids, axis=1, kind='stable')[:, :top_scores]
+        top_probabilities = np.take_along_axis(grids, top, axis=1)
+        markets['risultati_probabili'] = np.array([
+            ', '.join(f"{label} {probability * 100:.1f}%" for label, probability in zip(labels, probabilities))
+            for labels, probabilities in zip(self.score_labels[top], top_probabilities)
+        ])
+        return markets
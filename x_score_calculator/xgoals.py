@@ -1,9 +1,52 @@
+import json
+import logging
+import os
+import sys
+
+import requests
+
+# La conversione delle statistiche è condivisa con x_optimizer: l'implementazione è in shared_utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared_utils.formula_dsl import compile_formula, load_formula_spec  # noqa: E402
+from shared_utils.match_features import MatchRecord, find_team_statistic, parse_numeric  # noqa: E402
+from shared_utils.quota_ledger import QuotaExceeded  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# Medie gol stagionali (teams/statistics) per la stima prima della partita
+TEAM_RATE_FEATURES = ('home_for_avg_home', 'away_against_avg_away', 'away_for_avg_away', 'home_against_avg_home')
 
 class XGoalsCalculator:
-    def __init__(self, api_client=None):
+    def __init__(self, api_client=None, formula=None):
+        """
+        formula (opzionale): formula ottimizzata da x_optimizer, come espressione di
+        shared_utils.formula_dsl, specifica salvata (dict) o percorso del file .json
+        """
         self.api_client = api_client
+        self.formula, self.formula_params = None, {}
+        if isinstance(formula, str) and formula.endswith('.json'):
+            with open(formula, 'r', encoding='utf-8') as f:
+                formula = json.load(f)
+        if isinstance(formula, dict):
+            self.formula, self.formula_params = load_formula_spec(formula)
+        elif formula:
+            self.formula = compile_formula(formula)
 
     def calculate_xgoals(self, match):
+        """
+        xGoals totali e, quando stimabili, per squadra; None se mancano sia le
+        statistiche della partita sia quelle stagionali delle squadre.
+        """
+        if self.formula is not None:
+            # Statistiche delle squadre recuperate una sola volta per partita, anche se non disponibili
+            match = self._with_team_stats(match)
+            try:
+                total = self.formula.predict_match(match, self.formula_params)
+                return self._split_total(total, match)
+            except ValueError as e:
+                # Feature mancanti per la formula: si usa il calcolo sulle statistiche della partita
+                print(f"Formula non applicabile alla partita: {e}")
+
         # Gestione sicura dell'accesso ai dati statistici
         try:
             # Verifica se le statistiche sono disponibili direttamente
@@ -15,8 +58,8 @@ class XGoalsCalculator:
                 home_stats = self._find_team_stats(match['response'][0]['statistics'], 'home')
                 away_stats = self._find_team_stats(match['response'][0]['statistics'], 'away')
             else:
-                # Usa valori basati sui gol effettivi se le statistiche non sono disponibili
-                return {'xgoals': match['goals']['home'] + match['goals']['away']}
+                # Partita non ancora giocata: stima dalle medie stagionali delle squadre
+                return self._team_stats_rates(match)
 
             # Estrai i dati con gestione degli errori
             shots_home = self._safe_get(home_stats, 'shots_on_target', 0)
@@ -27,12 +70,57 @@ class XGoalsCalculator:
             shots = shots_home + shots_away
             possession = (possession_home + possession_away) / 2
 
-            return {'xgoals': 0.05 * shots + 0.02 * possession}
+            # Ripartizione per squadra della stessa stima (0.02 * media possesso = 0.01 * somma dei possessi)
+            return {
+                'xgoals': 0.05 * shots + 0.02 * possession,
+                'xgoals_home': 0.05 * shots_home + 0.01 * possession_home,
+                'xgoals_away': 0.05 * shots_away + 0.01 * possession_away,
+            }
 
         except Exception as e:
             print(f"Errore nel calcolo degli xGoals: {e}")
-            # Valore fallback basato sui gol effettivi
-            return {'xgoals': match['goals']['home'] + match['goals']['away']}
+            return None
+
+    def _team_stats_rates(self, match):
+        """
+        xGoals per squadra dalle medie gol stagionali: la squadra di casa segna la media
+        tra i suoi gol fatti in casa e quelli subiti in trasferta dall'ospite (e viceversa).
+        Mai dal risultato finale; None se le statistiche delle squadre non sono disponibili.
+        """
+        try:
+            record = MatchRecord.from_match(self._with_team_stats(match), TEAM_RATE_FEATURES)
+            record.require(*TEAM_RATE_FEATURES)
+        except ValueError:
+            return None
+        home = (record.home_for_avg_home + record.away_against_avg_away) / 2
+        away = (record.away_for_avg_away + record.home_against_avg_home) / 2
+        return {'xgoals': home + away, 'xgoals_home': home, 'xgoals_away': away}
+
+    def _split_total(self, total, match):
+        # La formula stima solo il totale: ripartito secondo le medie stagionali, se disponibili
+        rates = self._team_stats_rates(match)
+        if rates is None or rates['xgoals'] <= 0:
+            return {'xgoals': total}
+        share = rates['xgoals_home'] / rates['xgoals']
+        return {'xgoals': total, 'xgoals_home': total * share, 'xgoals_away': total * (1 - share)}
+
+    def _with_team_stats(self, match):
+        # Le formule leggono le statistiche stagionali delle squadre (home_stats/away_stats)
+        if 'home_stats' in match and 'away_stats' in match or self.api_client is None:
+            return match
+        try:
+            league_id = match['league']['id']
+            home_stats = self.api_client.get_team_stats(match['teams']['home']['id'], league_id)
+            away_stats = self.api_client.get_team_stats(match['teams']['away']['id'], league_id)
+        except (QuotaExceeded, requests.RequestException, LookupError) as e:
+            # Quota esaurita o richiesta rinviata (QuotaDeferred), errore di rete o HTTP, risposta
+            # assente dalla cassetta (CassetteMiss): solo questa partita resta senza statistiche
+            # delle squadre, salvate vuote così da non ritentare la richiesta
+            fixture_id = (match.get('fixture') or {}).get('id')
+            logger.warning(f"Statistiche squadre non disponibili per la partita {fixture_id} "
+                           f"({type(e).__name__}: {e})")
+            return {**match, 'home_stats': {}, 'away_stats': {}}
+        return {**match, 'home_stats': home_stats.get('response', {}), 'away_stats': away_stats.get('response', {})}
 
     def _find_team_stats(self, statistics, team_type):
         # Cerca le statistiche della squadra home/away nella struttura dei dati
@@ -52,41 +140,8 @@ class XGoalsCalculator:
 
     def _safe_get(self, stats_dict, key, default_value=0):
         # Estrae in modo sicuro un valore statistico, gestendo diversi formati di dati
-        if isinstance(stats_dict, dict):
-            # Cerca direttamente nella chiave
-            if key in stats_dict:
-                val = stats_dict[key]
-            # Cerca nella struttura nidificata comune in alcune API
-            elif 'statistics' in stats_dict:
-                for stat in stats_dict['statistics']:
-                    if isinstance(stat, dict) and 'type' in stat and stat['type'] == key:
-                        val = stat.get('value', default_value)
-                        if val is None:
-                            return default_value
-                        return self._parse_stat_value(val)
-                return default_value
-            else:
-                return default_value
-
-            return self._parse_stat_value(val)
-        return default_value
+        return find_team_statistic(stats_dict, key, default_value)
 
     def _parse_stat_value(self, value):
-        # Converte il valore della statistica in formato numerico
-        if value is None:
-            return 0
-
-        # Gestisce valori percentuali (es. "56%")
-        if isinstance(value, str):
-            value = value.strip()
-            if value.endswith('%'):
-                try:
-                    return float(value[:-1])
-                except ValueError:
-                    return 0
-            try:
-                return float(value)
-            except ValueError:
-                return 0
-
-        return float(value) if isinstance(value, (int, float)) else 0
+        # Converte il valore della statistica in formato numerico (es. "56%" -> 56.0)
+        return parse_numeric(value, default=0)